@@ -0,0 +1,269 @@
+# -*- coding: utf-8 -*-
+"""Per-block presence bitmaps and iTOW ranges for pruning searches over log archives."""
+
+import argparse
+import json
+import os
+import sys
+from typing import Iterable, Iterator
+import numpy as np
+
+VERSION = 1
+SUFFIX = ".blocks.json"
+
+
+class BlockIndex:
+    """
+    ファイルを block_size バイトのブロックに区切り, ブロックごとに
+    含まれる class/id のビットマップと時刻 (iTOW/rcvTow, ms) の最小/最大を持つ.
+    ビットの番号は class_ids (そのファイルで最初に現れた順) の位置.
+    フレームはその先頭のオフセットのブロックに数える.
+    """
+
+    def __init__(self, block_size: int = 1 << 20) -> None:
+        self.block_size = block_size
+        self.class_ids: dict[int, int] = {}
+        self.bits: list[int] = []
+        self.t_min: list[float | None] = []
+        self.t_max: list[float | None] = []
+
+    def _block(self, offset: int) -> int:
+        block = offset // self.block_size
+        while len(self.bits) <= block:
+            self.bits.append(0)
+            self.t_min.append(None)
+            self.t_max.append(None)
+        return block
+
+    def add(self, offset: int, class_id: int, time: float | None = None) -> None:
+        """走査中のフレームを 1 つ登録する (ubx_reader.decode_file のループから呼ばれる)"""
+        block = offset // self.block_size
+        if block >= len(self.bits):
+            self._block(offset)
+        bit = self.class_ids.get(class_id)
+        if bit is None:
+            bit = self.class_ids[class_id] = len(self.class_ids)
+        self.bits[block] |= 1 << bit
+        if time is not None and time == time:  # NaN を除く
+            t_min = self.t_min[block]
+            if t_min is None:
+                self.t_min[block] = self.t_max[block] = time
+            elif time < t_min:
+                self.t_min[block] = time
+            elif time > self.t_max[block]:
+                self.t_max[block] = time
+
+    @classmethod
+    def from_frames(
+        cls,
+        offset: np.ndarray,
+        class_id: np.ndarray,
+        time: np.ndarray,
+        block_size: int = 1 << 20,
+    ) -> "BlockIndex":
+        """ubx_file.FrameIndex の列から一括で作る"""
+        index = cls(block_size)
+        if not len(offset):
+            return index
+        blocks = (offset // block_size).astype(np.int64)
+        index._block(int(offset[-1]))
+        # ビットは最初に現れた順に振る
+        ids, first, inverse = np.unique(class_id, return_index=True, return_inverse=True)
+        order = np.argsort(first)
+        rank = np.empty(len(ids), dtype=np.int64)
+        rank[order] = np.arange(len(ids))
+        index.class_ids = {int(ids[k]): int(rank[k]) for k in order}
+        for block, bit in np.unique(np.stack([blocks, rank[inverse]], axis=1), axis=0):
+            index.bits[block] |= 1 << int(bit)
+        # ブロック番号は受信順に単調なので, 時刻を持つフレームをブロックの切れ目で集約する
+        timed = ~np.isnan(time)
+        tb, tt = blocks[timed], time[timed]
+        if len(tt):
+            starts = np.flatnonzero(np.r_[True, tb[1:] != tb[:-1]])
+            for block, lo, hi in zip(
+                tb[starts], np.minimum.reduceat(tt, starts), np.maximum.reduceat(tt, starts)
+            ):
+                index.t_min[block] = float(lo)
+                index.t_max[block] = float(hi)
+        return index
+
+    def blocks_with(
+        self,
+        class_ids: Iterable[int],
+        t0: float | None = None,
+        t1: float | None = None,
+    ) -> list[int]:
+        """いずれかの class/id を含み, 時刻範囲が [t0, t1] と重なるブロックの番号"""
+        mask = 0
+        for class_id in class_ids:
+            if class_id in self.class_ids:
+                mask |= 1 << self.class_ids[class_id]
+        if not mask:
+            return []
+        result = []
+        for block, bits in enumerate(self.bits):
+            if not bits & mask:
+                continue
+            if t0 is not None or t1 is not None:
+                # 時刻を持たないブロックは判定できないので候補に残す
+                if self.t_min[block] is not None:
+                    if t1 is not None and self.t_min[block] > t1:
+                        continue
+                    if t0 is not None and self.t_max[block] < t0:
+                        continue
+            result.append(block)
+        return result
+
+    def byte_ranges(self, blocks: Iterable[int]) -> list[tuple[int, int]]:
+        """ブロック番号を連続する (開始, 終了) のバイト範囲へまとめる"""
+        ranges: list[tuple[int, int]] = []
+        for block in blocks:
+            start, end = block * self.block_size, (block + 1) * self.block_size
+            if ranges and ranges[-1][1] == start:
+                ranges[-1] = (ranges[-1][0], end)
+            else:
+                ranges.append((start, end))
+        return ranges
+
+    def to_dict(self) -> dict:
+        return dict(
+            version=VERSION,
+            block_size=self.block_size,
+            class_ids=list(self.class_ids),
+            bits=[f"{b:x}" for b in self.bits],
+            t_min=self.t_min,
+            t_max=self.t_max,
+        )
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "BlockIndex":
+        if d.get("version") != VERSION:
+            raise ValueError(f"Unsupported block index version: {d.get('version')}")
+        index = cls(d["block_size"])
+        index.update(d)
+        return index
+
+    def update(self, d: dict) -> None:
+        """to_dict の内容で置き換える (チェックポイントからの再開用)"""
+        self.block_size = d["block_size"]
+        self.class_ids = {c: k for k, c in enumerate(d["class_ids"])}
+        self.bits = [int(b, 16) for b in d["bits"]]
+        self.t_min = list(d["t_min"])
+        self.t_max = list(d["t_max"])
+
+    def save(self, path: str, source: str | None = None) -> None:
+        """
+        source (ログのパス) を渡すとパス・サイズ・mtime も記録する.
+        search は索引がログの隣にない場合 (変換の出力先など) もこのパスを返す.
+        """
+        d = self.to_dict()
+        if source is not None:
+            st = os.stat(source)
+            d.update(source=os.path.abspath(source), filesize=st.st_size, mtime_ns=st.st_mtime_ns)
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(d, f, separators=(",", ":"))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> "BlockIndex":
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
+
+
+def sidecar_path(filename: str) -> str:
+    return filename + SUFFIX
+
+
+def iter_sidecars(paths: Iterable[str]) -> Iterator[tuple[str, str]]:
+    """ファイルまたはディレクトリ (再帰) から (ログのパス, 索引のパス) を返す"""
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                for name in sorted(files):
+                    if name.endswith(SUFFIX):
+                        yield os.path.join(root, name[: -len(SUFFIX)]), os.path.join(root, name)
+        elif path.endswith(SUFFIX):
+            yield path[: -len(SUFFIX)], path
+        elif os.path.exists(sidecar_path(path)):
+            yield path, sidecar_path(path)
+
+
+def search(
+    paths: Iterable[str],
+    class_ids: Iterable[int],
+    t0: float | None = None,
+    t1: float | None = None,
+) -> Iterator[tuple[str, list[tuple[int, int]]]]:
+    """索引だけを読んで, 条件に合うログと候補のバイト範囲を返す (ログ自体は開かない)"""
+    class_ids = list(class_ids)
+    for log, path in iter_sidecars(paths):
+        with open(path) as f:
+            d = json.load(f)
+        index = BlockIndex.from_dict(d)
+        blocks = index.blocks_with(class_ids, t0, t1)
+        if blocks:
+            yield d.get("source", log), index.byte_ranges(blocks)
+
+
+def build(filename: str, gen: int | str = "auto", block_size: int = 1 << 20) -> BlockIndex:
+    """変換せずに索引だけを作る (ubx_file のフレーム索引から)"""
+    import ubx_file
+
+    with ubx_file.UbxFile(filename, gen) as f:
+        frames = f.index
+    return BlockIndex.from_frames(frames.offset, frames.class_id, frames.time, block_size)
+
+
+def _class_ids(messages: Iterable[str]) -> set[int]:
+    import model
+    import ubx_reader
+
+    ids = set()
+    for message in messages:
+        key = int(message, 16) if message.lower().startswith("0x") else message
+        for gen in ubx_reader.GENERATIONS:
+            tables = getattr(model, f"ubx_messages_{gen}")
+            try:
+                ids |= {k & 0xFFFF for k in ubx_reader.select_messages(tables, [key])}
+            except ValueError:
+                pass
+        if isinstance(key, int):
+            ids.add(key)
+    if not ids:
+        raise ValueError(f"Unknown message: {messages}")
+    return ids
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_build = sub.add_parser("build", help="write <log>.blocks.json next to each log")
+    p_build.add_argument("files", nargs="+")
+    p_build.add_argument("--gen", default="auto")
+    p_build.add_argument("--block-size", type=int, default=1 << 20)
+    p_search = sub.add_parser("search", help="list logs containing a message")
+    p_search.add_argument("paths", nargs="+", help="logs, .blocks.json files or directories")
+    p_search.add_argument("--message", action="append", required=True, help="name or 0xCCII")
+    p_search.add_argument("--t0", type=float, default=None, help="iTOW (ms)")
+    p_search.add_argument("--t1", type=float, default=None, help="iTOW (ms)")
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        gen = int(args.gen) if args.gen.isdigit() else args.gen
+        for filename in args.files:
+            build(filename, gen, args.block_size).save(sidecar_path(filename), filename)
+        return 0
+    try:
+        class_ids = _class_ids(args.message)
+    except ValueError as e:
+        parser.error(str(e))
+    found = False
+    for log, ranges in search(args.paths, class_ids, args.t0, args.t1):
+        found = True
+        print(log, " ".join(f"{start}-{end}" for start, end in ranges))
+    return 0 if found else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
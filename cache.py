@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+"""Content-addressed cache of conversion outputs for batch reprocessing."""
+
+import contextlib
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from typing import Iterable, Iterator
+import model
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+VERSION = 1
+
+
+def file_digest(filename: str, chunk_size: int = 1 << 20) -> str:
+    h = hashlib.blake2b(digest_size=20)
+    with open(filename, "rb") as f:
+        while chunk := f.read(chunk_size):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def descriptor_version(ubx_messages: dict[int, model.UbxMsgDesc]) -> str:
+    """メッセージ定義表のハッシュ. 定義を変更すると過去のキャッシュは使われなくなる"""
+    h = hashlib.blake2b(digest_size=12)
+    for key in sorted(ubx_messages):
+        h.update(f"{key}:{ubx_messages[key]!r}\n".encode())
+    return h.hexdigest()
+
+
+class ConversionCache:
+    """
+    変換結果のファイルを (入力内容のハッシュ, 世代, 選択メッセージ, 出力オプション, 定義表) の
+    キーで directory に保存し, 同じ条件の変換では保存済みのファイルを出力先へコピーする.
+    入力のハッシュはパス・サイズ・mtime が前回と同じなら再計算しない.
+    合計サイズが max_bytes を超えると最後に使われた時刻の古いエントリから削除する.
+    索引 (index.json) は更新のたびにロックファイルの flock の下で読み直して書き換えるので,
+    同じ directory を複数のプロセス・スレッドで共有できる (fcntl がない環境ではプロセス内のみ).
+    """
+
+    INDEX = "index.json"
+    LOCK = "index.lock"
+
+    def __init__(self, directory: str, max_bytes: int = 10 << 30) -> None:
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self.index = self._load()
+        if self.total_bytes > max_bytes:
+            with self._locked():
+                self.evict()
+
+    @property
+    def path(self) -> str:
+        return os.path.join(self.directory, self.INDEX)
+
+    def _load(self) -> dict:
+        try:
+            with open(self.path) as f:
+                index = json.load(f)
+            if index.get("version") == VERSION:
+                return index
+        except (OSError, ValueError):
+            pass
+        return dict(version=VERSION, digests={}, entries={})
+
+    def _save(self) -> None:
+        tmp = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.index, f)
+        os.replace(tmp, self.path)
+
+    @contextlib.contextmanager
+    def _locked(self) -> Iterator[dict]:
+        """排他した上で索引を読み直し, ブロックを抜けると保存する"""
+        with self.lock, open(os.path.join(self.directory, self.LOCK), "a") as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            self.index = self._load()
+            yield self.index
+            self._save()
+
+    @property
+    def total_bytes(self) -> int:
+        return sum(e["bytes"] for e in self.index["entries"].values())
+
+    def digest(self, filename: str) -> str:
+        """入力ファイルの内容ハッシュ (stat が前回と同じなら記録済みの値)"""
+        filename = os.path.abspath(filename)
+        st = os.stat(filename)
+        with self.lock:
+            known = self.index["digests"].get(filename)
+        if known and known["size"] == st.st_size and known["mtime_ns"] == st.st_mtime_ns:
+            return known["digest"]
+        digest = file_digest(filename)
+        with self._locked() as index:
+            index["digests"][filename] = dict(
+                size=st.st_size, mtime_ns=st.st_mtime_ns, digest=digest
+            )
+        return digest
+
+    def key(
+        self,
+        filename: str,
+        generation: int | str,
+        ubx_messages: dict[int, model.UbxMsgDesc],
+        formats: Iterable[str],
+        **options,
+    ) -> str:
+        """options には出力内容に影響するもの (expand_bits など) だけを渡す"""
+        ident = dict(
+            content=self.digest(filename),
+            generation=str(generation),
+            messages=sorted(ubx_messages),
+            formats=sorted(formats),
+            options=options,
+            descriptors=descriptor_version(ubx_messages),
+        )
+        return hashlib.blake2b(
+            json.dumps(ident, sort_keys=True).encode(), digest_size=16
+        ).hexdigest()
+
+    def _valid(self, key: str, entry: dict) -> bool:
+        for name, size in entry["files"].items():
+            path = os.path.join(self.directory, key, name)
+            try:
+                if os.path.getsize(path) != size:
+                    return False
+            except OSError:
+                return False
+        return True
+
+    def restore(self, key: str, out_dir: str | None = None) -> list[str] | None:
+        """保存済みで壊れていなければ出力先へコピーしてファイル名を返す. なければ None"""
+        # コピー中に他のプロセスが削除しないようにロックしたままコピーする
+        with self._locked() as index:
+            entry = index["entries"].get(key)
+            if entry is None:
+                return None
+            if not self._valid(key, entry):
+                self._remove(key)
+                return None
+            entry["last_used"] = time.time()
+            files = []
+            for name in entry["files"]:
+                dst = os.path.join(out_dir, name) if out_dir else name
+                if os.path.dirname(dst):
+                    os.makedirs(os.path.dirname(dst), exist_ok=True)
+                shutil.copyfile(os.path.join(self.directory, key, name), dst)
+                files.append(dst)
+        return files
+
+    def store(self, key: str, files: Iterable[str], out_dir: str | None = None) -> None:
+        """files は out_dir (変換の出力先) の下のパス. サブディレクトリもそのまま保存する"""
+        entry_dir = os.path.join(self.directory, key)
+        # 一時ディレクトリへコピーしてからロックの下で置き換える
+        tmp_dir = f"{entry_dir}.{os.getpid()}.{threading.get_ident()}.tmp"
+        sizes = {}
+        for path in files:
+            name = os.path.relpath(path, out_dir or ".")
+            os.makedirs(os.path.dirname(os.path.join(tmp_dir, name)), exist_ok=True)
+            shutil.copyfile(path, os.path.join(tmp_dir, name))
+            sizes[name] = os.path.getsize(path)
+        with self._locked() as index:
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            os.replace(tmp_dir, entry_dir)
+            index["entries"][key] = dict(
+                files=sizes, bytes=sum(sizes.values()), last_used=time.time()
+            )
+            self.evict()
+
+    def _remove(self, key: str) -> None:
+        self.index["entries"].pop(key, None)
+        shutil.rmtree(os.path.join(self.directory, key), ignore_errors=True)
+
+    def evict(self) -> None:
+        """合計サイズが max_bytes 以下になるまで古いエントリを削除する (_locked の中で呼ぶ)"""
+        entries = self.index["entries"]
+        total = self.total_bytes
+        for key in sorted(entries, key=lambda k: entries[k]["last_used"]):
+            if total <= self.max_bytes:
+                break
+            total -= entries[key]["bytes"]
+            self._remove(key)
@@ -0,0 +1,258 @@
+# -*- coding: utf-8 -*-
+"""SQLite catalog of conversion runs for planning incremental batch work."""
+
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import time
+from typing import TYPE_CHECKING, Iterable
+
+if TYPE_CHECKING:
+    import ubx_reader
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    source TEXT NOT NULL,
+    digest TEXT,
+    filesize INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    generation TEXT NOT NULL,
+    out_dir TEXT,
+    started REAL NOT NULL,
+    finished REAL NOT NULL,
+    cached INTEGER NOT NULL,
+    read_bytes INTEGER,
+    ubx_count INTEGER,
+    convert_count INTEGER,
+    checksum_error_count INTEGER,
+    decimated_count INTEGER,
+    write_errors INTEGER NOT NULL,
+    options TEXT
+);
+CREATE INDEX IF NOT EXISTS runs_source ON runs (source, finished);
+CREATE INDEX IF NOT EXISTS runs_digest ON runs (digest, generation);
+CREATE TABLE IF NOT EXISTS run_messages (
+    run_id INTEGER NOT NULL REFERENCES runs (id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    class_id INTEGER NOT NULL,
+    rows INTEGER NOT NULL,
+    first_time REAL,
+    last_time REAL,
+    PRIMARY KEY (run_id, name)
+);
+CREATE INDEX IF NOT EXISTS run_messages_name ON run_messages (name);
+CREATE TABLE IF NOT EXISTS run_outputs (
+    run_id INTEGER NOT NULL REFERENCES runs (id) ON DELETE CASCADE,
+    path TEXT NOT NULL,
+    bytes INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS run_outputs_run ON run_outputs (run_id);
+CREATE TABLE IF NOT EXISTS run_durations (
+    run_id INTEGER NOT NULL REFERENCES runs (id) ON DELETE CASCADE,
+    stage TEXT NOT NULL,
+    seconds REAL NOT NULL,
+    PRIMARY KEY (run_id, stage)
+);
+"""
+
+
+class Catalog:
+    """
+    変換の実行ごとに入力 (パス, ハッシュ, サイズ, mtime), 世代, メッセージごとの行数と
+    最初/最後の時刻 (ms), 出力ファイル, チェックサムエラー数, 段階ごとの所要時間を記録する.
+    記録は 1 回ごとに接続してトランザクションで書くので, 複数プロセスから同じ DB を使える.
+    """
+
+    def __init__(self, path: str, timeout: float = 60.0) -> None:
+        self.path = path
+        self.timeout = timeout
+        con = self._connect()
+        try:
+            con.executescript(SCHEMA)
+        finally:
+            con.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        con = sqlite3.connect(self.path, timeout=self.timeout)
+        con.row_factory = sqlite3.Row
+        con.execute("PRAGMA journal_mode=WAL")
+        con.execute("PRAGMA foreign_keys=ON")
+        return con
+
+    def record(
+        self,
+        filename: str,
+        result: "ubx_reader.ConvertResult",
+        out_dir: str | None = None,
+        started: float | None = None,
+        options: dict | None = None,
+    ) -> int:
+        """
+        convert_file の結果を 1 件記録して run id を返す.
+        キャッシュから復元した結果はメッセージの内訳を持たないので,
+        同じ入力ハッシュ・世代・変換条件 (options) の直近の (キャッシュでない) 記録から写す.
+        """
+        filename = os.path.abspath(filename)
+        st = os.stat(filename)
+        stats = result.stats
+        finished = time.time()
+        options_json = json.dumps(options, sort_keys=True, default=str) if options else None
+        con = self._connect()
+        try:
+            with con:
+                cur = con.execute(
+                    "INSERT INTO runs (source, digest, filesize, mtime_ns, generation, out_dir,"
+                    " started, finished, cached, read_bytes, ubx_count, convert_count,"
+                    " checksum_error_count, decimated_count, write_errors, options)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        filename,
+                        result.digest,
+                        st.st_size,
+                        st.st_mtime_ns,
+                        str(result.generation),
+                        os.path.abspath(out_dir or "."),
+                        started if started is not None else finished,
+                        finished,
+                        int(result.cached),
+                        stats.read_count if stats else None,
+                        stats.ubx_count if stats else None,
+                        stats.convert_count if stats else None,
+                        stats.checksum_error_count if stats else None,
+                        stats.decimated_count if stats else None,
+                        len(result.errors),
+                        options_json,
+                    ),
+                )
+                run_id = cur.lastrowid
+                if result.messages:
+                    con.executemany(
+                        "INSERT INTO run_messages VALUES (?, ?, ?, ?, ?, ?)",
+                        [
+                            (run_id, name, m.class_id, m.rows, m.first_time, m.last_time)
+                            for name, m in result.messages.items()
+                        ],
+                    )
+                elif result.cached and result.digest is not None:
+                    con.execute(
+                        "INSERT INTO run_messages"
+                        " SELECT ?, name, class_id, rows, first_time, last_time FROM run_messages"
+                        " WHERE run_id = (SELECT id FROM runs WHERE digest = ? AND generation = ?"
+                        " AND options IS ? AND cached = 0 ORDER BY finished DESC LIMIT 1)",
+                        (run_id, result.digest, str(result.generation), options_json),
+                    )
+                con.executemany(
+                    "INSERT INTO run_outputs VALUES (?, ?, ?)",
+                    [
+                        (run_id, os.path.abspath(path), os.path.getsize(path))
+                        for path in result.files
+                        if os.path.exists(path)
+                    ],
+                )
+                con.executemany(
+                    "INSERT INTO run_durations VALUES (?, ?, ?)",
+                    [(run_id, stage, s) for stage, s in result.durations.items()],
+                )
+        finally:
+            con.close()
+        return run_id
+
+    def latest(self, filename: str) -> sqlite3.Row | None:
+        """そのパスの直近の記録"""
+        con = self._connect()
+        try:
+            return con.execute(
+                "SELECT * FROM runs WHERE source = ? ORDER BY finished DESC LIMIT 1",
+                (os.path.abspath(filename),),
+            ).fetchone()
+        finally:
+            con.close()
+
+    def pending(
+        self, filenames: Iterable[str], generation: int | str | None = None
+    ) -> list[str]:
+        """
+        書き出しエラーなく変換済みの記録がない (またはその後にサイズ・mtime が変わった) ファイル.
+        入力は stat するだけでハッシュは計算しない.
+        """
+        con = self._connect()
+        try:
+            result = []
+            for filename in filenames:
+                st = os.stat(filename)
+                query = (
+                    "SELECT 1 FROM runs WHERE source = ? AND filesize = ? AND mtime_ns = ?"
+                    " AND write_errors = 0"
+                )
+                args = [os.path.abspath(filename), st.st_size, st.st_mtime_ns]
+                if generation is not None:
+                    query += " AND generation = ?"
+                    args.append(str(generation))
+                if con.execute(query + " LIMIT 1", args).fetchone() is None:
+                    result.append(filename)
+            return result
+        finally:
+            con.close()
+
+    def runs(self, limit: int = 20) -> list[sqlite3.Row]:
+        """新しい順の記録"""
+        con = self._connect()
+        try:
+            return con.execute(
+                "SELECT * FROM runs ORDER BY finished DESC LIMIT ?", (limit,)
+            ).fetchall()
+        finally:
+            con.close()
+
+    def messages(self, run_id: int) -> list[sqlite3.Row]:
+        con = self._connect()
+        try:
+            return con.execute(
+                "SELECT * FROM run_messages WHERE run_id = ? ORDER BY class_id, name", (run_id,)
+            ).fetchall()
+        finally:
+            con.close()
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("catalog")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_runs = sub.add_parser("runs", help="list recorded runs")
+    p_runs.add_argument("--limit", type=int, default=20)
+    p_show = sub.add_parser("show", help="messages of the latest run of a file")
+    p_show.add_argument("file")
+    p_pending = sub.add_parser("pending", help="files without an up-to-date run")
+    p_pending.add_argument("files", nargs="+")
+    p_pending.add_argument("--gen", default=None)
+    args = parser.parse_args(argv)
+
+    catalog = Catalog(args.catalog)
+    if args.command == "runs":
+        for r in catalog.runs(args.limit):
+            finished = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(r["finished"]))
+            print(
+                f"{r['id']:>6} {finished} gen={r['generation']} cached={r['cached']} "
+                f"checksum errors={r['checksum_error_count']} write errors={r['write_errors']} {r['source']}"
+            )
+        return 0
+    if args.command == "show":
+        run = catalog.latest(args.file)
+        if run is None:
+            print(f"No run recorded for {args.file}", file=sys.stderr)
+            return 1
+        for m in catalog.messages(run["id"]):
+            first = f"{m['first_time']:.0f}" if m["first_time"] is not None else "-"
+            last = f"{m['last_time']:.0f}" if m["last_time"] is not None else "-"
+            print(f"0x{m['class_id']:04X} {m['name']:<16} {m['rows']:>12,} {first:>10} {last:>10}")
+        return 0
+    for filename in catalog.pending(args.files, args.gen):
+        print(filename)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
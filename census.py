@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+"""Quick-look message census of a large log from evenly spaced sampled windows."""
+
+import argparse
+import dataclasses
+import functools
+import io
+import json
+import os
+import struct
+import sys
+import model
+import ublox
+from class_id import MsgClass
+
+
+@dataclasses.dataclass
+class MessageCensus:
+    name: str
+    frames: int = 0
+    bytes: int = 0
+    # ファイル全体の推定値
+    est_frames: int = 0
+    byte_share: float = 0.0
+    rate_hz: float | None = None
+
+
+@dataclasses.dataclass
+class Census:
+    filesize: int
+    windows: int
+    sampled_bytes: int = 0
+    frames: int = 0
+    checksum_errors: int = 0
+    # ログの推定時間長 (先頭が iTOW/rcvTow のメッセージから)
+    duration_s: float | None = None
+    messages: dict[int, MessageCensus] = dataclasses.field(default_factory=dict)
+
+    @property
+    def checksum_error_rate(self) -> float:
+        return self.checksum_errors / self.frames if self.frames else 0.0
+
+    def to_dict(self) -> dict:
+        d = dataclasses.asdict(self)
+        d["messages"] = {f"0x{k:04X}": v for k, v in d["messages"].items()}
+        d["checksum_error_rate"] = self.checksum_error_rate
+        return d
+
+
+def message_desc(ubx_class_id: int) -> model.UbxMsgDesc | None:
+    """新しい世代から順に定義を引く"""
+    for table in (model.ubx_messages_9, model.ubx_messages_8, model.ubx_messages_7, model.ubx_messages_6):
+        if ubx_class_id in table:
+            return table[ubx_class_id]
+    return None
+
+
+@functools.lru_cache(maxsize=None)
+def message_clock(ubx_class_id: int) -> tuple[struct.Struct, float] | None:
+    """先頭が iTOW/rcvTow のメッセージなら (struct, ms への倍率) (model.clock_field を参照)"""
+    desc = message_desc(ubx_class_id)
+    clock = model.clock_field(desc) if desc is not None else None
+    if clock is None:
+        return None
+    return struct.Struct(clock[0]), clock[1]
+
+
+def message_name(ubx_class_id: int) -> str:
+    """新しい世代の定義から名前を引く. 定義がなければ "<CLASS>-0x<ID>" """
+    desc = message_desc(ubx_class_id)
+    if desc is not None:
+        return desc.name
+    cls, id_ = ubx_class_id >> 8, ubx_class_id & 0xFF
+    try:
+        return f"{MsgClass(cls).name}-0x{id_:02X}"
+    except ValueError:
+        return f"0x{cls:02X}-0x{id_:02X}"
+
+
+def _sync_start(window: bytes) -> int | None:
+    """
+    チェックサムの合う最初のフレームの位置. 窓の先頭はフレームの途中なので,
+    ペイロード内の偶然の同期ヘッダから読み始めないようにする.
+    """
+    pos = window.find(ublox.UBX_SYNC)
+    while 0 <= pos <= len(window) - 8:
+        length = int.from_bytes(window[pos + 4 : pos + 6], "little")
+        end = pos + 8 + length
+        if end <= len(window):
+            dat = window[pos + 2 : end - 2]
+            if ublox.checksum(dat) == int.from_bytes(window[end - 2 : end], "little"):
+                return pos
+        pos = window.find(ublox.UBX_SYNC, pos + 1)
+    return None
+
+
+def take_census(filename: str, windows: int = 32, window_size: int = 64 << 10) -> Census:
+    """
+    ファイル全体に等間隔に置いた windows 個の窓 (各 window_size バイト) だけを読み,
+    class/id ごとのフレーム数・バイト数からファイル全体の件数, バイト比率, 出力レートを推定する.
+    ファイルが窓の合計より小さければ全体を読む.
+    """
+    filesize = os.path.getsize(filename)
+    if filesize <= windows * window_size:
+        windows, window_size = 1, filesize
+    census = Census(filesize=filesize, windows=windows)
+    itow_min = itow_max = None
+    with open(filename, "rb") as f:
+        for k in range(windows):
+            f.seek((filesize - window_size) * k // max(windows - 1, 1))
+            window = f.read(window_size)
+            start = _sync_start(window)
+            if start is None:
+                continue
+            scanner = ublox.FrameScanner(io.BytesIO(window[start:]), chunk_size=len(window))
+            for ubx_class_id, dat in scanner:
+                msg = census.messages.get(ubx_class_id)
+                if msg is None:
+                    msg = census.messages[ubx_class_id] = MessageCensus(message_name(ubx_class_id))
+                msg.frames += 1
+                msg.bytes += len(dat) + 8
+                # 先頭が iTOW (ms) / rcvTow のメッセージだけを使う (NAV でも version などで始まるものがある)
+                clock = message_clock(ubx_class_id)
+                if clock is not None and len(dat) >= clock[0].size:
+                    itow = clock[0].unpack_from(dat)[0] * clock[1]
+                    if k == 0:
+                        itow_min = itow if itow_min is None else min(itow_min, itow)
+                    if k == windows - 1:
+                        itow_max = itow if itow_max is None else max(itow_max, itow)
+            census.frames += scanner.ubx_count
+            census.checksum_errors += scanner.checksum_error_count
+            # 窓の末尾で切れたフレームは数えない
+            census.sampled_bytes += scanner.offset
+
+    if itow_min is not None and itow_max is not None:
+        census.duration_s = ((itow_max - itow_min) % ublox.WEEK_MS) / 1000
+    frame_bytes = sum(m.bytes for m in census.messages.values())
+    for msg in census.messages.values():
+        if census.sampled_bytes:
+            msg.est_frames = round(msg.frames * filesize / census.sampled_bytes)
+        msg.byte_share = msg.bytes / frame_bytes if frame_bytes else 0.0
+        if census.duration_s:
+            msg.rate_hz = msg.est_frames / census.duration_s
+    census.messages = dict(
+        sorted(census.messages.items(), key=lambda kv: kv[1].bytes, reverse=True)
+    )
+    return census
+
+
+def write_census(fobj, census: Census) -> None:
+    fobj.write(
+        f"File size: {census.filesize:,} bytes, sampled {census.sampled_bytes:,} bytes in {census.windows} windows\n"
+    )
+    duration = f"{census.duration_s:,.0f} s" if census.duration_s else "unknown"
+    fobj.write(
+        f"Estimated duration: {duration}, checksum error rate: {census.checksum_error_rate:.2%}\n"
+    )
+    fobj.write(f"{'class/id':>8}  {'name':<16} {'est. count':>14} {'rate (Hz)':>10} {'bytes':>7}\n")
+    for ubx_class_id, m in census.messages.items():
+        rate = f"{m.rate_hz:.3g}" if m.rate_hz is not None else "-"
+        fobj.write(
+            f"  0x{ubx_class_id:04X}  {m.name:<16} {m.est_frames:>14,} {rate:>10} {m.byte_share:>7.1%}\n"
+        )
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("file")
+    parser.add_argument("--windows", type=int, default=32)
+    parser.add_argument("--window-size", type=int, default=64 << 10)
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args(argv)
+    census = take_census(args.file, args.windows, args.window_size)
+    if args.json:
+        json.dump(census.to_dict(), sys.stdout, indent=2)
+        print()
+    else:
+        write_census(sys.stdout, census)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+"""Checkpoint and resume for long conversions."""
+
+import dataclasses
+import json
+import os
+import shutil
+from typing import TYPE_CHECKING
+import ublox
+
+if TYPE_CHECKING:
+    import ubx_reader
+
+VERSION = 3
+
+
+class Checkpoint:
+    """
+    作業ディレクトリにペイロードのチャンクと checkpoint.json を保存する.
+    save は全メッセージのペイロードをチャンクファイルへ確定させてから
+    checkpoint.json を置き換えるので, 記録された走査位置より前の行は必ずディスク上にある.
+    チャンク書き出し中に中断した場合は前回の checkpoint.json が有効なまま残る.
+    """
+
+    FILENAME = "checkpoint.json"
+
+    def __init__(
+        self,
+        directory: str,
+        filename: str,
+        generation: int | str,
+        interval: int = 64 << 20,
+    ) -> None:
+        self.directory = directory
+        self.filename = os.path.abspath(filename)
+        self.generation = str(generation)
+        # 走査位置が interval バイト進むごとに保存する
+        self.interval = interval
+        self.last_offset = 0
+        self.seq = 0
+        # メッセージごとに times ファイルへ書き出し済みの受信時刻の数
+        self.times_saved: dict[int, int] = {}
+
+    @property
+    def path(self) -> str:
+        return os.path.join(self.directory, self.FILENAME)
+
+    def _times_path(self, key: int) -> str:
+        return os.path.join(self.directory, f"{key:06X}_times.bin")
+
+    def _source(self) -> dict:
+        st = os.stat(self.filename)
+        return dict(
+            source=self.filename,
+            filesize=st.st_size,
+            mtime_ns=st.st_mtime_ns,
+            generation=self.generation,
+        )
+
+    def load(self, options: dict | None = None) -> dict | None:
+        """
+        同じ入力ファイル・世代のチェックポイントがあれば返す.
+        options (ubx_reader.decode_options) を渡すと, 保存時の設定と一致する場合だけ返す.
+        """
+        try:
+            with open(self.path) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if state.get("version") != VERSION:
+            return None
+        if any(state.get(k) != v for k, v in self._source().items()):
+            return None
+        if options is not None and state.get("options") != options:
+            return None
+        return state
+
+    def due(self, offset: int) -> bool:
+        return offset - self.last_offset >= self.interval
+
+    def save(
+        self,
+        offset: int,
+        stats: "ubx_reader.ConvertStats",
+        ubx_instances: dict[int, ublox.Ublox],
+        log_offset: int | None = None,
+        blocks: dict | None = None,
+        options: dict | None = None,
+        decimator: dict | None = None,
+    ) -> None:
+        """decimator には offset の時点の間引きの途中経過 (ublox.Decimator.state) を渡す"""
+        os.makedirs(self.directory, exist_ok=True)
+        self.seq += 1
+        messages = {}
+        for key, inst in ubx_instances.items():
+            if inst.raw or inst._spill_file is not None:
+                inst.persist(os.path.join(self.directory, f"{key:06X}_{self.seq}.bin"))
+            saved = self.times_saved.get(key)
+            if len(inst.times) > (saved or 0):
+                # 受信時刻は追記のみ (この実行で初めて書く場合は作り直す). 有効な数は checkpoint.json に記録する
+                with open(self._times_path(key), "wb" if saved is None else "ab") as f:
+                    inst.times[saved or 0 :].tofile(f)
+                    f.flush()
+                    os.fsync(f.fileno())
+                self.times_saved[key] = len(inst.times)
+            if inst.count:
+                messages[str(key)] = dict(
+                    times=len(inst.times),
+                    chunks=[os.path.basename(c) for c in inst.chunks],
+                    count=inst.count,
+                    payload_bytes=inst.payload_bytes,
+                    n_var_min=inst.n_var_min,
+                    n_var_max=inst.n_var_max,
+                )
+        state = dict(
+            version=VERSION,
+            **self._source(),
+            offset=offset,
+            seq=self.seq,
+            log_offset=log_offset,
+            stats=dataclasses.asdict(stats),
+            messages=messages,
+            blocks=blocks,
+            options=options,
+            decimator=decimator,
+        )
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(state, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        self.last_offset = offset
+
+    def restore(
+        self,
+        state: dict,
+        stats: "ubx_reader.ConvertStats",
+        ubx_instances: dict[int, ublox.Ublox],
+    ) -> int:
+        """load の結果を stats と各インスタンスへ戻し, 再開する走査位置を返す"""
+        for k, v in state["stats"].items():
+            setattr(stats, k, v)
+        for key, msg in state["messages"].items():
+            inst = ubx_instances[int(key)]
+            inst.chunks = [os.path.join(self.directory, c) for c in msg["chunks"]]
+            inst.count = msg["count"]
+            inst.payload_bytes = msg["payload_bytes"]
+            inst.n_var_min = msg["n_var_min"]
+            inst.n_var_max = msg["n_var_max"]
+            if msg["times"]:
+                path = self._times_path(int(key))
+                with open(path, "rb") as f:
+                    inst.times.fromfile(f, msg["times"])
+                # 記録より後に書かれた分 (保存途中の中断) を捨ててから追記を再開する
+                os.truncate(path, msg["times"] * inst.times.itemsize)
+                self.times_saved[int(key)] = msg["times"]
+        self.seq = state["seq"]
+        self.last_offset = state["offset"]
+        return state["offset"]
+
+    def remove(self) -> None:
+        shutil.rmtree(self.directory, ignore_errors=True)
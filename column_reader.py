@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+"""Lazy readers for the binary outputs that apply scale factors per column on access."""
+
+import dataclasses
+import json
+import os
+import sqlite3
+from typing import Callable, Iterator, Mapping
+import numpy as np
+import pandas as pd
+import model
+import sinks
+
+
+class LazyColumns(Mapping[str, np.ndarray]):
+    """
+    スケール未適用の列を返す load(name) と列ごとのスケールから, 参照された列だけを読み,
+    スケールが 1 でない列は float64 に変換してスケールを掛けて返す (結果は保持する).
+    raw(name) はスケール未適用の値 (出力の型のまま, columns 形式では mmap).
+    """
+
+    def __init__(
+        self,
+        names: list[str],
+        load: Callable[[str], np.ndarray],
+        scales: dict[str, float],
+        units: dict[str, str] | None = None,
+    ) -> None:
+        self.names = list(names)
+        self._load = load
+        self.scales = scales
+        self.units = units or {}
+        self._raw: dict[str, np.ndarray] = {}
+        self._scaled: dict[str, np.ndarray] = {}
+
+    def raw(self, name: str) -> np.ndarray:
+        if name not in self._raw:
+            if name not in self.names:
+                raise KeyError(name)
+            self._raw[name] = self._load(name)
+        return self._raw[name]
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        if name not in self._scaled:
+            values = self.raw(name)
+            scale = self.scales.get(name, 1)
+            if values.dtype.kind == "S":
+                values = np.char.decode(values, "ascii", "ignore").astype(object)
+            elif scale != 1:
+                values = values.astype(np.float64) * scale
+            self._scaled[name] = values
+        return self._scaled[name]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.names)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def to_frame(self, columns: list[str] | None = None) -> pd.DataFrame:
+        """指定した列 (省略時は全列) をスケール適用済みの DataFrame にする. 配列の列は行ごとの ndarray"""
+        data = {}
+        for name in columns or self.names:
+            values = self[name]
+            data[name] = list(values) if values.ndim > 1 else values
+        return pd.DataFrame(data)
+
+
+@dataclasses.dataclass
+class Message:
+    name: str
+    columns: LazyColumns
+    # 繰り返しブロック (frame 列が親の行番号). 可変部がなければ None
+    blocks: LazyColumns | None = None
+    # 開いている接続などを閉じる関数 (SQLite)
+    closer: Callable[[], None] | None = dataclasses.field(default=None, repr=False)
+
+    def __enter__(self) -> "Message":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        if self.closer is not None:
+            self.closer()
+            self.closer = None
+
+
+def open_columns(directory: str) -> Message:
+    """sinks.ColumnsSink の出力 ("<out_dir>/<message>/") を開く"""
+    with open(os.path.join(directory, sinks.ColumnsSink.SCHEMA)) as f:
+        schema = json.load(f)
+
+    def lazy(entries: list[dict], frame: str | None) -> LazyColumns:
+        files = {e["name"]: e["file"] for e in entries}
+
+        def load(name: str) -> np.ndarray:
+            if name == "frame":
+                # 親の行番号は保存していないので作る
+                if frame is None:
+                    return np.arange(schema["rows"])
+                return np.load(os.path.join(directory, frame), mmap_mode="r")
+            return np.load(os.path.join(directory, files[name]), mmap_mode="r")
+
+        return LazyColumns(
+            ["frame"] + list(files),
+            load,
+            {e["name"]: e["scale"] for e in entries},
+            {e["name"]: e["unit"] for e in entries},
+        )
+
+    blocks = None
+    if schema["blocks"] is not None:
+        blocks = lazy(schema["block_columns"], os.path.join("blocks", "_frame.npy"))
+    return Message(schema["message"], lazy(schema["columns"], None), blocks)
+
+
+def open_parquet(filename: str) -> Message:
+    """sinks.ParquetSink の出力 ("<message>.parquet" と "<message>_blocks.parquet") を開く"""
+    import pyarrow.parquet as pq
+
+    def lazy(path: str) -> LazyColumns:
+        schema = pq.read_schema(path)
+
+        def load(name: str) -> np.ndarray:
+            column = pq.read_table(path, columns=[name]).column(0).combine_chunks()
+            field = schema.field(name)
+            if field.metadata and field.metadata.get(b"code") == b"CH":
+                return np.array(column.to_pylist(), dtype=object)
+            if hasattr(column.type, "list_size"):
+                return column.flatten().to_numpy().reshape(-1, column.type.list_size)
+            return column.to_numpy()
+
+        scales, units = {}, {}
+        for field in schema:
+            if field.metadata:
+                scales[field.name] = float(field.metadata[b"scale"])
+                units[field.name] = field.metadata[b"unit"].decode()
+        return LazyColumns(schema.names, load, scales, units)
+
+    stem = filename[: -len(".parquet")] if filename.endswith(".parquet") else filename
+    blocks_file = stem + "_blocks.parquet"
+    return Message(
+        os.path.basename(stem),
+        lazy(stem + ".parquet"),
+        lazy(blocks_file) if os.path.exists(blocks_file) else None,
+    )
+
+
+def open_sqlite(filename: str, message: str) -> Message:
+    """sinks.SqliteSink の出力 (ubx.sqlite) のメッセージのテーブルを開く. 使い終わったら close する"""
+    con = sqlite3.connect(filename, check_same_thread=False)
+
+    def lazy(table: str, keys: list[str]) -> LazyColumns | None:
+        rows = con.execute(
+            "SELECT name, unit, code, scale FROM _columns WHERE tbl = ? ORDER BY position",
+            (table,),
+        ).fetchall()
+        if not rows:
+            return None
+        codes = {name: code for name, _, code, _ in rows}
+        order = ", ".join(keys)
+
+        def load(name: str) -> np.ndarray:
+            values = [v for (v,) in con.execute(f'SELECT "{name}" FROM "{table}" ORDER BY {order}')]
+            code = codes.get(name)
+            if code is None:  # frame, block
+                return np.array(values, dtype=np.int64)
+            if code == "CH":
+                return np.array(values, dtype=object)
+            dtype = np.dtype(model.FMT_TO_NUMPY[code])
+            if values and isinstance(values[0], bytes):
+                return np.frombuffer(b"".join(values), dtype=dtype).reshape(len(values), -1)
+            return np.array(values, dtype=dtype)
+
+        return LazyColumns(
+            keys + [name for name, _, _, _ in rows],
+            load,
+            {name: scale for name, _, _, scale in rows},
+            {name: unit for name, unit, _, _ in rows},
+        )
+
+    columns = lazy(message, ["frame"])
+    if columns is None:
+        con.close()
+        raise KeyError(f"No table for message {message} in {filename}")
+    return Message(
+        message, columns, lazy(f"{message}_blocks", ["frame", "block"]), con.close
+    )
+
+
+def open_message(path: str, message: str | None = None) -> Message:
+    """
+    出力の種類をパスから判別して開く (SQLite の場合は message が必要).
+    with 文で使うか, 使い終わったら close する.
+    """
+    if os.path.isdir(path):
+        return open_columns(path)
+    if path.endswith(".parquet"):
+        return open_parquet(path)
+    if message is None:
+        raise ValueError("message is required for SQLite outputs")
+    return open_sqlite(path, message)
@@ -0,0 +1,405 @@
+# -*- coding: utf-8 -*-
+"""Single-pass streaming statistics per message field, mergeable across files."""
+
+import argparse
+import concurrent.futures
+import csv
+import json
+import os
+import sys
+from typing import Iterable, Iterator, Mapping, TextIO
+import numpy as np
+import model
+import ublox
+import ubx_reader
+
+VERSION = 1
+PERCENTILES = (1, 5, 50, 95, 99)
+# 統計を取らない型 (文字列とビットフィールド)
+SKIP_CODES = ("CH", "X1", "X2", "X4")
+
+
+class QuantileSketch:
+    """
+    KLL 型の併合可能な分位点スケッチ.
+    レベル h の値は重み 2**h を持ち, 容量を超えたレベルは整列して 1 つおきに上のレベルへ送る.
+    保持する値の数は O(k log(n/k)) で, 順位の誤差はおよそ 1.7 / k.
+    """
+
+    def __init__(self, k: int = 200, seed: int | None = None) -> None:
+        self.k = k
+        self.levels: list[np.ndarray] = [np.empty(0)]
+        self.rng = np.random.default_rng(seed)
+
+    def _capacity(self, h: int) -> int:
+        return max(int(self.k * (2 / 3) ** (len(self.levels) - 1 - h)), 2)
+
+    def _compress(self) -> None:
+        h = 0
+        while h < len(self.levels):
+            if len(self.levels[h]) <= self._capacity(h):
+                h += 1
+                continue
+            if h + 1 == len(self.levels):
+                self.levels.append(np.empty(0))
+            values = np.sort(self.levels[h])
+            # 奇数個なら最大値を残して偶数個を圧縮する
+            rest, values = values[len(values) & ~1 :], values[: len(values) & ~1]
+            self.levels[h + 1] = np.concatenate(
+                [self.levels[h + 1], values[self.rng.integers(2) :: 2]]
+            )
+            self.levels[h] = rest
+            h += 1
+
+    def update(self, values: np.ndarray) -> None:
+        values = values[~np.isnan(values)]
+        if len(values):
+            self.levels[0] = np.concatenate([self.levels[0], values])
+            self._compress()
+
+    def merge(self, other: "QuantileSketch") -> None:
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+        for h, values in enumerate(other.levels):
+            self.levels[h] = np.concatenate([self.levels[h], values])
+        self._compress()
+
+    def quantiles(self, qs: Iterable[float]) -> list[float | None]:
+        values = np.concatenate(self.levels)
+        if not len(values):
+            return [None for _ in qs]
+        weights = np.concatenate(
+            [np.full(len(v), 2.0**h) for h, v in enumerate(self.levels)]
+        )
+        order = np.argsort(values, kind="stable")
+        cum = np.cumsum(weights[order])
+        idx = np.searchsorted(cum, np.asarray(list(qs)) * cum[-1], side="left")
+        return values[order][np.minimum(idx, len(values) - 1)].tolist()
+
+    def to_dict(self) -> dict:
+        return dict(k=self.k, levels=[v.tolist() for v in self.levels])
+
+    @classmethod
+    def from_dict(cls, d: Mapping) -> "QuantileSketch":
+        sketch = cls(d["k"])
+        sketch.levels = [np.asarray(v, dtype=float) for v in d["levels"]]
+        return sketch
+
+
+class FieldStats:
+    """1 フィールドの件数・最小/最大・平均/分散 (Welford/Chan の併合) と分位点スケッチ"""
+
+    def __init__(self, k: int = 200) -> None:
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+        self.sketch = QuantileSketch(k)
+
+    def _combine(self, n: int, mean: float, m2: float, vmin: float, vmax: float) -> None:
+        if n == 0:
+            return
+        total = self.count + n
+        delta = mean - self.mean
+        self.mean += delta * n / total
+        self.m2 += m2 + delta * delta * self.count * n / total
+        self.count = total
+        self.min = min(self.min, vmin)
+        self.max = max(self.max, vmax)
+
+    def update(self, values: np.ndarray) -> None:
+        values = values[~np.isnan(values)]
+        if len(values):
+            mean = float(values.mean())
+            self._combine(
+                len(values),
+                mean,
+                float(((values - mean) ** 2).sum()),
+                float(values.min()),
+                float(values.max()),
+            )
+            self.sketch.update(values)
+
+    def merge(self, other: "FieldStats") -> None:
+        self._combine(other.count, other.mean, other.m2, other.min, other.max)
+        self.sketch.merge(other.sketch)
+
+    def summary(self) -> dict:
+        if self.count == 0:
+            return dict(count=0)
+        result = dict(
+            count=self.count,
+            min=self.min,
+            max=self.max,
+            mean=self.mean,
+            std=(self.m2 / (self.count - 1)) ** 0.5 if self.count > 1 else 0.0,
+        )
+        quantiles = self.sketch.quantiles(p / 100 for p in PERCENTILES)
+        result.update({f"p{p}": q for p, q in zip(PERCENTILES, quantiles)})
+        return result
+
+    def to_dict(self) -> dict:
+        return dict(self.summary(), m2=self.m2, sketch=self.sketch.to_dict())
+
+    @classmethod
+    def from_dict(cls, d: Mapping) -> "FieldStats":
+        stats = cls()
+        if d["count"]:
+            stats.count, stats.mean, stats.m2 = d["count"], d["mean"], d["m2"]
+            stats.min, stats.max = d["min"], d["max"]
+        stats.sketch = QuantileSketch.from_dict(d["sketch"])
+        return stats
+
+
+def _field_groups(fmt: str, hdr: tuple[str, ...], scale: tuple[float, ...]):
+    """
+    統計を取る列を同じヘッダ名ごとにまとめる (配列フィールドは全要素で 1 つの統計).
+    [(ヘッダ, [(構造化配列の列名, スケール), ...]), ...] を返す.
+    """
+    groups: dict[str, list[tuple[str, float]]] = {}
+    for code, h, name, sc in zip(
+        model.FMT_RE.findall(fmt), hdr, model.unique_names(hdr), scale
+    ):
+        if code in SKIP_CODES or h.startswith("reserved"):
+            continue
+        groups.setdefault(h, []).append((name, sc))
+    return list(groups.items())
+
+
+class MessageStats:
+    """
+    1 メッセージの全フィールドの統計. 固定部は行ごと, 可変部はブロックごとに数える.
+    desc=None は保存済みの統計を読み込んだ併合用のもので, update は使えない.
+    記述子から dtype を作れないメッセージは error に理由を入れ, 統計を取らない.
+    """
+
+    def __init__(self, desc: model.UbxMsgDesc | None) -> None:
+        self.desc = desc
+        self.rows = 0
+        self.error: str | None = None
+        self.groups_fix = self.groups_var = []
+        if desc is not None:
+            try:
+                model.numpy_dtype(desc.fmt_fix, desc.hdr_fix)
+                if desc.payload_len_var:
+                    model.numpy_dtype(desc.fmt_var, desc.hdr_var)
+            except ValueError as e:
+                self.error = str(e)
+                return
+            self.groups_fix = _field_groups(desc.fmt_fix, desc.hdr_fix, desc.scale_fix)
+            self.groups_var = _field_groups(desc.fmt_var, desc.hdr_var, desc.scale_var)
+        self.fields = {h: FieldStats() for h, _ in self.groups_fix + self.groups_var}
+
+    def update(self, raw: list[bytes]) -> None:
+        fix, var = ublox.decode_arrays(self.desc, raw)
+        self.rows += len(fix)
+        for arr, groups in ((fix, self.groups_fix), (var, self.groups_var)):
+            if arr is None or not len(arr):
+                continue
+            for h, columns in groups:
+                values = np.concatenate(
+                    [arr[name].astype(float) * sc for name, sc in columns]
+                )
+                self.fields[h].update(values)
+
+    def merge(self, other: "MessageStats") -> None:
+        self.rows += other.rows
+        for h, stats in other.fields.items():
+            self.fields.setdefault(h, FieldStats()).merge(stats)
+
+
+class FileStats:
+    """ファイル (または併合した複数ファイル) のメッセージごとの統計"""
+
+    def __init__(self) -> None:
+        self.sources: list[str] = []
+        self.ubx_count = 0
+        self.checksum_error_count = 0
+        self.messages: dict[str, MessageStats] = {}
+        # 記述子から dtype を作れず統計を取らなかったメッセージ名 → 理由 (ログに現れたものだけ)
+        self.skipped: dict[str, str] = {}
+
+    def merge(self, other: "FileStats") -> None:
+        self.sources += other.sources
+        self.ubx_count += other.ubx_count
+        self.checksum_error_count += other.checksum_error_count
+        for name, reason in other.skipped.items():
+            self.skipped.setdefault(name, reason)
+        for name, msg in other.messages.items():
+            if name not in self.messages:
+                # other の統計を共有しないよう, 空の統計へ併合する
+                self.messages[name] = MessageStats(msg.desc)
+            self.messages[name].merge(msg)
+
+    def to_dict(self) -> dict:
+        return dict(
+            version=VERSION,
+            sources=self.sources,
+            ubx_count=self.ubx_count,
+            checksum_error_count=self.checksum_error_count,
+            messages={
+                name: dict(
+                    rows=msg.rows,
+                    fields={h: f.to_dict() for h, f in msg.fields.items()},
+                )
+                for name, msg in self.messages.items()
+            },
+            skipped=self.skipped,
+        )
+
+    @classmethod
+    def from_dict(cls, d: Mapping) -> "FileStats":
+        if d.get("version") != VERSION:
+            raise ValueError(f"Unsupported stats version: {d.get('version')}")
+        stats = cls()
+        stats.sources = list(d["sources"])
+        stats.ubx_count = d["ubx_count"]
+        stats.checksum_error_count = d["checksum_error_count"]
+        stats.skipped = dict(d.get("skipped", {}))
+        for name, m in d["messages"].items():
+            msg = MessageStats(None)
+            msg.rows = m["rows"]
+            msg.fields = {h: FieldStats.from_dict(f) for h, f in m["fields"].items()}
+            stats.messages[name] = msg
+        return stats
+
+    def write_json(self, fobj: TextIO) -> None:
+        json.dump(self.to_dict(), fobj)
+
+    def write_csv(self, fobj: TextIO) -> None:
+        columns = ["count", "min", "max", "mean", "std"] + [f"p{p}" for p in PERCENTILES]
+        writer = csv.writer(fobj, lineterminator="\n")
+        writer.writerow(["message", "field", "rows"] + columns)
+        for name, msg in self.messages.items():
+            for h, f in msg.fields.items():
+                summary = f.summary()
+                writer.writerow([name, h, msg.rows] + [summary.get(c, "") for c in columns])
+
+
+def collect_stats(
+    filename: str,
+    gen: int | str = "auto",
+    messages: Iterable[str | int] | None = None,
+    batch_rows: int = 65536,
+    log: TextIO | None = None,
+) -> FileStats:
+    """
+    ファイルを 1 回走査して統計を取る. ペイロードは batch_rows 件ごとに numpy で
+    一括デコードして累積器へ渡し捨てるので, 使用メモリはファイルサイズによらない.
+    記述子から dtype を作れないメッセージは飛ばし, FileStats.skipped と log に残す.
+    """
+    gen = ubx_reader.resolve_generation(gen, filename)
+    ubx_messages = ubx_reader.select_messages(ubx_reader.get_messages(gen), messages)
+    index = model.length_index() if gen == "mixed" else None
+    stats = FileStats()
+    stats.sources.append(os.path.abspath(filename))
+    per_key = {key: MessageStats(desc) for key, desc in ubx_messages.items()}
+    broken = {key: per_key.pop(key) for key in list(per_key) if per_key[key].error is not None}
+    dropped: dict[int, int] = {}
+    buffers: dict[int, list[bytes]] = {key: [] for key in per_key}
+
+    with open(filename, "rb") as fobj:
+        scanner = ublox.FrameScanner(fobj, log=log)
+        for ubx_class_id, dat in scanner:
+            key = ubx_class_id
+            if index is not None and len(dat) > 0:
+                key = index.lookup(ubx_class_id, len(dat))
+            if key in broken:
+                dropped[key] = dropped.get(key, 0) + 1
+                continue
+            if key not in buffers or not model.payload_fits(ubx_messages[key], len(dat)):
+                continue
+            buf = buffers[key]
+            buf.append(dat)
+            if len(buf) >= batch_rows:
+                per_key[key].update(buf)
+                buf.clear()
+    for key, buf in buffers.items():
+        if buf:
+            per_key[key].update(buf)
+
+    for key, count in dropped.items():
+        stats.skipped[broken[key].desc.name] = broken[key].error
+        if log is not None:
+            log.write(
+                f"Skipped {broken[key].desc.name} without statistics "
+                f"({count:,} frames): {broken[key].error}\n"
+            )
+    stats.ubx_count = scanner.ubx_count
+    stats.checksum_error_count = scanner.checksum_error_count
+    stats.messages = {
+        msg.desc.name: msg for msg in per_key.values() if msg.rows
+    }
+    return stats
+
+
+def load(filename: str) -> FileStats:
+    with open(filename) as f:
+        return FileStats.from_dict(json.load(f))
+
+
+def _collect(filename: str, gen: int | str, messages: list[str] | None) -> dict:
+    # プロセス間は JSON と同じ辞書で受け渡す
+    return collect_stats(filename, gen, messages).to_dict()
+
+
+def iter_stats(
+    filenames: Iterable[str],
+    gen: int | str = "auto",
+    messages: list[str] | None = None,
+    workers: int | None = None,
+) -> Iterator[tuple[str, FileStats]]:
+    """.ubx は走査し, .json は保存済みの統計として読み込む (ファイル単位で並列)"""
+    filenames = list(filenames)
+    with concurrent.futures.ProcessPoolExecutor(workers) as pool:
+        futures = {
+            name: pool.submit(_collect, name, gen, messages)
+            for name in filenames
+            if not name.endswith(".json")
+        }
+        for name in filenames:
+            if name in futures:
+                yield name, FileStats.from_dict(futures[name].result())
+            else:
+                yield name, load(name)
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("files", nargs="+", help=".ubx logs or saved .stats.json")
+    parser.add_argument("--gen", default="auto")
+    parser.add_argument("--messages", default=None, help="comma separated names")
+    parser.add_argument("--merge", default=None, help="write one merged summary here (.json or .csv)")
+    parser.add_argument("--csv", action="store_true", help="also write <file>.stats.csv")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    gen = int(args.gen) if args.gen.isdigit() else args.gen
+    messages = args.messages.split(",") if args.messages else None
+    merged = FileStats()
+    for name, stats in iter_stats(args.files, gen, messages, args.workers):
+        if args.merge:
+            merged.merge(stats)
+            continue
+        if name.endswith(".json"):
+            continue
+        with open(name + ".stats.json", "w") as f:
+            stats.write_json(f)
+        if args.csv:
+            with open(name + ".stats.csv", "w", newline="") as f:
+                stats.write_csv(f)
+        print(f"{name}: {len(stats.messages)} messages", file=sys.stderr)
+        for msg_name, reason in stats.skipped.items():
+            print(f"{name}: skipped {msg_name} ({reason})", file=sys.stderr)
+    if args.merge:
+        with open(args.merge, "w", newline="") as f:
+            if args.merge.endswith(".csv"):
+                merged.write_csv(f)
+            else:
+                merged.write_json(f)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
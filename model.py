@@ -2,10 +2,11 @@ import dataclasses
 import struct, functools
 import re
 from typing import Mapping
+import numpy as np
 from pydantic import BaseModel, model_validator
 from class_id import mid, MsgClass, NavID, RxmID, MonID, AidID, TimID, EsfID, LogID, HnrID, CfgID, SecID
 import ublox_base, ublox7_patch, ublox8_patch, ublox9_patch
-from ublox_base import UbxMsgDesc
+from ublox_base import UbxMsgDesc, BitFields
 
 
 GEN6 = ublox_base.GEN6
@@ -41,6 +42,210 @@ def convert_fmt(fmt: str) -> str:
     return FMT_RE.sub(lambda m: FMT_TO_STRUCT[m.group(0)], fmt)
 
 
+# UBX フォーマット → numpy dtype (リトルエンディアン, パディングなし)
+FMT_TO_NUMPY: dict[str, str] = {
+    "U1": "u1",
+    "I1": "i1",
+    "X1": "u1",
+    "U2": "<u2",
+    "I2": "<i2",
+    "X2": "<u2",
+    "U4": "<u4",
+    "I4": "<i4",
+    "X4": "<u4",
+    "R4": "<f4",
+    "R8": "<f8",
+    "CH": "S1",
+}
+
+
+def unique_names(hdr: tuple[str, ...]) -> tuple[str, ...]:
+    """重複するヘッダ名に連番を付けて一意にする (reserved1, reserved1_1, ...)"""
+    seen: dict[str, int] = {}
+    names = []
+    for h in hdr:
+        n = seen.get(h, 0)
+        seen[h] = n + 1
+        names.append(h if n == 0 else f"{h}_{n}")
+    return tuple(names)
+
+
+@functools.lru_cache(maxsize=None)
+def numpy_dtype(
+    fmt: str, hdr: tuple[str, ...], keep: tuple[bool, ...] | None = None
+) -> np.dtype:
+    """
+    UBX フォーマット文字列 + ヘッダ → numpy 構造化 dtype.
+    keep を渡すと False のフィールドを除いた (オフセットはそのままの) dtype になる.
+    """
+    codes = FMT_RE.findall(fmt)
+    if len(codes) != len(hdr):
+        raise ValueError(f"フィールド数が一致しません: {len(codes)} != {len(hdr)}")
+    dtype = np.dtype(
+        [(name, FMT_TO_NUMPY[code]) for name, code in zip(unique_names(hdr), codes)]
+    )
+    if keep is None:
+        return dtype
+    names = [name for name, k in zip(dtype.names, keep) if k]
+    return np.dtype(
+        dict(
+            names=names,
+            formats=[dtype.fields[n][0] for n in names],
+            offsets=[dtype.fields[n][1] for n in names],
+            itemsize=dtype.itemsize,
+        )
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def projected_fmt(fmt: str, keep: tuple[bool, ...]) -> str:
+    """UBX フォーマット文字列 → struct フォーマット. keep が False のフィールドはパディング (x) で読み飛ばす"""
+    return "".join(
+        FMT_TO_STRUCT[code] if k else f"{struct.calcsize(FMT_TO_STRUCT[code])}x"
+        for code, k in zip(FMT_RE.findall(fmt), keep)
+    )
+
+
+def payload_fits(desc: UbxMsgDesc, length: int) -> bool:
+    """ペイロード長が定義 (固定部 + 可変部 x n) と矛盾しないか"""
+    if desc.payload_len_var:
+        rem = length - desc.payload_len_fix
+        return rem >= 0 and rem % desc.payload_len_var == 0
+    return length == desc.payload_len_fix
+
+
+# 受信時刻として使うペイロード先頭のフィールド: UBX 型 → (struct フォーマット, ms への倍率)
+CLOCK_FORMATS: dict[str, tuple[str, float]] = {
+    "U4": ("<I", 1),
+    "I4": ("<i", 1),
+    "R8": ("<d", 1000),
+}
+CLOCK_HEADERS = ("iTOW", "rcvTow")
+
+
+def clock_field(desc: UbxMsgDesc) -> tuple[str, float] | None:
+    """先頭フィールドが iTOW (NAV など) か rcvTow (RXM-RAWX など) なら (struct フォーマット, ms への倍率)"""
+    codes = FMT_RE.findall(desc.fmt_fix)[:1]
+    if not codes or not desc.hdr_fix or codes[0] not in CLOCK_FORMATS:
+        return None
+    if not desc.hdr_fix[0].startswith(CLOCK_HEADERS):
+        return None
+    return CLOCK_FORMATS[codes[0]]
+
+
+def array_runs(
+    fmt: str, hdr: tuple[str, ...], names: tuple[str, ...]
+) -> list[tuple[str, int, int, np.dtype]]:
+    """
+    配列フィールド名ごとに (名前, バイトオフセット, 要素数, dtype) を返す.
+    同名ヘッダは連続し, 同じ型でなければならない.
+    """
+    codes = FMT_RE.findall(fmt)
+    runs = []
+    for name in names:
+        idx = [i for i, h in enumerate(hdr) if h == name]
+        if not idx:
+            raise ValueError(f"配列フィールド {name} がヘッダにありません")
+        if idx != list(range(idx[0], idx[0] + len(idx))):
+            raise ValueError(f"配列フィールド {name} が連続していません")
+        kinds = {codes[i] for i in idx}
+        if len(kinds) != 1 or "CH" in kinds:
+            raise ValueError(f"配列フィールド {name} の型が不正です: {kinds}")
+        offset = struct.calcsize("<" + convert_fmt("".join(codes[: idx[0]])))
+        runs.append((name, offset, len(idx), np.dtype(FMT_TO_NUMPY[codes[idx[0]]])))
+    return runs
+
+
+UNIT_RE = re.compile(r"^(.*?)\s*\((.*)\)$")
+
+
+@dataclasses.dataclass(frozen=True)
+class FieldColumn:
+    """
+    型付きの出力 (SQLite など) の 1 列. 同名ヘッダが連続する CH は 1 つの文字列,
+    配列フィールドは count 要素の配列としてまとめる.
+    name はヘッダから単位を除いて一意にしたもの (iTOW (ms) → iTOW).
+    """
+
+    name: str
+    header: str
+    code: str
+    offset: int
+    count: int
+    scale: float
+
+    @property
+    def unit(self) -> str:
+        m = UNIT_RE.match(self.header)
+        return m.group(2) if m else ""
+
+    @property
+    def dtype(self) -> np.dtype:
+        """1 要素の dtype (CH の列は count 文字の bytes)"""
+        if self.code == "CH":
+            return np.dtype(f"S{self.count}")
+        return np.dtype(FMT_TO_NUMPY[self.code])
+
+
+@functools.lru_cache(maxsize=None)
+def field_columns(
+    fmt: str, hdr: tuple[str, ...], scale: tuple[float, ...], arrays: tuple[str, ...] = ()
+) -> tuple[FieldColumn, ...]:
+    """フォーマット・ヘッダ・スケールから列の並びを作る (arrays は array_fix/array_var)"""
+    codes = FMT_RE.findall(fmt)
+    if not (len(codes) == len(hdr) == len(scale)):
+        raise ValueError(
+            f"フィールド数が一致しません: {len(codes)}, {len(hdr)}, {len(scale)}"
+        )
+    sizes = [struct.calcsize(FMT_TO_STRUCT[c]) for c in codes]
+    groups: list[list[int]] = []
+    for i, (code, h) in enumerate(zip(codes, hdr)):
+        prev = groups[-1][-1] if groups else None
+        if (
+            prev is not None
+            and hdr[prev] == h
+            and codes[prev] == code
+            and (code == "CH" or h in arrays)
+        ):
+            groups[-1].append(i)
+        else:
+            groups.append([i])
+    bases = [UNIT_RE.sub(r"\1", hdr[g[0]]) for g in groups]
+    columns = []
+    for g, name in zip(groups, unique_names(tuple(bases))):
+        columns.append(
+            FieldColumn(
+                name=name,
+                header=hdr[g[0]],
+                code=codes[g[0]],
+                offset=sum(sizes[: g[0]]),
+                count=len(g),
+                scale=scale[g[0]],
+            )
+        )
+    return tuple(columns)
+
+
+def field_selected(header: str, names: frozenset[str]) -> bool:
+    """ヘッダ (iTOW (ms)) か単位を除いた名前 (iTOW) が names にあるか"""
+    return header in names or UNIT_RE.sub(r"\1", header) in names
+
+
+def columns_dtype(columns: tuple[FieldColumn, ...], itemsize: int) -> np.dtype:
+    """列だけを取り出す構造化 dtype (他のバイトは読み飛ばす)"""
+    return np.dtype(
+        dict(
+            names=[c.name for c in columns],
+            formats=[
+                c.dtype if c.code == "CH" or c.count == 1 else (c.dtype, (c.count,))
+                for c in columns
+            ],
+            offsets=[c.offset for c in columns],
+            itemsize=itemsize,
+        )
+    )
+
+
 class UbxDescValidator(BaseModel):
     name: str | None = None
     payload_len_fix: int | None = None
@@ -51,6 +256,10 @@ class UbxDescValidator(BaseModel):
     hdr_fix: tuple[str, ...] | None = None
     scale_var: tuple[float, ...] | None = None
     hdr_var: tuple[str, ...] | None = None
+    bits_fix: BitFields | None = None
+    bits_var: BitFields | None = None
+    array_fix: tuple[str, ...] | None = None
+    array_var: tuple[str, ...] | None = None
 
     model_config = dict(extra="forbid")
 
@@ -113,6 +322,38 @@ class UbxDescValidator(BaseModel):
         return self
 
 
+    @model_validator(mode="after")
+    def check_bits(self):
+        for bits, fmt, hdr in (
+            (self.bits_fix, self.fmt_fix, self.hdr_fix),
+            (self.bits_var, self.fmt_var, self.hdr_var),
+        ):
+            if not bits:
+                continue
+            codes = FMT_RE.findall(fmt or "")
+            for field, ranges in bits:
+                if field not in (hdr or ()):
+                    raise ValueError(f"ビットフィールド {field} がヘッダにありません")
+                code = codes[hdr.index(field)]
+                if not code.startswith("X"):
+                    raise ValueError(f"ビットフィールド {field} が X 型ではありません: {code}")
+                for name, lsb, width in ranges:
+                    if width < 1 or lsb + width > int(code[1]) * 8:
+                        raise ValueError(f"ビット範囲 {field}.{name} が {code} を超えています")
+        return self
+
+
+    @model_validator(mode="after")
+    def check_arrays(self):
+        for arrays, fmt, hdr in (
+            (self.array_fix, self.fmt_fix, self.hdr_fix),
+            (self.array_var, self.fmt_var, self.hdr_var),
+        ):
+            for name in arrays or ():
+                array_runs(fmt or "", hdr or (), (name,))
+        return self
+
+
 # ---------------- パッチ側 -----------------
 def validate_patch_keys(raw_patch: Mapping[int, dict]) -> None:
     valid_keys = set(UbxMsgDesc.__annotations__)  # 全フィールド名
@@ -169,3 +410,60 @@ ubx_messages_6 = build_desc(GEN6, GEN6_PATCH)
 ubx_messages_7 = build_desc(GEN6, GEN7_PATCH)
 ubx_messages_8 = build_desc(GEN6, GEN8_PATCH)
 ubx_messages_9 = build_desc(GEN6, GEN9_PATCH)
+
+
+class LengthIndex:
+    """
+    全世代の定義を (class/id, ペイロード長) で引く索引.
+    同じ class/id でも長さ (レイアウト) が異なる定義は別メッセージとして扱い,
+    2 つ目以降のレイアウトは class/id | (k << 16) のキーと "<name>_<長さ>" の名前を持つ.
+    同じ長さに合う定義が複数あれば新しい世代を優先する.
+    """
+
+    def __init__(self, tables: Mapping[int, Mapping[int, UbxMsgDesc]]) -> None:
+        layouts: dict[int, list[UbxMsgDesc]] = {}
+        for gen in sorted(tables, reverse=True):
+            for mid, desc in tables[gen].items():
+                shape = (desc.payload_len_fix, desc.payload_len_var)
+                known = layouts.setdefault(mid, [])
+                if all((d.payload_len_fix, d.payload_len_var) != shape for d in known):
+                    known.append(desc)
+
+        self.messages: dict[int, UbxMsgDesc] = {}
+        self._layouts: dict[int, list[int]] = {}
+        for mid, descs in layouts.items():
+            for k, desc in enumerate(descs):
+                key = mid | (k << 16)
+                if len(descs) > 1:
+                    suffix = f"_{desc.payload_len_fix}"
+                    if desc.payload_len_var:
+                        suffix += f"_{desc.payload_len_var}"
+                    desc = dataclasses.replace(desc, name=desc.name + suffix)
+                self.messages[key] = desc
+                self._layouts.setdefault(mid, []).append(key)
+        self._cache: dict[tuple[int, int], int | None] = {}
+
+    def lookup(self, mid: int, length: int) -> int | None:
+        """class/id とペイロード長に合うメッセージのキーを返す (結果はキャッシュ)"""
+        try:
+            return self._cache[(mid, length)]
+        except KeyError:
+            pass
+        key = next(
+            (
+                k
+                for k in self._layouts.get(mid, ())
+                if payload_fits(self.messages[k], length)
+            ),
+            None,
+        )
+        self._cache[(mid, length)] = key
+        return key
+
+
+@functools.lru_cache(maxsize=None)
+def length_index() -> LengthIndex:
+    """世代混在ログ用の索引 (初回呼び出し時に一度だけ構築)"""
+    return LengthIndex(
+        {6: ubx_messages_6, 7: ubx_messages_7, 8: ubx_messages_8, 9: ubx_messages_9}
+    )
@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+"""Pipelined frame scanning: reader thread, framing, checksum worker processes."""
+
+import collections
+import concurrent.futures
+import os
+import queue
+import threading
+from typing import BinaryIO, Iterator, TextIO
+import ublox
+
+# これより小さいファイルはワーカー起動のコストの方が大きい
+PARALLEL_MIN_SIZE = 64 << 20
+
+
+def auto_workers(filesize: int) -> int:
+    """ファイルサイズに応じたチェックサム検証ワーカー数 (0 は直列処理)"""
+    cpus = os.cpu_count() or 1
+    if filesize < PARALLEL_MIN_SIZE or cpus < 2:
+        return 0
+    return cpus
+
+
+def verify_batch(frames: list[tuple[bytes, int]]) -> list[tuple[int, int]]:
+    """ワーカープロセスで実行. チェックサムが合わないフレームの (番号, 計算値) を返す"""
+    bad = []
+    for i, (dat, checksum_data) in enumerate(frames):
+        ch = ublox.checksum(dat)
+        if ch != checksum_data:
+            bad.append((i, ch))
+    return bad
+
+
+class _QueueFile:
+    """読み込みスレッドが積んだチャンクを read で順に返すファイル風オブジェクト"""
+
+    def __init__(self, chunks: queue.Queue) -> None:
+        self.chunks = chunks
+
+    def read(self, size: int = -1) -> bytes:
+        chunk = self.chunks.get()
+        if isinstance(chunk, BaseException):
+            raise chunk
+        return chunk
+
+
+class PipelineScanner:
+    """
+    FrameScanner と同じインターフェースで, 以下の段をキューでつないで並行実行する.
+    1. 読み込みスレッド (チャンク単位, 最大 queue_size 個を先読み)
+    2. フレーム分割 (呼び出し元スレッド)
+    3. チェックサム検証 (batch_frames フレーム単位でプロセスプールへ, 最大 queue_size バッチ)
+    結果は受信順に (class/id, payload) として返す.
+    """
+
+    def __init__(
+        self,
+        fobj: BinaryIO,
+        workers: int | None = None,
+        log: TextIO | None = None,
+        chunk_size: int = 1 << 20,
+        batch_frames: int = 4096,
+        queue_size: int = 8,
+        offset: int = 0,
+        decimator: ublox.Decimator | None = None,
+    ) -> None:
+        self.fobj = fobj
+        self.workers = workers
+        self.log = log
+        self.batch_frames = batch_frames
+        self.queue_size = queue_size
+        self.chunks: queue.Queue = queue.Queue(queue_size)
+        # 集計とログ出力は FrameScanner のものをそのまま使う
+        self.framer = ublox.FrameScanner(
+            _QueueFile(self.chunks), chunk_size, log, offset, decimator
+        )
+        self.stop = threading.Event()
+        # 直前に返したフレームの末尾のファイル上の位置 (分割段より遅れて進む)
+        self.offset = offset
+        # offset の時点の間引きの途中経過 (分割段の Decimator は先へ進んでいる)
+        self.decimator_state = decimator.state() if decimator is not None else None
+
+    @property
+    def read_count(self) -> int:
+        return self.framer.read_count
+
+    @property
+    def ubx_count(self) -> int:
+        return self.framer.ubx_count
+
+    @ubx_count.setter
+    def ubx_count(self, value: int) -> None:
+        self.framer.ubx_count = value
+
+    @property
+    def checksum_error_count(self) -> int:
+        return self.framer.checksum_error_count
+
+    @checksum_error_count.setter
+    def checksum_error_count(self, value: int) -> None:
+        self.framer.checksum_error_count = value
+
+    @property
+    def decimated_count(self) -> int:
+        return self.framer.decimated_count
+
+    @decimated_count.setter
+    def decimated_count(self, value: int) -> None:
+        self.framer.decimated_count = value
+
+    def _read(self) -> None:
+        try:
+            while not self.stop.is_set():
+                data = self.fobj.read(self.framer.chunk_size)
+                self._put(data)
+                if not data:
+                    return
+        except Exception as e:
+            self._put(e)
+
+    def _put(self, item) -> None:
+        while not self.stop.is_set():
+            try:
+                self.chunks.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def _collect(
+        self,
+        batch: list[tuple[bytes, int]],
+        offsets: list[int],
+        skipped: list[int],
+        states: list[dict] | None,
+        future: concurrent.futures.Future,
+    ) -> Iterator[tuple[int, bytes]]:
+        bad = dict(future.result())
+        for i, (dat, checksum_data) in enumerate(batch):
+            # 間引いたフレームも受信順に数える
+            self.framer.ubx_count += skipped[i] + 1
+            self.framer.decimated_count += skipped[i]
+            self.offset = offsets[i]
+            if states is not None:
+                self.decimator_state = states[i]
+            if i in bad:
+                self.framer.log_checksum_error(dat, checksum_data, bad[i])
+                continue
+            yield int.from_bytes(dat[:2], "big"), dat[4:]
+
+    def __iter__(self) -> Iterator[tuple[int, bytes]]:
+        reader = threading.Thread(target=self._read, daemon=True)
+        reader.start()
+        try:
+            with concurrent.futures.ProcessPoolExecutor(self.workers) as pool:
+                pending = collections.deque()
+                decimator = self.framer.decimator
+                # 間引く場合はフレームごとに判定直後の途中経過を控え, 返す時点の値にする
+                batch, offsets, skipped = [], [], []
+                states = [] if decimator is not None else None
+                skip = 0
+                for frame in self.framer.iter_frames():
+                    # 間引くフレームはワーカーへ送らない
+                    if decimator is not None and not decimator(frame[0]):
+                        skip += 1
+                        continue
+                    batch.append(frame)
+                    offsets.append(self.framer.offset)
+                    skipped.append(skip)
+                    if states is not None:
+                        states.append(decimator.state())
+                    skip = 0
+                    if len(batch) < self.batch_frames:
+                        continue
+                    pending.append(
+                        (batch, offsets, skipped, states, pool.submit(verify_batch, batch))
+                    )
+                    batch, offsets, skipped = [], [], []
+                    states = [] if decimator is not None else None
+                    if len(pending) >= self.queue_size:
+                        yield from self._collect(*pending.popleft())
+                if batch:
+                    pending.append(
+                        (batch, offsets, skipped, states, pool.submit(verify_batch, batch))
+                    )
+                while pending:
+                    yield from self._collect(*pending.popleft())
+                self.framer.ubx_count += skip
+                self.framer.decimated_count += skip
+                self.offset = self.framer.offset
+                self.decimator_state = self.framer.decimator_state
+        finally:
+            self.stop.set()
+            reader.join()
@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+"""Filter expressions over message fields, evaluated on batches of raw payloads."""
+
+import ast
+import operator
+from typing import Callable, Iterable
+import numpy as np
+import model
+
+# フィールドの値を返す関数 → 値 (ndarray) またはマスク
+Evaluator = Callable[[Callable[[str], np.ndarray]], np.ndarray]
+
+COMPARE_OPS = {
+    ast.Eq: operator.eq,
+    ast.NotEq: operator.ne,
+    ast.Lt: operator.lt,
+    ast.LtE: operator.le,
+    ast.Gt: operator.gt,
+    ast.GtE: operator.ge,
+}
+BINARY_OPS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.Mod: operator.mod,
+    ast.BitAnd: operator.and_,
+    ast.BitOr: operator.or_,
+    ast.RShift: operator.rshift,
+}
+
+
+class Expression:
+    """
+    1 つのフィルタ式. フィールド名 (単位を除いたヘッダ, model.field_columns の name),
+    数値・文字列の定数, 比較 (連鎖も可), in / not in (定数のタプル), 算術・ビット演算
+    (+ - * / % & | >>), and / or / not が使える. 値はスケール適用後 (CSV と同じ) で比較する.
+    例: "fixType == 3 and numSV >= 8", "cno > 30", "flags & 1"
+    """
+
+    def __init__(self, text: str) -> None:
+        self.text = text
+        try:
+            tree = ast.parse(text.strip(), mode="eval")
+        except SyntaxError as e:
+            raise ValueError(f"Invalid filter {text!r}: {e.msg}") from None
+        self.names: set[str] = set()
+        self.evaluate = self._compile(tree.body)
+
+    def mask(self, get: Callable[[str], np.ndarray], n: int) -> np.ndarray:
+        """n 行分の真偽値の配列 (0 以外を真とする)"""
+        return np.broadcast_to(np.asarray(self.evaluate(get), bool), (n,))
+
+    def _compile(self, node: ast.AST) -> Evaluator:
+        if isinstance(node, ast.Name):
+            self.names.add(node.id)
+            return lambda get, name=node.id: get(name)
+        if isinstance(node, ast.Constant) and isinstance(node.value, (int, float, str)):
+            value = node.value.encode("ascii") if isinstance(node.value, str) else node.value
+            return lambda get: value
+        if isinstance(node, ast.BoolOp):
+            parts = [self._compile(v) for v in node.values]
+            reduce = np.logical_and if isinstance(node.op, ast.And) else np.logical_or
+            return lambda get: reduce.reduce([np.asarray(p(get), bool) for p in parts])
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
+            operand = self._compile(node.operand)
+            return lambda get: ~np.asarray(operand(get), bool)
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub):
+            operand = self._compile(node.operand)
+            return lambda get: -operand(get)
+        if isinstance(node, ast.BinOp) and type(node.op) in BINARY_OPS:
+            op = BINARY_OPS[type(node.op)]
+            left, right = self._compile(node.left), self._compile(node.right)
+            return lambda get: op(left(get), right(get))
+        if isinstance(node, ast.Compare):
+            return self._compare(node)
+        raise ValueError(f"Unsupported expression in filter {self.text!r}: {ast.unparse(node)}")
+
+    @staticmethod
+    def _is_constant(node: ast.AST) -> bool:
+        """定数か, 負号の付いた定数 (-1)"""
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub):
+            node = node.operand
+        return isinstance(node, ast.Constant)
+
+    def _compare(self, node: ast.Compare) -> Evaluator:
+        terms = [node.left] + node.comparators
+        steps = []
+        for op, left, right in zip(node.ops, terms, terms[1:]):
+            if isinstance(op, (ast.In, ast.NotIn)):
+                if not isinstance(right, (ast.Tuple, ast.List, ast.Set)) or not all(
+                    self._is_constant(e) for e in right.elts
+                ):
+                    raise ValueError(f"'in' needs a tuple of constants in filter {self.text!r}")
+                values = [self._compile(e)(None) for e in right.elts]
+                steps.append((self._compile(left), values, isinstance(op, ast.NotIn)))
+            elif type(op) in COMPARE_OPS:
+                steps.append((self._compile(left), self._compile(right), COMPARE_OPS[type(op)]))
+            else:
+                raise ValueError(f"Unsupported comparison in filter {self.text!r}")
+
+        def evaluate(get: Callable[[str], np.ndarray]) -> np.ndarray:
+            mask = None
+            for left, right, op in steps:
+                if isinstance(right, list):
+                    m = np.isin(left(get), right, invert=op)
+                else:
+                    m = op(left(get), right(get))
+                mask = m if mask is None else mask & m
+            return mask
+
+        return evaluate
+
+
+class RowFilter:
+    """
+    メッセージのフィルタ式 (複数なら and). 可変部のフィールドを参照しない式は行 (フレーム) を,
+    参照する式は繰り返しブロックを選ぶ (固定部のフィールドは各ブロックへ複製して評価する).
+    ブロックをすべて除かれた行も固定部は残り, 繰り返し数のフィールド (numMeas など) は元の値のまま.
+    参照するフィールドだけをペイロードのバッチから numpy で取り出して評価する.
+    """
+
+    def __init__(self, desc: model.UbxMsgDesc, expressions: Iterable[str]) -> None:
+        self.msg_desc = desc
+        self.expressions = [Expression(e) for e in expressions]
+        columns_fix = {
+            c.name: c
+            for c in model.field_columns(desc.fmt_fix, desc.hdr_fix, desc.scale_fix, desc.array_fix)
+        }
+        columns_var = {}
+        if desc.payload_len_var:
+            columns_var = {
+                c.name: c
+                for c in model.field_columns(
+                    desc.fmt_var, desc.hdr_var, desc.scale_var, desc.array_var
+                )
+            }
+        self.row_exprs, self.block_exprs = [], []
+        used_fix, used_var = {}, {}
+        for expr in self.expressions:
+            for name in expr.names:
+                if name in columns_fix and name in columns_var:
+                    raise ValueError(f"Ambiguous field {name!r} for {desc.name} in filter {expr.text!r}")
+                column = columns_fix.get(name) or columns_var.get(name)
+                if column is None:
+                    raise ValueError(f"Unknown field {name!r} for {desc.name} in filter {expr.text!r}")
+                if column.count > 1 and column.code != "CH":
+                    raise ValueError(f"Array field {name!r} cannot be used in filters")
+                (used_fix if name in columns_fix else used_var)[name] = column
+            if expr.names & set(columns_var):
+                self.block_exprs.append(expr)
+            else:
+                self.row_exprs.append(expr)
+        self.columns_fix = tuple(used_fix.values())
+        self.columns_var = tuple(used_var.values())
+        self.rejected_rows = 0
+        self.rejected_blocks = 0
+        # 0 行で評価して, 演算できない型の組み合わせ ((lat & 1) など) をここで弾く
+        try:
+            self.apply([])
+        except TypeError as e:
+            texts = ", ".join(repr(expr.text) for expr in self.expressions)
+            raise ValueError(f"Invalid filter {texts} for {desc.name}: {e}") from None
+
+    @staticmethod
+    def _values(array: np.ndarray, columns: tuple[model.FieldColumn, ...]) -> dict[str, np.ndarray]:
+        values = {}
+        for c in columns:
+            v = array[c.name]
+            values[c.name] = v * c.scale if c.scale != 1 else v
+        return values
+
+    def apply(self, raw: list[bytes]) -> list[bytes]:
+        """残すペイロードを返す (ブロックを除いた行は作り直す)"""
+        desc = self.msg_desc
+        len_fix = desc.payload_len_fix
+        fix = np.frombuffer(
+            b"".join(d[:len_fix] for d in raw),
+            dtype=model.columns_dtype(self.columns_fix, len_fix),
+        )
+        values = self._values(fix, self.columns_fix)
+        keep = np.ones(len(raw), bool)
+        for expr in self.row_exprs:
+            keep &= expr.mask(values.__getitem__, len(keep))
+        if not self.block_exprs:
+            self.rejected_rows += len(raw) - int(keep.sum())
+            return [raw[i] for i in np.flatnonzero(keep)]
+
+        len_var = desc.payload_len_var
+        counts = np.array([(len(d) - len_fix) // len_var for d in raw], dtype=np.int64)
+        blocks = np.frombuffer(b"".join(d[len_fix:] for d in raw), dtype=np.uint8)
+        blocks = blocks.reshape(-1, len_var)
+        parent = np.repeat(np.arange(len(raw)), counts)
+        var = blocks.view(model.columns_dtype(self.columns_var, len_var)).reshape(-1)
+        block_values = self._values(var, self.columns_var)
+        block_values.update({k: v[parent] for k, v in values.items()})
+        block_keep = keep[parent]
+        for expr in self.block_exprs:
+            block_keep &= expr.mask(block_values.__getitem__, len(block_keep))
+        self.rejected_rows += len(raw) - int(keep.sum())
+        self.rejected_blocks += int(keep[parent].sum() - block_keep.sum())
+
+        kept = blocks[block_keep]
+        n_kept = np.bincount(parent[block_keep], minlength=len(raw))
+        ends = np.cumsum(n_kept)
+        starts = ends - n_kept
+        result = []
+        for i in np.flatnonzero(keep):
+            if n_kept[i] == counts[i]:
+                result.append(raw[i])
+            else:
+                result.append(raw[i][:len_fix] + kept[starts[i] : ends[i]].tobytes())
+        return result
@@ -0,0 +1,565 @@
+# -*- coding: utf-8 -*-
+"""Output sinks fed with decoded batches by Ublox.write."""
+
+import abc
+import json
+import os
+import queue
+import sqlite3
+import threading
+from typing import TYPE_CHECKING, Iterable
+import numpy as np
+import pandas as pd
+import model
+
+if TYPE_CHECKING:
+    import ublox
+
+
+class Sink(abc.ABC):
+    """
+    1 メッセージ分の書き出し先.
+    write にはバッチごとの生ペイロードと, それをスケール/ヘッダ適用した DataFrame が渡される.
+    uses_frame=False のシンクは生ペイロードだけを使い, 全シンクがそうなら DataFrame は作られない (None).
+    """
+
+    uses_frame = True
+
+    def __init__(self, instance: "ublox.Ublox", basename: str) -> None:
+        self.instance = instance
+        self.basename = basename
+
+    @abc.abstractmethod
+    def write(self, raw: list[bytes], df: pd.DataFrame | None) -> None:
+        ...
+
+    @abc.abstractmethod
+    def close(self) -> list[str]:
+        """後処理を行い, 書き出したファイル名を返す"""
+
+
+class CsvSink(Sink):
+    """drop に指定したヘッダ名の列は書き出さない"""
+
+    def __init__(
+        self, instance: "ublox.Ublox", basename: str, drop: tuple[str, ...] = ()
+    ) -> None:
+        super().__init__(instance, basename)
+        self.filename = basename + ".csv"
+        self.drop = drop
+        self.first = True
+
+    def write(self, raw: list[bytes], df: pd.DataFrame) -> None:
+        if self.drop:
+            df = df.drop(columns=list(self.drop), errors="ignore")
+        # df は他のシンクと共有しているので列名は書き換えない
+        header = ["# " + df.columns[0]] + list(df.columns[1:]) if self.first else False
+        df.to_csv(
+            self.filename, mode="w" if self.first else "a", header=header, index=False
+        )
+        self.first = False
+
+    def close(self) -> list[str]:
+        return [] if self.first else [self.filename]
+
+
+class ParquetSink(Sink):
+    """
+    pyarrow が必要. "<basename>.parquet" にスケール未適用の値をフォーマットどおりの型
+    (U4 → uint32 など) で書き, 繰り返しブロックは "<basename>_blocks.parquet" (frame, block, ...) に分ける.
+    列は model.field_columns の単位で, 各列のメタデータに header/unit/code/scale を持つ.
+    スケールは column_reader で読む時に参照した列にだけ適用する.
+    """
+
+    uses_frame = False
+
+    def __init__(self, instance: "ublox.Ublox", basename: str) -> None:
+        super().__init__(instance, basename)
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise ImportError("Parquet output requires pyarrow") from None
+        self.pa = pyarrow
+        self.pq = pyarrow.parquet
+        self.columns_fix = instance.columns_fix
+        self.columns_var = instance.columns_var
+        self.filename = basename + ".parquet"
+        self.filename_blocks = basename + "_blocks.parquet"
+        self.writer = None
+        self.writer_blocks = None
+        self.frames = 0
+
+    def _field(self, c: model.FieldColumn):
+        pa = self.pa
+        if c.code == "CH":
+            type_ = pa.string()
+        elif c.count > 1:
+            type_ = pa.list_(pa.from_numpy_dtype(c.dtype), c.count)
+        else:
+            type_ = pa.from_numpy_dtype(c.dtype)
+        metadata = dict(header=c.header, unit=c.unit, code=c.code, scale=repr(c.scale))
+        return pa.field(c.name, type_, metadata=metadata)
+
+    def _schema(self, keys: list, columns: tuple[model.FieldColumn, ...]):
+        return self.pa.schema(keys + [self._field(c) for c in columns])
+
+    def _arrays(self, arr: np.ndarray, columns: tuple[model.FieldColumn, ...]) -> list:
+        pa = self.pa
+        arrays = []
+        for c in columns:
+            col = arr[c.name]
+            if c.code == "CH":
+                arrays.append(pa.array(np.char.decode(col, "ascii", "ignore")))
+            elif c.count > 1:
+                values = pa.array(np.ascontiguousarray(col).reshape(-1))
+                arrays.append(pa.FixedSizeListArray.from_arrays(values, c.count))
+            else:
+                arrays.append(pa.array(np.ascontiguousarray(col)))
+        return arrays
+
+    def write(self, raw: list[bytes], df: pd.DataFrame | None) -> None:
+        pa = self.pa
+        fix, var, counts = decode_columns(
+            self.instance.msg_desc, raw, self.columns_fix, self.columns_var
+        )
+        frames = np.arange(self.frames, self.frames + len(raw), dtype=np.uint32)
+        if self.writer is None:
+            self.writer = self.pq.ParquetWriter(
+                self.filename,
+                self._schema([pa.field("frame", pa.uint32())], self.columns_fix),
+            )
+        self.writer.write_table(
+            pa.Table.from_arrays(
+                [pa.array(frames)] + self._arrays(fix, self.columns_fix),
+                schema=self.writer.schema,
+            )
+        )
+        if var is not None and len(var):
+            if self.writer_blocks is None:
+                self.writer_blocks = self.pq.ParquetWriter(
+                    self.filename_blocks,
+                    self._schema(
+                        [pa.field("frame", pa.uint32()), pa.field("block", pa.uint16())],
+                        self.columns_var,
+                    ),
+                )
+            starts = np.repeat(np.cumsum(counts) - counts, counts)
+            block = (np.arange(len(var)) - starts).astype(np.uint16)
+            self.writer_blocks.write_table(
+                pa.Table.from_arrays(
+                    [pa.array(np.repeat(frames, counts)), pa.array(block)]
+                    + self._arrays(var, self.columns_var),
+                    schema=self.writer_blocks.schema,
+                )
+            )
+        self.frames += len(raw)
+
+    def close(self) -> list[str]:
+        files = []
+        for writer, filename in (
+            (self.writer, self.filename),
+            (self.writer_blocks, self.filename_blocks),
+        ):
+            if writer is not None:
+                writer.close()
+                files.append(filename)
+        self.writer = self.writer_blocks = None
+        return files
+
+
+class NpySink(Sink):
+    """
+    配列フィールド (array_fix/array_var) を "<basename>_<field>.npy" へ書き出す (スケール未適用, mmap 可).
+    固定部の配列は (行数, 要素数), 可変部は (行数, 最大ブロック数, 要素数) で,
+    ブロックが無い部分は 0 になる.
+    """
+
+    uses_frame = False
+
+    def __init__(self, instance: "ublox.Ublox", basename: str) -> None:
+        super().__init__(instance, basename)
+        desc = instance.msg_desc
+        self.runs_fix = model.array_runs(desc.fmt_fix, desc.hdr_fix, instance.array_fix)
+        self.runs_var = model.array_runs(desc.fmt_var, desc.hdr_var, instance.array_var)
+        self.files = []
+        self.arrays_fix = []
+        self.arrays_var = []
+        self.row = 0
+
+    def _open(self) -> None:
+        instance = self.instance
+        for name, offset, n, dtype in self.runs_fix:
+            self.files.append(f"{self.basename}_{name}.npy")
+            self.arrays_fix.append(
+                np.lib.format.open_memmap(
+                    self.files[-1], mode="w+", dtype=dtype, shape=(instance.count, n)
+                )
+            )
+        for name, offset, n, dtype in self.runs_var:
+            self.files.append(f"{self.basename}_{name}.npy")
+            self.arrays_var.append(
+                np.lib.format.open_memmap(
+                    self.files[-1],
+                    mode="w+",
+                    dtype=dtype,
+                    shape=(instance.count, instance.n_var_max, n),
+                )
+            )
+
+    def write(self, raw: list[bytes], df: pd.DataFrame | None) -> None:
+        desc = self.instance.msg_desc
+        len_fix = desc.payload_len_fix
+        if not self.files:
+            self._open()
+        for dat in raw:
+            for arr, (_, offset, n, dtype) in zip(self.arrays_fix, self.runs_fix):
+                arr[self.row] = np.frombuffer(dat, dtype=dtype, count=n, offset=offset)
+            if self.arrays_var and len(dat) > len_fix:
+                blocks = np.frombuffer(dat, dtype=np.uint8, offset=len_fix).reshape(
+                    -1, desc.payload_len_var
+                )
+                for arr, (_, offset, n, dtype) in zip(self.arrays_var, self.runs_var):
+                    size = n * dtype.itemsize
+                    arr[self.row, : len(blocks)] = (
+                        blocks[:, offset : offset + size].copy().view(dtype)
+                    )
+            self.row += 1
+
+    def close(self) -> list[str]:
+        for arr in self.arrays_fix + self.arrays_var:
+            arr.flush()
+        self.arrays_fix = self.arrays_var = []
+        return self.files
+
+
+def decode_columns(
+    desc: model.UbxMsgDesc,
+    raw: list[bytes],
+    columns_fix: tuple[model.FieldColumn, ...],
+    columns_var: tuple[model.FieldColumn, ...],
+) -> tuple[np.ndarray, np.ndarray | None, np.ndarray]:
+    """
+    生ペイロードの列から指定した列だけを構造化配列として取り出す (スケール未適用).
+    可変部は全フレームのブロックを連結した配列で, フレームごとのブロック数も返す.
+    """
+    len_fix = desc.payload_len_fix
+    dtype_fix = model.columns_dtype(columns_fix, len_fix)
+    if not desc.payload_len_var:
+        return np.frombuffer(b"".join(raw), dtype=dtype_fix), None, np.zeros(len(raw), int)
+    fix = np.frombuffer(b"".join(d[:len_fix] for d in raw), dtype=dtype_fix)
+    counts = np.array([(len(d) - len_fix) // desc.payload_len_var for d in raw])
+    var = np.frombuffer(
+        b"".join(d[len_fix:] for d in raw),
+        dtype=model.columns_dtype(columns_var, desc.payload_len_var),
+    )
+    return fix, var, counts
+
+
+SQLITE_FILENAME = "ubx.sqlite"
+SQLITE_TYPES = {"U": "INTEGER", "I": "INTEGER", "X": "INTEGER", "R": "REAL", "C": "TEXT"}
+
+
+class SqliteSink(Sink):
+    """
+    出力先ディレクトリの ubx.sqlite に, メッセージごとのテーブル "<name>" と
+    繰り返しブロックの子テーブル "<name>_blocks" (frame, block で親の frame を参照) を作る.
+    列はフォーマットに応じた型のスケール未適用の値で, 単位を除いたヘッダ名 (model.field_columns),
+    スケールと元のヘッダは _columns テーブルに記録する. CH は文字列, 配列フィールドは BLOB.
+    バッチごとに executemany を 1 トランザクションで実行し, 読み込み後に
+    (week, iTOW) / (week, rcvTow) と子テーブルの frame に索引を作る.
+    同じメッセージのテーブルは作り直す.
+    """
+
+    uses_frame = False
+
+    def __init__(self, instance: "ublox.Ublox", basename: str) -> None:
+        super().__init__(instance, basename)
+        self.filename = os.path.join(os.path.dirname(basename), SQLITE_FILENAME)
+        self.table = os.path.basename(basename)
+        self.columns_fix = instance.columns_fix
+        self.columns_var = instance.columns_var
+        self.con: sqlite3.Connection | None = None
+        self.frames = 0
+
+    @staticmethod
+    def _sql_type(column: model.FieldColumn) -> str:
+        if column.count > 1 and column.code != "CH":
+            return "BLOB"
+        return SQLITE_TYPES[column.code[0]]
+
+    def _create(self, table: str, keys: str, columns: tuple[model.FieldColumn, ...]) -> None:
+        defs = ", ".join(f'"{c.name}" {self._sql_type(c)}' for c in columns)
+        self.con.execute(f'DROP TABLE IF EXISTS "{table}"')
+        self.con.execute(f'CREATE TABLE "{table}" ({keys}, {defs})')
+        self.con.execute("DELETE FROM _columns WHERE tbl = ?", (table,))
+        self.con.executemany(
+            "INSERT INTO _columns VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [
+                (table, k, c.name, c.header, c.unit, c.code, c.scale)
+                for k, c in enumerate(columns)
+            ],
+        )
+
+    def _open(self) -> None:
+        # ThreadedSink では write と close が別スレッドになる
+        self.con = sqlite3.connect(self.filename, timeout=600, check_same_thread=False)
+        self.con.execute("PRAGMA journal_mode=WAL")
+        self.con.execute("PRAGMA synchronous=NORMAL")
+        with self.con:
+            self.con.execute(
+                "CREATE TABLE IF NOT EXISTS _columns (tbl TEXT, position INTEGER, name TEXT,"
+                " header TEXT, unit TEXT, code TEXT, scale REAL, PRIMARY KEY (tbl, position))"
+            )
+            self.con.execute(f'DROP TABLE IF EXISTS "{self.table}_blocks"')
+            self._create(self.table, "frame INTEGER PRIMARY KEY", self.columns_fix)
+            if self.columns_var:
+                self._create(
+                    f"{self.table}_blocks",
+                    f'frame INTEGER NOT NULL REFERENCES "{self.table}" (frame),'
+                    " block INTEGER NOT NULL",
+                    self.columns_var,
+                )
+
+    @staticmethod
+    def _values(arr: np.ndarray, columns: tuple[model.FieldColumn, ...]) -> list[list]:
+        values = []
+        for c in columns:
+            col = arr[c.name]
+            if c.code == "CH":
+                values.append([v.decode("ascii", "ignore") for v in col.tolist()])
+            elif c.count > 1:
+                values.append([v.tobytes() for v in col])
+            else:
+                values.append(col.tolist())
+        return values
+
+    def _insert(self, table: str, n_values: int, rows: Iterable[tuple]) -> None:
+        self.con.executemany(
+            f'INSERT INTO "{table}" VALUES ({", ".join("?" * n_values)})', rows
+        )
+
+    def write(self, raw: list[bytes], df: pd.DataFrame | None) -> None:
+        if self.con is None:
+            self._open()
+        fix, var, counts = decode_columns(
+            self.instance.msg_desc, raw, self.columns_fix, self.columns_var
+        )
+        frames = np.arange(self.frames, self.frames + len(raw))
+        with self.con:
+            self._insert(
+                self.table,
+                1 + len(self.columns_fix),
+                zip(frames.tolist(), *self._values(fix, self.columns_fix)),
+            )
+            if var is not None and len(var):
+                frame = np.repeat(frames, counts)
+                starts = np.repeat(np.cumsum(counts) - counts, counts)
+                block = np.arange(len(var)) - starts
+                self._insert(
+                    f"{self.table}_blocks",
+                    2 + len(self.columns_var),
+                    zip(frame.tolist(), block.tolist(), *self._values(var, self.columns_var)),
+                )
+        self.frames += len(raw)
+
+    def _index(self, table: str, columns: tuple[model.FieldColumn, ...]) -> None:
+        names = {c.name for c in columns}
+        for clock in model.CLOCK_HEADERS:
+            if clock in names:
+                keys = ("week", clock) if "week" in names else (clock,)
+                cols = ", ".join(f'"{k}"' for k in keys)
+                self.con.execute(
+                    f'CREATE INDEX "{table}_{"_".join(keys)}" ON "{table}" ({cols})'
+                )
+
+    def close(self) -> list[str]:
+        if self.con is None:
+            return []
+        with self.con:
+            self._index(self.table, self.columns_fix)
+            if self.columns_var:
+                self.con.execute(
+                    f'CREATE INDEX "{self.table}_blocks_frame" ON "{self.table}_blocks" (frame)'
+                )
+        self.con.close()
+        self.con = None
+        return [self.filename]
+
+
+class ColumnsSink(Sink):
+    """
+    "<basename>/" に列ごとの .npy (スケール未適用, np.load(mmap_mode="r") でそのまま読める) と
+    schema.json (列の型・ヘッダ・単位・スケール) を書く. 列は model.field_columns の単位で,
+    CH は固定長 bytes, 配列フィールドは (行数, 要素数) になる.
+    可変部は blocks/ に全フレームのブロックを連結した列と, 各ブロックの行番号 blocks/_frame.npy を置く.
+    """
+
+    uses_frame = False
+    SCHEMA = "schema.json"
+
+    def __init__(self, instance: "ublox.Ublox", basename: str) -> None:
+        super().__init__(instance, basename)
+        self.columns_fix = instance.columns_fix
+        self.columns_var = instance.columns_var
+        self.files: list[str] = []
+        self.arrays: dict[str, np.ndarray] = {}
+        self.row = 0
+        self.block = 0
+
+    def _memmap(self, path: str, dtype: np.dtype, shape: tuple[int, ...]) -> np.ndarray:
+        self.files.append(path)
+        return np.lib.format.open_memmap(path, mode="w+", dtype=dtype, shape=shape)
+
+    def _column_path(self, column: model.FieldColumn, var: bool) -> str:
+        return os.path.join(self.basename, "blocks" if var else "", column.name + ".npy")
+
+    def _open(self) -> None:
+        instance = self.instance
+        desc = instance.msg_desc
+        n_blocks = 0
+        if desc.payload_len_var:
+            n_blocks = (
+                instance.payload_bytes - instance.count * desc.payload_len_fix
+            ) // desc.payload_len_var
+            os.makedirs(os.path.join(self.basename, "blocks"), exist_ok=True)
+            self.arrays["_frame"] = self._memmap(
+                os.path.join(self.basename, "blocks", "_frame.npy"), np.uint32, (n_blocks,)
+            )
+        os.makedirs(self.basename, exist_ok=True)
+        for columns, rows, var in (
+            (self.columns_fix, instance.count, False),
+            (self.columns_var, n_blocks, True),
+        ):
+            for c in columns:
+                shape = (rows,) if c.code == "CH" or c.count == 1 else (rows, c.count)
+                key = ("blocks/" if var else "") + c.name
+                self.arrays[key] = self._memmap(self._column_path(c, var), c.dtype, shape)
+
+    def write(self, raw: list[bytes], df: pd.DataFrame | None) -> None:
+        if not self.arrays:
+            self._open()
+        fix, var, counts = decode_columns(
+            self.instance.msg_desc, raw, self.columns_fix, self.columns_var
+        )
+        rows = slice(self.row, self.row + len(fix))
+        for c in self.columns_fix:
+            self.arrays[c.name][rows] = fix[c.name]
+        if var is not None:
+            blocks = slice(self.block, self.block + len(var))
+            self.arrays["_frame"][blocks] = np.repeat(
+                np.arange(rows.start, rows.stop, dtype=np.uint32), counts
+            )
+            for c in self.columns_var:
+                self.arrays["blocks/" + c.name][blocks] = var[c.name]
+            self.block += len(var)
+        self.row += len(fix)
+
+    def schema(self) -> dict:
+        desc = self.instance.msg_desc
+
+        def entry(c: model.FieldColumn, var: bool) -> dict:
+            return dict(
+                name=c.name,
+                file=os.path.relpath(self._column_path(c, var), self.basename),
+                header=c.header,
+                unit=c.unit,
+                code=c.code,
+                dtype=c.dtype.str,
+                count=c.count,
+                scale=c.scale,
+            )
+
+        return dict(
+            message=desc.name,
+            rows=self.row,
+            blocks=self.block if self.columns_var else None,
+            columns=[entry(c, False) for c in self.columns_fix],
+            block_columns=[entry(c, True) for c in self.columns_var],
+        )
+
+    def close(self) -> list[str]:
+        if not self.arrays:
+            return []
+        for arr in self.arrays.values():
+            arr.flush()
+        self.arrays = {}
+        path = os.path.join(self.basename, self.SCHEMA)
+        with open(path, "w") as f:
+            json.dump(self.schema(), f, indent=1)
+        return self.files + [path]
+
+
+class ThreadedSink(Sink):
+    """別スレッドで write を実行し, 整形/書き込みをデコードと並行させる"""
+
+    _STOP = object()
+
+    def __init__(self, sink: Sink, maxsize: int = 4) -> None:
+        super().__init__(sink.instance, sink.basename)
+        self.sink = sink
+        self.uses_frame = sink.uses_frame
+        self.queue: queue.Queue = queue.Queue(maxsize)
+        self.error: BaseException | None = None
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self) -> None:
+        while True:
+            item = self.queue.get()
+            if item is self._STOP:
+                return
+            if self.error is None:
+                try:
+                    self.sink.write(*item)
+                except BaseException as e:
+                    self.error = e
+
+    def write(self, raw: list[bytes], df: pd.DataFrame | None) -> None:
+        if self.error is not None:
+            raise self.error
+        self.queue.put((raw, df))
+
+    def close(self) -> list[str]:
+        """書き込みでエラーがあってもシンクは閉じ (ファイルを確定させ), 最初のエラーを送出する"""
+        self.queue.put(self._STOP)
+        self.thread.join()
+        try:
+            files = self.sink.close()
+        except BaseException:
+            if self.error is None:
+                raise
+            files = []
+        if self.error is not None:
+            raise self.error
+        return files
+
+
+FORMATS = ("csv", "npy", "parquet", "sqlite", "columns")
+
+
+def make_sinks(
+    formats: Iterable[str], instance: "ublox.Ublox", basename: str
+) -> list[Sink]:
+    """
+    書き出し形式の一覧から 1 メッセージ分のシンクを作る.
+    "npy" は配列フィールドを持つメッセージにだけ作られ, その場合 CSV から配列の列を除く.
+    """
+    formats = tuple(formats)
+    unknown = set(formats) - set(FORMATS)
+    if unknown:
+        raise ValueError(f"Unknown output format: {unknown}")
+    arrays = instance.array_fix + instance.array_var if "npy" in formats else ()
+    result: list[Sink] = []
+    for fmt in formats:
+        if fmt == "csv":
+            result.append(CsvSink(instance, basename, drop=arrays))
+        elif fmt == "npy" and arrays:
+            result.append(NpySink(instance, basename))
+        elif fmt == "parquet":
+            result.append(ParquetSink(instance, basename))
+        elif fmt == "sqlite":
+            result.append(SqliteSink(instance, basename))
+        elif fmt == "columns":
+            result.append(ColumnsSink(instance, basename))
+    return result
@@ -0,0 +1,17 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import synthetic  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def ubx_log(tmp_path_factory) -> str:
+    """synthetic.write_log で作ったログ (全テストで共有するので書き換えないこと)"""
+    path = str(tmp_path_factory.mktemp("log") / "log.ubx")
+    synthetic.write_log(path)
+    return path
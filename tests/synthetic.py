@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+"""テスト用の UBX ログ (第 9 世代の定義) を組み立てる."""
+
+import struct
+import model
+import ublox
+import ubx_reader
+
+MESSAGES = ubx_reader.get_messages(9)
+EPOCHS = 200
+ITOW0 = 345_600_000
+WEEK = 2300
+
+
+def desc_of(name: str) -> tuple[int, model.UbxMsgDesc]:
+    for class_id, desc in MESSAGES.items():
+        if desc.name == name:
+            return class_id, desc
+    raise KeyError(name)
+
+
+def _pack(fmt: str, hdr: tuple[str, ...], values: dict) -> bytes:
+    """単位を除いたヘッダ名 → 値. 指定のないフィールドは 0 (CH は空白)"""
+    out = b""
+    for code, h in zip(model.FMT_RE.findall(fmt), hdr):
+        v = values.get(model.UNIT_RE.sub(r"\1", h), b" " if code == "CH" else 0)
+        if isinstance(v, (list, tuple)):
+            v = v[0]
+        out += struct.pack("<" + model.FMT_TO_STRUCT[code], v)
+    return out
+
+
+def payload(name: str, values: dict, blocks: list[dict] = ()) -> bytes:
+    _, desc = desc_of(name)
+    out = _pack(desc.fmt_fix, desc.hdr_fix, values)
+    for block in blocks:
+        out += _pack(desc.fmt_var, desc.hdr_var, block)
+    return out
+
+
+def frame(name: str, dat: bytes) -> bytes:
+    return raw_frame(desc_of(name)[0], dat)
+
+
+def raw_frame(class_id: int, dat: bytes) -> bytes:
+    """定義の有無に関わらず class/id とペイロードからフレームを組み立てる"""
+    body = bytes((class_id >> 8, class_id & 0xFF)) + len(dat).to_bytes(2, "little") + dat
+    return ublox.UBX_SYNC + body + ublox.checksum(body).to_bytes(2, "little")
+
+
+def _spectrum(dat: bytes, i: int) -> bytes:
+    # spectrum は同名ヘッダが 256 個続くので, 値を直接書き込む
+    _, desc = desc_of("mon_span")
+    block = bytes((i + k) % 256 for k in range(256)) + dat[desc.payload_len_fix + 256 :]
+    return dat[: desc.payload_len_fix] + block
+
+
+def epochs(n: int = EPOCHS) -> list[tuple[str, bytes]]:
+    """
+    1 秒ごとのエポック: NAV-PVT, RXM-RAWX (i % 5 ブロック), NAV-RELPOSNED (先頭は version),
+    10 エポックごとに MON-SPAN. (メッセージ名, ペイロード) を受信順に返す.
+    """
+    frames = []
+    for i in range(n):
+        itow = ITOW0 + 1000 * i
+        frames.append((
+            "nav_pvt",
+            payload("nav_pvt", dict(
+                iTOW=itow, year=2024, fixType=3 if i % 3 else 2, numSV=5 + i % 10,
+                flags=i % 2, lat=350_000_000 + i * 10, lon=1_390_000_000 - i * 10,
+                height=40_000 + i,
+            )),
+        ))
+        frames.append((
+            "rxm_rawx",
+            payload(
+                "rxm_rawx",
+                dict(rcvTow=itow / 1000, week=WEEK, numMeas=i % 5),
+                [
+                    dict(prMes=2.0e7 + k, cpMes=1.0e8 + i, gnssId=k % 3, svId=k + 1,
+                         cno=20 + 5 * k, prStdev=k)
+                    for k in range(i % 5)
+                ],
+            ),
+        ))
+        frames.append((
+            "nav_relposned",
+            payload("nav_relposned", dict(version=1, refStationId=7, iTOW=itow, relPosN=i)),
+        ))
+        if i % 10 == 0:
+            dat = payload("mon_span", dict(version=0, numRfBlocks=1), [dict(center=1575420000)])
+            frames.append(("mon_span", _spectrum(dat, i)))
+    return frames
+
+
+def write_log(path: str, n: int = EPOCHS, noise: bool = True) -> list[tuple[str, bytes]]:
+    """
+    epochs(n) をファイルへ書き出す. noise=True の場合はフレームの間に同期ヘッダの片割れを含むごみと,
+    チェックサムの合わないフレームを 1 つ挟む (それらは復号されない).
+    """
+    frames = epochs(n)
+    with open(path, "wb") as f:
+        for k, (name, dat) in enumerate(frames):
+            if noise and k % 37 == 5:
+                f.write(b"\x00\x11\xb5\x22 garbage \xb5")
+            if noise and k == 11:
+                bad = bytearray(frame(name, dat))
+                bad[-1] ^= 0xFF
+                f.write(bad)
+            f.write(frame(name, dat))
+    return frames
+
+
+def write_frames(path: str, frames: list[tuple[str, bytes]]) -> None:
+    """(メッセージ名, ペイロード) をそのままフレームにして書き出す"""
+    with open(path, "wb") as f:
+        for name, dat in frames:
+            f.write(frame(name, dat))
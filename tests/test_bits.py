@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+import pandas as pd
+import synthetic
+import ubx_reader
+
+
+def test_expand_bits(tmp_path):
+    path = str(tmp_path / "bits.ubx")
+    # carrSoln (bit 6-7) = 2, psmState (bit 2-4) = 5, gnssFixOK = 1
+    flags = [0b10_0_101_0_1, 0]
+    synthetic.write_frames(path, [
+        ("nav_pvt", synthetic.payload("nav_pvt", dict(flags=flags[0], flags3=0b0_1010_1))),
+        ("nav_pvt", synthetic.payload("nav_pvt", dict(flags=flags[1]))),
+        ("rxm_rawx", synthetic.payload(
+            "rxm_rawx", dict(recStat=0b10, numMeas=2), [dict(trkStat=0b0101), dict(trkStat=0b1010)]
+        )),
+    ])
+    tables = ubx_reader.read_ubx(path, 9, ["nav_pvt", "rxm_rawx"], expand_bits=True)
+    pvt = tables["nav_pvt"]
+    columns = list(pvt.columns)
+    # 宣言したフィールドの直後に並ぶ
+    assert columns[columns.index("flags") + 1 : columns.index("flags") + 6] == [
+        "flags.gnssFixOK", "flags.diffSoln", "flags.psmState", "flags.headVehValid", "flags.carrSoln",
+    ]
+    assert pvt["flags.gnssFixOK"].tolist() == [True, False]
+    assert pvt["flags.psmState"].tolist() == [5, 0]
+    assert pvt["flags.carrSoln"].tolist() == [2, 0]
+    assert pvt["flags3.invalidLlh"].tolist() == [True, False]
+    assert pvt["flags3.lastCorrectionAge"].tolist() == [10, 0]
+    assert isinstance(pvt["flags.gnssFixOK"].dtype, pd.BooleanDtype)
+
+    rawx = tables["rxm_rawx"]
+    assert rawx["recStat.clkReset"].tolist() == [True]
+    assert rawx["trkStat.prValid"].iloc[0].tolist() == [True, False]
+    assert rawx["trkStat.subHalfCyc"].iloc[0].tolist() == [False, True]
+
+
+def test_no_bit_columns_by_default(ubx_log):
+    pvt = ubx_reader.read_ubx(ubx_log, 9, ["nav_pvt"])["nav_pvt"]
+    assert not [c for c in pvt.columns if "." in c]
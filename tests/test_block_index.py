@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+import shutil
+import pytest
+import block_index
+import synthetic
+import ubx_reader
+
+BLOCK = 4096
+NAV_PVT, MON_SPAN = 0x0107, 0x0A31
+
+
+@pytest.fixture
+def log_copy(tmp_path, ubx_log) -> str:
+    path = str(tmp_path / "logs" / "log.ubx")
+    os.makedirs(os.path.dirname(path))
+    shutil.copy(ubx_log, path)
+    return path
+
+
+def test_scan_matches_frame_index(ubx_log):
+    blocks = block_index.BlockIndex(BLOCK)
+    ubx_reader.decode_file(ubx_log, ubx_reader.get_messages(9), blocks=blocks)
+    built = block_index.build(ubx_log, 9, BLOCK)
+    assert blocks.to_dict() == built.to_dict()
+    assert len(built.bits) == os.path.getsize(ubx_log) // BLOCK + 1
+    # ビットは最初に現れた順
+    assert list(built.class_ids) == [NAV_PVT, 0x0215, 0x013C, MON_SPAN]
+
+
+def test_blocks_with(ubx_log):
+    index = block_index.build(ubx_log, 9, BLOCK)
+    every = list(range(len(index.bits)))
+    assert index.blocks_with([NAV_PVT]) == every
+    span = index.blocks_with([MON_SPAN])
+    assert 0 < len(span) < len(every)
+    assert index.blocks_with([MON_SPAN, NAV_PVT]) == every
+    assert index.blocks_with([0x0A09]) == []
+
+
+def test_time_pruning(ubx_log):
+    index = block_index.build(ubx_log, 9, BLOCK)
+    t0, t1 = synthetic.ITOW0 + 50_000, synthetic.ITOW0 + 60_000
+    found = index.blocks_with([NAV_PVT], t0, t1)
+    assert 0 < len(found) < len(index.bits)
+    for block in range(len(index.bits)):
+        overlaps = index.t_min[block] <= t1 and index.t_max[block] >= t0
+        assert (block in found) == overlaps
+    assert index.blocks_with([NAV_PVT], t0=synthetic.ITOW0 + 300_000) == []
+    assert index.blocks_with([NAV_PVT], t1=synthetic.ITOW0) == [0]
+
+
+def test_untimed_blocks_stay_candidates():
+    index = block_index.BlockIndex(100)
+    index.add(10, MON_SPAN)
+    index.add(150, NAV_PVT, 5000.0)
+    index.add(160, NAV_PVT, float("nan"))
+    assert (index.t_min, index.t_max) == ([None, 5000.0], [None, 5000.0])
+    assert index.blocks_with([MON_SPAN, NAV_PVT], 0, 1000) == [0]
+
+
+def test_byte_ranges():
+    index = block_index.BlockIndex(100)
+    assert index.byte_ranges([0, 1, 2, 5, 7, 8]) == [(0, 300), (500, 600), (700, 900)]
+    assert index.byte_ranges([]) == []
+
+
+def test_save_and_search(log_copy, tmp_path):
+    index = block_index.build(log_copy, 9, BLOCK)
+    index.save(block_index.sidecar_path(log_copy), log_copy)
+    with open(block_index.sidecar_path(log_copy)) as f:
+        saved = json.load(f)
+    assert saved["source"] == os.path.abspath(log_copy)
+    assert saved["filesize"] == os.path.getsize(log_copy)
+    assert block_index.BlockIndex.load(block_index.sidecar_path(log_copy)).to_dict() == index.to_dict()
+
+    # ディレクトリ・ログ・索引のどれを渡しても同じログが見つかる
+    logs = os.path.dirname(log_copy)
+    for path in (logs, log_copy, block_index.sidecar_path(log_copy)):
+        found = list(block_index.search([path], [MON_SPAN]))
+        assert [log for log, _ in found] == [os.path.abspath(log_copy)]
+        assert found[0][1] == index.byte_ranges(index.blocks_with([MON_SPAN]))
+    assert list(block_index.search([logs], [0x0A09])) == []
+
+
+def test_unsupported_version():
+    with pytest.raises(ValueError, match="version"):
+        block_index.BlockIndex.from_dict(dict(version=0))
+
+
+def test_convert_file_writes_sidecar(log_copy, tmp_path):
+    out = str(tmp_path / "out")
+    result = ubx_reader.convert_file(log_copy, gen=9, messages=["nav_pvt"], out_dir=out, workers=0)
+    sidecar = os.path.join(out, "log.ubx" + block_index.SUFFIX)
+    assert sidecar in result.files
+    # 索引が出力先にあっても元のログのパスを返す
+    assert [log for log, _ in block_index.search([out], [NAV_PVT])] == [os.path.abspath(log_copy)]
+
+
+def test_main(log_copy, capsys):
+    logs = os.path.dirname(log_copy)
+    assert block_index.main(["build", log_copy, "--gen", "9", "--block-size", str(BLOCK)]) == 0
+    assert os.path.exists(block_index.sidecar_path(log_copy))
+    assert block_index.main(["search", logs, "--message", "mon_span"]) == 0
+    assert capsys.readouterr().out.startswith(os.path.abspath(log_copy) + " 0-")
+    assert block_index.main(["search", logs, "--message", "0x0A09", "--t0", "0", "--t1", "1"]) == 1
+    with pytest.raises(SystemExit):
+        block_index.main(["search", logs, "--message", "no_such_message"])
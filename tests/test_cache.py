@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+import concurrent.futures
+import os
+import cache
+import ubx_reader
+
+
+def _convert(ubx_log, out_dir, conv_cache, **kwargs):
+    return ubx_reader.convert_file(
+        ubx_log, gen=9, messages=["nav_pvt", "rxm_rawx"], formats=["csv", "columns"],
+        out_dir=str(out_dir), cache=conv_cache, workers=0, **kwargs,
+    )
+
+
+def _names(result, out_dir) -> list[str]:
+    return sorted(os.path.relpath(f, out_dir) for f in result.files)
+
+
+def test_second_conversion_is_restored(ubx_log, tmp_path):
+    conv_cache = cache.ConversionCache(str(tmp_path / "cache"))
+    first = _convert(ubx_log, tmp_path / "a", conv_cache)
+    assert not first.cached and first.errors == {}
+    # 存在しない出力先 (サブディレクトリを含む) へ復元される
+    second = _convert(ubx_log, tmp_path / "b" / "c", conv_cache)
+    assert second.cached
+    assert _names(second, tmp_path / "b" / "c") == _names(first, tmp_path / "a")
+    for name in _names(first, tmp_path / "a"):
+        assert (tmp_path / "a" / name).read_bytes() == (tmp_path / "b" / "c" / name).read_bytes()
+
+
+def test_options_are_part_of_the_key(ubx_log, tmp_path):
+    conv_cache = cache.ConversionCache(str(tmp_path / "cache"))
+    _convert(ubx_log, tmp_path / "a", conv_cache)
+    assert not _convert(ubx_log, tmp_path / "b", conv_cache, expand_bits=True).cached
+    assert not _convert(ubx_log, tmp_path / "c", conv_cache, fields={"nav_pvt": ["iTOW"]}).cached
+    assert _convert(ubx_log, tmp_path / "d", conv_cache, fields={"nav_pvt": ["iTOW"]}).cached
+
+
+def test_damaged_entry_is_converted_again(ubx_log, tmp_path):
+    conv_cache = cache.ConversionCache(str(tmp_path / "cache"))
+    first = _convert(ubx_log, tmp_path / "a", conv_cache)
+    (key,) = conv_cache.index["entries"]
+    with open(tmp_path / "cache" / key / "nav_pvt.csv", "a") as f:
+        f.write("x")
+    assert not _convert(ubx_log, tmp_path / "b", conv_cache).cached
+    assert len(first.files) == len(_convert(ubx_log, tmp_path / "c", conv_cache).files)
+
+
+def test_eviction(tmp_path):
+    conv_cache = cache.ConversionCache(str(tmp_path / "cache"), max_bytes=250)
+    for i in range(3):
+        path = tmp_path / f"{i}.csv"
+        path.write_bytes(b"x" * 100)
+        conv_cache.store(f"key{i}", [str(path)], str(tmp_path))
+    assert sorted(conv_cache.index["entries"]) == ["key1", "key2"]
+    assert not (tmp_path / "cache" / "key0").exists()
+    assert conv_cache.restore("key0", str(tmp_path / "out")) is None
+
+
+def _store(directory: str, src: str, i: int) -> None:
+    conv_cache = cache.ConversionCache(directory)
+    conv_cache.store(f"key{i}", [src], os.path.dirname(src))
+
+
+def test_shared_between_processes(tmp_path):
+    src = tmp_path / "f.csv"
+    src.write_bytes(b"data")
+    directory = str(tmp_path / "cache")
+    with concurrent.futures.ProcessPoolExecutor(4) as pool:
+        list(pool.map(_store, [directory] * 16, [str(src)] * 16, range(16)))
+    conv_cache = cache.ConversionCache(directory)
+    assert len(conv_cache.index["entries"]) == 16
+    assert not [n for n in os.listdir(directory) if n.endswith(".tmp")]
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import pytest
+import cache
+import catalog
+import synthetic
+import ubx_reader
+
+
+@pytest.fixture
+def env(tmp_path, ubx_log):
+    path = str(tmp_path / "log.ubx")
+    shutil.copy(ubx_log, path)
+    return path, catalog.Catalog(str(tmp_path / "catalog.db")), cache.ConversionCache(str(tmp_path / "cache"))
+
+
+def _convert(path, cat, conv_cache, out_dir, **kwargs):
+    return ubx_reader.convert_file(
+        path, gen=9, out_dir=str(out_dir), cache=conv_cache, catalog=cat, workers=0, **kwargs
+    )
+
+
+def _rows(cat, run_id) -> dict[str, int]:
+    return {m["name"]: m["rows"] for m in cat.messages(run_id)}
+
+
+def test_record(env, tmp_path):
+    path, cat, _ = env
+    ubx_reader.convert_file(path, gen=9, out_dir=str(tmp_path / "a"), catalog=cat, workers=0)
+    run = cat.latest(path)
+    assert run["source"] == os.path.abspath(path)
+    assert (run["generation"], run["cached"], run["write_errors"]) == ("9", 0, 0)
+    assert run["checksum_error_count"] == 1
+    assert run["digest"] == cache.file_digest(path)
+    assert _rows(cat, run["id"]) == dict(nav_pvt=200, rxm_rawx=200, nav_relposned=200, mon_span=20)
+    pvt = {m["name"]: m for m in cat.messages(run["id"])}["nav_pvt"]
+    assert (pvt["class_id"], pvt["first_time"], pvt["last_time"]) == (
+        0x0107, synthetic.ITOW0, synthetic.ITOW0 + 199_000
+    )
+
+
+def test_cached_run_copies_messages_of_the_same_options(env, tmp_path):
+    path, cat, conv_cache = env
+    both = dict(messages=["nav_pvt", "rxm_rawx"])
+    _convert(path, cat, conv_cache, tmp_path / "a", **both)
+    # 同じ入力をほかの条件で後から変換しても, 内訳はその条件の記録からは写さない
+    _convert(path, cat, conv_cache, tmp_path / "b", messages=["nav_pvt"])
+    _convert(path, cat, conv_cache, tmp_path / "c", filters={"nav_pvt": "numSV > 10"}, **both)
+    result = _convert(path, cat, conv_cache, tmp_path / "d", **both)
+    assert result.cached
+    run = cat.latest(path)
+    assert run["cached"] == 1
+    assert _rows(cat, run["id"]) == dict(nav_pvt=200, rxm_rawx=200)
+
+    result = _convert(path, cat, conv_cache, tmp_path / "e", filters={"nav_pvt": "numSV > 10"}, **both)
+    assert result.cached
+    assert _rows(cat, cat.latest(path)["id"]) == dict(nav_pvt=80, rxm_rawx=200)
+
+
+def test_pending(env, tmp_path):
+    path, cat, _ = env
+    other = str(tmp_path / "other.ubx")
+    shutil.copy(path, other)
+    assert cat.pending([path, other]) == [path, other]
+    ubx_reader.convert_file(path, gen=9, out_dir=str(tmp_path / "a"), catalog=cat, workers=0)
+    assert cat.pending([path, other]) == [other]
+    assert cat.pending([path], generation=8) == [path]
+    # 変換後に書き換えられたファイルは再び対象になる
+    with open(path, "ab") as f:
+        f.write(b"\0")
+    assert cat.pending([path]) == [path]
+
+
+def test_main(env, tmp_path, capsys):
+    path, cat, _ = env
+    assert catalog.main([cat.path, "show", path]) == 1
+    ubx_reader.convert_file(
+        path, gen=9, messages=["nav_pvt"], out_dir=str(tmp_path / "a"), catalog=cat, workers=0
+    )
+    capsys.readouterr()
+    assert catalog.main([cat.path, "show", path]) == 0
+    assert capsys.readouterr().out.split() == [
+        "0x0107", "nav_pvt", "200", str(synthetic.ITOW0), str(synthetic.ITOW0 + 199_000)
+    ]
+    assert catalog.main([cat.path, "runs"]) == 0
+    assert "gen=9 cached=0" in capsys.readouterr().out
+    assert catalog.main([cat.path, "pending", path]) == 0
+    assert capsys.readouterr().out == ""
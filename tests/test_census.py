@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+import pytest
+import census
+
+
+def test_census_of_whole_file(ubx_log):
+    result = census.take_census(ubx_log)
+    assert result.duration_s == pytest.approx(199)
+    by_name = {m.name: m for m in result.messages.values()}
+    assert by_name["nav_pvt"].est_frames == 200
+    assert by_name["nav_relposned"].est_frames == 200
+    assert by_name["nav_pvt"].rate_hz == pytest.approx(200 / 199)
+    assert by_name["mon_span"].rate_hz == pytest.approx(20 / 199)
+    assert result.checksum_errors == 1
+
+
+def test_clock_only_for_time_fields():
+    assert census.message_clock(0x0107) is not None  # NAV-PVT: iTOW
+    assert census.message_clock(0x0215) is not None  # RXM-RAWX: rcvTow
+    assert census.message_clock(0x013C) is None  # NAV-RELPOSNED: version が先頭
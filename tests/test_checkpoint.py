@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+import functools
+import pytest
+import checkpoint
+import pipeline
+import ublox
+import ubx_reader
+
+
+class Stop(Exception):
+    pass
+
+
+def interrupt(percent: int) -> None:
+    if percent >= 60:
+        raise Stop
+
+
+@pytest.fixture(autouse=True)
+def small_chunks(monkeypatch):
+    # 小さなチャンクで読み, 走査の途中で進捗が通知されるようにする
+    scanner = ublox.FrameScanner
+
+    def small(fobj, chunk_size=1024, *args, **kwargs):
+        return scanner(fobj, min(chunk_size, 1024), *args, **kwargs)
+
+    monkeypatch.setattr(ublox, "FrameScanner", small)
+    monkeypatch.setattr(
+        pipeline, "PipelineScanner",
+        functools.partial(pipeline.PipelineScanner, chunk_size=1024, batch_frames=16, queue_size=2),
+    )
+
+
+def _checkpoint(ubx_log, tmp_path) -> checkpoint.Checkpoint:
+    return checkpoint.Checkpoint(str(tmp_path / "ckpt"), ubx_log, 9, interval=4096)
+
+
+def _interrupted(ubx_log, tmp_path, messages, **kwargs) -> None:
+    ckpt = _checkpoint(ubx_log, tmp_path)
+    with pytest.raises(Stop):
+        ubx_reader.decode_file(ubx_log, messages, ckpt=ckpt, progress=interrupt, **kwargs)
+    assert ckpt.seq > 0
+
+
+def _assert_same(resumed, expected) -> None:
+    for key, inst in expected.items():
+        assert resumed[key].count == inst.count, inst.msg_desc.name
+        assert list(resumed[key].iter_raw()) == list(inst.iter_raw())
+        assert list(resumed[key].times) == list(inst.times)
+
+
+def test_resume_after_interrupt(ubx_log, tmp_path):
+    messages = ubx_reader.get_messages(9)
+    expected, expected_stats = ubx_reader.decode_file(ubx_log, messages)
+    _interrupted(ubx_log, tmp_path, messages)
+
+    ckpt = _checkpoint(ubx_log, tmp_path)
+    assert ckpt.load(ubx_reader.decode_options(messages)) is not None
+    resumed, stats = ubx_reader.decode_file(ubx_log, messages, ckpt=ckpt)
+    _assert_same(resumed, expected)
+    assert stats.convert_count == expected_stats.convert_count
+    assert stats.checksum_error_count == expected_stats.checksum_error_count
+
+
+def test_different_selection_starts_over(ubx_log, tmp_path):
+    all_messages = ubx_reader.get_messages(9)
+    pvt = ubx_reader.select_messages(all_messages, ["nav_pvt"])
+    both = ubx_reader.select_messages(all_messages, ["nav_pvt", "rxm_rawx"])
+    _interrupted(ubx_log, tmp_path, pvt)
+    ckpt = _checkpoint(ubx_log, tmp_path)
+    assert ckpt.load(ubx_reader.decode_options(both)) is None
+    resumed, stats = ubx_reader.decode_file(ubx_log, both, ckpt=ckpt)
+    expected, _ = ubx_reader.decode_file(ubx_log, both)
+    _assert_same(resumed, expected)
+    assert sum(inst.count for inst in resumed.values()) == 400
+
+
+@pytest.mark.parametrize(
+    "first, second",
+    [
+        ({}, {"expand_bits": True}),
+        ({"fields": {"nav_pvt": ["iTOW"]}}, {"fields": {"nav_pvt": ["iTOW", "lat"]}}),
+        ({"filters": {"nav_pvt": "numSV > 8"}}, {}),
+        ({"decimate": {"nav_pvt": {"every": 2}}}, {"decimate": {"nav_pvt": {"every": 3}}}),
+    ],
+)
+def test_different_options_start_over(ubx_log, tmp_path, first, second):
+    messages = ubx_reader.select_messages(ubx_reader.get_messages(9), ["nav_pvt"])
+    _interrupted(ubx_log, tmp_path, messages, **first)
+    resumed, _ = ubx_reader.decode_file(
+        ubx_log, messages, ckpt=_checkpoint(ubx_log, tmp_path), **second
+    )
+    expected, _ = ubx_reader.decode_file(ubx_log, messages, **second)
+    _assert_same(resumed, expected)
+
+
+@pytest.mark.parametrize("workers", [0, 2])
+def test_resume_keeps_decimation_phase(ubx_log, tmp_path, workers):
+    messages = ubx_reader.select_messages(ubx_reader.get_messages(9), ["nav_pvt", "rxm_rawx"])
+    decimate = {"nav_pvt": {"every": 7}, "rxm_rawx": {"min_interval": 3000}}
+    expected, expected_stats = ubx_reader.decode_file(ubx_log, messages, decimate=decimate)
+    _interrupted(ubx_log, tmp_path, messages, decimate=decimate, workers=workers)
+    resumed, stats = ubx_reader.decode_file(
+        ubx_log, messages, ckpt=_checkpoint(ubx_log, tmp_path), decimate=decimate, workers=workers
+    )
+    _assert_same(resumed, expected)
+    assert stats.decimated_count == expected_stats.decimated_count
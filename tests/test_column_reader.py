@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+import importlib.util
+import os
+import sqlite3
+import numpy as np
+import pytest
+import column_reader
+import sinks
+import ubx_reader
+
+FORMATS = ["sqlite", "columns"]
+if importlib.util.find_spec("pyarrow") is not None:
+    FORMATS.append("parquet")
+
+
+@pytest.fixture(scope="module")
+def converted(ubx_log, tmp_path_factory) -> str:
+    out_dir = str(tmp_path_factory.mktemp("out"))
+    result = ubx_reader.convert_file(
+        ubx_log,
+        gen=9,
+        messages=["nav_pvt", "rxm_rawx", "mon_span"],
+        formats=FORMATS,
+        out_dir=out_dir,
+        workers=0,
+    )
+    assert result.errors == {}
+    return out_dir
+
+
+@pytest.fixture(scope="module")
+def tables(ubx_log):
+    return ubx_reader.read_ubx(ubx_log, 9, ["nav_pvt", "rxm_rawx"])
+
+
+def _open(out_dir: str, fmt: str, message: str) -> column_reader.Message:
+    if fmt not in FORMATS:
+        pytest.skip(f"{fmt} needs pyarrow")
+    if fmt == "sqlite":
+        return column_reader.open_message(os.path.join(out_dir, sinks.SQLITE_FILENAME), message)
+    if fmt == "parquet":
+        return column_reader.open_message(os.path.join(out_dir, f"{message}.parquet"))
+    return column_reader.open_message(os.path.join(out_dir, message))
+
+
+@pytest.mark.parametrize("fmt", ["sqlite", "columns", "parquet"])
+def test_round_trip(converted, tables, fmt):
+    with _open(converted, fmt, "nav_pvt") as pvt:
+        assert pvt.name == "nav_pvt"
+        # raw はスケール未適用のまま, [] はスケールを掛けた CSV と同じ値
+        assert pvt.columns.raw("lat").dtype == np.int32
+        np.testing.assert_allclose(pvt.columns["lat"], tables["nav_pvt"]["lat (deg)"])
+        np.testing.assert_array_equal(pvt.columns["numSV"], tables["nav_pvt"]["numSV"])
+        assert pvt.columns.units["lat"] == "deg"
+        assert pvt.blocks is None
+    with _open(converted, fmt, "rxm_rawx") as rawx:
+        frame = np.asarray(rawx.blocks["frame"])
+        assert len(frame) == sum(i % 5 for i in range(200))
+        np.testing.assert_array_equal(np.bincount(frame, minlength=200), [i % 5 for i in range(200)])
+        cno = np.asarray(rawx.blocks["cno"])
+        block = np.concatenate([np.arange(n) for n in np.bincount(frame, minlength=200)])
+        np.testing.assert_array_equal(cno, 20 + 5 * block)
+
+
+@pytest.mark.parametrize("fmt", ["sqlite", "columns", "parquet"])
+def test_array_field(converted, fmt):
+    with _open(converted, fmt, "mon_span") as span:
+        spectrum = np.asarray(list(span.blocks.raw("spectrum")))
+        assert spectrum.shape == (20, 256)
+        np.testing.assert_array_equal(spectrum[1], (10 + np.arange(256)) % 256)
+
+
+@pytest.mark.parametrize("fmt", ["sqlite", "columns", "parquet"])
+def test_to_frame(converted, tables, fmt):
+    with _open(converted, fmt, "nav_pvt") as pvt:
+        df = pvt.columns.to_frame(["iTOW", "lat"])
+        assert list(df.columns) == ["iTOW", "lat"]
+        np.testing.assert_allclose(df["lat"], tables["nav_pvt"]["lat (deg)"])
+        # 参照した列だけを読む
+        assert set(pvt.columns._raw) == {"iTOW", "lat"}
+        with pytest.raises(KeyError):
+            pvt.columns["bogus"]
+
+
+def test_sqlite_is_closed(converted):
+    msg = _open(converted, "sqlite", "nav_pvt")
+    with msg:
+        con = msg.closer.__self__
+        assert len(msg.columns["iTOW"]) == 200
+    assert msg.closer is None
+    with pytest.raises(sqlite3.ProgrammingError):
+        con.execute("SELECT 1")
+    # 2 回目の close は何もしない
+    msg.close()
+
+
+def test_sqlite_errors(converted):
+    path = os.path.join(converted, sinks.SQLITE_FILENAME)
+    with pytest.raises(KeyError, match="nav_sat"):
+        column_reader.open_sqlite(path, "nav_sat")
+    with pytest.raises(ValueError, match="message is required"):
+        column_reader.open_message(path)
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+import numpy as np
+import pytest
+import sinks
+import synthetic
+import ubx_reader
+
+
+@pytest.fixture(scope="module")
+def out_dir(ubx_log, tmp_path_factory) -> str:
+    messages = ubx_reader.select_messages(
+        ubx_reader.get_messages(9), ["nav_pvt", "rxm_rawx", "mon_span"]
+    )
+    ubx_instances, _ = ubx_reader.decode_file(ubx_log, messages)
+    out_dir = tmp_path_factory.mktemp("columns")
+    for inst in ubx_instances.values():
+        files = inst.write(sinks.make_sinks(["columns"], inst, str(out_dir / inst.msg_desc.name)))
+        assert files[-1] == str(out_dir / inst.msg_desc.name / sinks.ColumnsSink.SCHEMA)
+        assert all(os.path.exists(f) for f in files)
+    return str(out_dir)
+
+
+def _schema(out_dir: str, message: str) -> dict:
+    with open(os.path.join(out_dir, message, sinks.ColumnsSink.SCHEMA)) as f:
+        return json.load(f)
+
+
+def test_fixed_columns(out_dir):
+    lat = np.load(os.path.join(out_dir, "nav_pvt", "lat.npy"), mmap_mode="r")
+    # スケール未適用の値をそのままの型で
+    assert lat.dtype == np.int32 and lat.shape == (200,)
+    np.testing.assert_array_equal(lat, 350_000_000 + 10 * np.arange(200))
+    itow = np.load(os.path.join(out_dir, "nav_pvt", "iTOW.npy"))
+    assert itow[0] == synthetic.ITOW0
+    assert not os.path.exists(os.path.join(out_dir, "nav_pvt", "blocks"))
+
+
+def test_blocks(out_dir):
+    blocks = os.path.join(out_dir, "rxm_rawx", "blocks")
+    frame = np.load(os.path.join(blocks, "_frame.npy"))
+    cno = np.load(os.path.join(blocks, "cno.npy"))
+    assert len(frame) == len(cno) == sum(i % 5 for i in range(200))
+    # 各ブロックの親の行番号
+    np.testing.assert_array_equal(np.bincount(frame, minlength=200), np.arange(200) % 5)
+    np.testing.assert_array_equal(cno[frame == 4], [20, 25, 30, 35])
+    num_meas = np.load(os.path.join(out_dir, "rxm_rawx", "numMeas.npy"))
+    np.testing.assert_array_equal(num_meas, np.arange(200) % 5)
+
+
+def test_array_field(out_dir):
+    spectrum = np.load(os.path.join(out_dir, "mon_span", "blocks", "spectrum.npy"))
+    assert spectrum.shape == (20, 256) and spectrum.dtype == np.uint8
+    np.testing.assert_array_equal(spectrum[1], (10 + np.arange(256)) % 256)
+
+
+def test_schema(out_dir):
+    schema = _schema(out_dir, "rxm_rawx")
+    assert (schema["message"], schema["rows"], schema["blocks"]) == (
+        "rxm_rawx", 200, sum(i % 5 for i in range(200))
+    )
+    cno = {c["name"]: c for c in schema["block_columns"]}["cno"]
+    assert cno["file"] == os.path.join("blocks", "cno.npy")
+    assert (cno["header"], cno["unit"], cno["count"]) == ("cno (dBHz)", "dBHz", 1)
+    assert np.dtype(cno["dtype"]) == np.load(os.path.join(out_dir, "rxm_rawx", cno["file"])).dtype
+
+    pvt = _schema(out_dir, "nav_pvt")
+    assert pvt["blocks"] is None and pvt["block_columns"] == []
+    lat = {c["name"]: c for c in pvt["columns"]}["lat"]
+    assert lat["scale"] == pytest.approx(1e-7)
+    # schema.json の列はすべてファイルがある
+    for c in pvt["columns"]:
+        assert os.path.exists(os.path.join(out_dir, "nav_pvt", c["file"]))
+
+    span = {c["name"]: c for c in _schema(out_dir, "mon_span")["block_columns"]}
+    assert span["spectrum"]["count"] == 256
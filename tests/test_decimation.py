@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pytest
+import synthetic
+import ublox
+import ubx_reader
+
+
+def test_every_and_min_interval(tmp_path):
+    # チェックサム不一致のフレームも周期に数えるため, ノイズのないログを使う
+    path = str(tmp_path / "clean.ubx")
+    synthetic.write_log(path, noise=False)
+    tables = ubx_reader.read_ubx(
+        path,
+        9,
+        ["nav_pvt", "rxm_rawx", "mon_span"],
+        decimate={
+            "nav_pvt": {"min_interval": 2000},
+            "rxm_rawx": {"every": 4},
+            "mon_span": {"every": 5},
+        },
+    )
+    itow = tables["nav_pvt"]["iTOW (ms)"].to_numpy()
+    np.testing.assert_array_equal(itow, synthetic.ITOW0 + 2000 * np.arange(100))
+    assert len(tables["rxm_rawx"]) == 50
+    assert len(tables["mon_span"]) == 4
+
+
+def test_min_interval_needs_time_field():
+    with pytest.raises(ValueError):
+        ubx_reader.make_decimator(
+            ubx_reader.get_messages(9), {"mon_span": {"min_interval": 1000}}
+        )
+
+
+def test_week_rollover():
+    class_id = synthetic.desc_of("nav_pvt")[0]
+    decimator = ublox.Decimator({class_id: ublox.Decimation(min_interval=2000)})
+    head = class_id.to_bytes(2, "big") + (92).to_bytes(2, "little")
+    kept = [
+        decimator(head + synthetic.payload("nav_pvt", dict(iTOW=t)))
+        for t in (ublox.WEEK_MS - 2000, ublox.WEEK_MS - 1000, 0, 1000, 2000)
+    ]
+    assert kept == [True, False, True, False, True]
+
+
+def test_decimated_frames_are_counted(ubx_log):
+    messages = ubx_reader.select_messages(ubx_reader.get_messages(9), ["nav_pvt"])
+    _, stats = ubx_reader.decode_file(ubx_log, messages, decimate={"nav_pvt": {"every": 10}})
+    assert stats.decimated_count == 180
+    assert stats.convert_count == 20
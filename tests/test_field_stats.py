@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+import io
+import json
+import pytest
+import field_stats
+import synthetic
+
+MON_HW = 0x0A09
+
+
+def test_collect_stats(ubx_log):
+    stats = field_stats.collect_stats(ubx_log, gen=9)
+    # チェックサムの合わないフレームも見つかった数に含む
+    assert stats.ubx_count == 200 * 3 + 20 + 1
+    assert stats.checksum_error_count == 1
+    assert stats.skipped == {}
+
+    pvt = stats.messages["nav_pvt"]
+    assert pvt.rows == 200
+    height = pvt.fields["height (mm)"].summary()
+    assert height["count"] == 200
+    assert (height["min"], height["max"]) == (40_000, 40_199)
+    assert height["mean"] == pytest.approx(40_099.5)
+    assert height["p50"] == pytest.approx(40_099.5, abs=2)
+    # スケール付きのフィールドは単位を揃えた値
+    assert pvt.fields["lat (deg)"].summary()["min"] == pytest.approx(35.0)
+
+    # 可変部はブロックごとに数える
+    rawx = stats.messages["rxm_rawx"]
+    assert rawx.rows == 200
+    assert rawx.fields["cno (dBHz)"].summary()["count"] == 40 * (1 + 2 + 3 + 4)
+
+
+def test_merge_matches_single_pass(tmp_path, ubx_log):
+    head = synthetic.epochs()[:250]
+    tail = synthetic.epochs()[250:]
+    synthetic.write_frames(str(tmp_path / "a.ubx"), head)
+    synthetic.write_frames(str(tmp_path / "b.ubx"), tail)
+    whole = field_stats.collect_stats(ubx_log, gen=9, batch_rows=64)
+
+    merged = field_stats.FileStats()
+    for name in ("a.ubx", "b.ubx"):
+        stats = field_stats.collect_stats(str(tmp_path / name), gen=9)
+        # 保存した JSON から読み戻した統計も同じように併合できる
+        merged.merge(field_stats.FileStats.from_dict(json.loads(json.dumps(stats.to_dict()))))
+    assert len(merged.sources) == 2
+    assert merged.ubx_count == whole.ubx_count - whole.checksum_error_count
+
+    for name, msg in whole.messages.items():
+        assert merged.messages[name].rows == msg.rows
+        for h, f in msg.fields.items():
+            a, b = f.summary(), merged.messages[name].fields[h].summary()
+            for key in ("count", "min", "max"):
+                assert a[key] == b[key], (name, h, key)
+            assert a["mean"] == pytest.approx(b["mean"]), (name, h)
+            assert a["std"] == pytest.approx(b["std"]), (name, h)
+
+
+def test_merge_does_not_share_stats(ubx_log):
+    stats = field_stats.collect_stats(ubx_log, gen=9, messages=["nav_pvt"])
+    merged = field_stats.FileStats()
+    merged.merge(stats)
+    merged.merge(stats)
+    assert merged.messages["nav_pvt"].rows == 400
+    assert stats.messages["nav_pvt"].rows == 200
+
+
+def test_broken_descriptor_is_skipped(tmp_path):
+    # 第 9 世代の MON-HW は fmt とヘッダのフィールド数が合わず dtype を作れない
+    path = tmp_path / "a.ubx"
+    pvt = synthetic.frame("nav_pvt", synthetic.payload("nav_pvt", dict(height=5)))
+    path.write_bytes(pvt + synthetic.raw_frame(MON_HW, bytes(60)) + pvt)
+    log = io.StringIO()
+    stats = field_stats.collect_stats(str(path), gen=9, log=log)
+
+    assert stats.messages["nav_pvt"].rows == 2
+    assert "mon_hw" not in stats.messages
+    assert "フィールド数が一致しません" in stats.skipped["mon_hw"]
+    assert "Skipped mon_hw without statistics (1 frames)" in log.getvalue()
+
+    # 飛ばしたメッセージは保存・併合後も残る
+    restored = field_stats.FileStats.from_dict(json.loads(json.dumps(stats.to_dict())))
+    merged = field_stats.FileStats()
+    merged.merge(restored)
+    assert merged.skipped == stats.skipped
+
+
+def test_write_csv(ubx_log):
+    stats = field_stats.collect_stats(ubx_log, gen=9, messages=["nav_pvt"])
+    out = io.StringIO()
+    stats.write_csv(out)
+    lines = out.getvalue().splitlines()
+    assert lines[0].startswith("message,field,rows,count,min,max,mean,std,p1")
+    assert any(line.startswith("nav_pvt,height (mm),200,200,40000.0") for line in lines)
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+import io
+import synthetic
+import ubx_reader
+
+MON_VER = 0x0A04
+
+
+def mon_ver(hw_version: bytes, *extensions: bytes) -> bytes:
+    dat = b"ROM CORE".ljust(30, b"\0") + hw_version.ljust(10, b"\0")
+    return dat + b"".join(e.ljust(30, b"\0") for e in extensions)
+
+
+def _write(path, frames: list[bytes]) -> str:
+    with open(path, "wb") as f:
+        f.write(b"".join(frames))
+    return str(path)
+
+
+def test_mon_ver_protver(tmp_path):
+    pvt = synthetic.frame("nav_pvt", synthetic.payload("nav_pvt", {}))
+    ver = synthetic.raw_frame(MON_VER, mon_ver(b"00080000", b"FWVER=SPG 3.01", b"PROTVER=18.00"))
+    # MON-VER があればペイロード長の採点より優先する
+    assert ubx_reader.detect_generation(_write(tmp_path / "a.ubx", [pvt, ver])) == 8
+
+
+def test_mon_ver_hw_version(tmp_path):
+    ver = synthetic.raw_frame(MON_VER, mon_ver(b"00070000"))
+    assert ubx_reader.detect_generation(_write(tmp_path / "a.ubx", [ver])) == 7
+
+
+def test_payload_lengths(tmp_path, ubx_log):
+    # NAV-PVT は第 7 世代だけ 84 バイト
+    pvt = synthetic.frame("nav_pvt", bytes(84))
+    assert ubx_reader.detect_generation(_write(tmp_path / "a.ubx", [pvt] * 3)) == 7
+    # 同点なら新しい世代
+    assert ubx_reader.detect_generation(ubx_log) == 9
+
+
+def test_probe_size(tmp_path):
+    ver = synthetic.raw_frame(MON_VER, mon_ver(b"00070000"))
+    path = _write(tmp_path / "a.ubx", [bytes(1000), ver])
+    assert ubx_reader.detect_generation(path, probe_size=500) is None
+    assert ubx_reader.detect_generation(path) == 7
+
+
+def test_resolve_generation(tmp_path):
+    # 判定材料が無ければ既定値
+    path = _write(tmp_path / "a.ubx", [bytes(1000)])
+    assert ubx_reader.resolve_generation("auto", path) == 9
+    assert ubx_reader.resolve_generation("auto", path, default=8) == 8
+    assert ubx_reader.resolve_generation("7", path) == 7
+    assert ubx_reader.resolve_generation("mixed", path) == "mixed"
+
+
+def test_append_errors_are_summarised(tmp_path, capsys):
+    good = synthetic.frame("nav_pvt", synthetic.payload("nav_pvt", {}))
+    bad = synthetic.frame("nav_pvt", bytes(80))
+    path = _write(tmp_path / "a.ubx", [good, bad, bad, good])
+    log = io.StringIO()
+    _, stats = ubx_reader.decode_file(path, ubx_reader.get_messages(9), log=log)
+    assert stats.append_errors == {"nav_pvt": 2}
+    assert stats.convert_count == 2
+    lines = [l for l in log.getvalue().splitlines() if "appending" in l]
+    assert len(lines) == 1 and "nav_pvt: 2" in lines[0]
+    assert capsys.readouterr().out == ""
@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+import model
+import synthetic
+import ubx_reader
+
+
+def test_one_output_per_layout(tmp_path):
+    path = str(tmp_path / "mixed.ubx")
+    synthetic.write_frames(path, [
+        ("nav_pvt", bytes(84)),  # 第 7 世代
+        ("nav_pvt", synthetic.payload("nav_pvt", dict(iTOW=5))),
+        ("nav_pvt", bytes(84)),
+        ("nav_status", bytes(16)),
+        ("nav_pvt", bytes(50)),  # どの世代の定義にも合わない
+    ])
+    tables = ubx_reader.read_ubx(path, "mixed")
+    assert {k: len(v) for k, v in tables.items()} == {
+        "nav_pvt_84": 2, "nav_pvt_92": 1, "nav_status": 1,
+    }
+    assert tables["nav_pvt_92"]["iTOW (ms)"].tolist() == [5]
+
+
+def test_length_index():
+    index = model.length_index()
+    assert index is model.length_index()
+    pvt_92 = index.lookup(0x0107, 92)
+    pvt_84 = index.lookup(0x0107, 84)
+    assert pvt_92 != pvt_84
+    assert index.messages[pvt_84].payload_len_fix == 84
+    assert index.messages[pvt_92].name == "nav_pvt_92"
+    assert index.lookup(0x0107, 50) is None
+    # 可変長のメッセージは繰り返し数によらず同じ定義
+    assert index.lookup(0x0215, 16) == index.lookup(0x0215, 16 + 32 * 3)
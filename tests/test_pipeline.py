@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+import pandas as pd
+import pipeline
+import ublox
+import ubx_reader
+
+
+def test_pipeline_scanner_matches(ubx_log):
+    with open(ubx_log, "rb") as f:
+        expected = list(ublox.FrameScanner(f))
+    with open(ubx_log, "rb") as f:
+        scanner = pipeline.PipelineScanner(
+            f, workers=2, chunk_size=4096, batch_frames=64, queue_size=2
+        )
+        assert list(scanner) == expected
+    assert scanner.checksum_error_count == 1
+
+
+def test_decode_with_workers(ubx_log):
+    messages = ubx_reader.get_messages(9)
+    serial, serial_stats = ubx_reader.decode_file(ubx_log, messages)
+    parallel, stats = ubx_reader.decode_file(
+        ubx_log, messages, workers=2, decimate={"nav_pvt": {"every": 3}}
+    )
+    assert stats.checksum_error_count == serial_stats.checksum_error_count
+    assert stats.decimated_count == 133
+    for key, inst in serial.items():
+        if inst.msg_desc.name == "nav_pvt":
+            assert parallel[key].count == 67
+        elif inst.count:
+            pd.testing.assert_frame_equal(parallel[key].to_dataframe(), inst.to_dataframe())
@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pytest
+import ubx_reader
+
+FIELDS = {"nav_pvt": ["iTOW", "lat (deg)", "numSV"], "rxm_rawx": ["rcvTow", "cno"]}
+
+
+def test_projected_dataframe(ubx_log):
+    full = ubx_reader.read_ubx(ubx_log, 9, ["nav_pvt", "rxm_rawx"])
+    part = ubx_reader.read_ubx(ubx_log, 9, ["nav_pvt", "rxm_rawx"], fields=FIELDS)
+    # 列はペイロード内の順に並ぶ
+    columns = ["iTOW (ms)", "numSV", "lat (deg)"]
+    assert list(part["nav_pvt"].columns) == columns
+    np.testing.assert_array_equal(part["nav_pvt"].to_numpy(), full["nav_pvt"][columns].to_numpy())
+    assert list(part["rxm_rawx"].columns) == ["rcvTow (ms)"] + ["cno (dBHz)"] * 4
+
+
+def test_projected_arrays(ubx_log):
+    arrays = ubx_reader.read_ubx(
+        ubx_log, 9, ["rxm_rawx"], as_array=True, fields={"rxm_rawx": FIELDS["rxm_rawx"]}
+    )
+    assert arrays["rxm_rawx"].dtype.names == ("rcvTow (ms)",)
+    assert arrays["rxm_rawx_var"].dtype.names == ("index", "cno (dBHz)")
+
+
+def test_unknown_field(ubx_log):
+    with pytest.raises(ValueError):
+        ubx_reader.read_ubx(ubx_log, 9, ["nav_pvt"], fields={"nav_pvt": ["bogus"]})
+
+
+def test_projected_outputs(ubx_log, tmp_path):
+    pytest.importorskip("pyarrow")
+    import column_reader
+
+    result = ubx_reader.convert_file(
+        ubx_log, gen=9, messages=["nav_pvt"], formats=["csv", "parquet"],
+        out_dir=str(tmp_path), fields={"nav_pvt": FIELDS["nav_pvt"]}, workers=0,
+    )
+    assert result.errors == {}
+    with column_reader.open_message(str(tmp_path / "nav_pvt.parquet")) as pvt:
+        assert list(pvt.columns) == ["frame", "iTOW", "numSV", "lat"]
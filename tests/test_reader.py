@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+import io
+import numpy as np
+import pytest
+import synthetic
+import ubx_reader
+
+
+def test_read_ubx_tables(ubx_log):
+    tables = ubx_reader.read_ubx(ubx_log, 9)
+    assert sorted(tables) == ["mon_span", "nav_pvt", "nav_relposned", "rxm_rawx"]
+    pvt = tables["nav_pvt"]
+    assert len(pvt) == synthetic.EPOCHS
+    np.testing.assert_array_equal(pvt["iTOW (ms)"], synthetic.ITOW0 + 1000 * np.arange(200))
+    # スケール適用後の値 (CSV と同じ)
+    np.testing.assert_allclose(pvt["lat (deg)"], 35 + 1e-6 * np.arange(200))
+    # 可変部はブロックごとに列が並び, 足りない部分は欠損になる
+    rawx = tables["rxm_rawx"]
+    assert list(rawx.columns).count("cno (dBHz)") == 4
+    assert rawx["cno (dBHz)"].iloc[4].tolist() == [20, 25, 30, 35]
+    assert rawx["cno (dBHz)"].iloc[1].isna().tolist() == [False, True, True, True]
+
+
+def test_select_messages(ubx_log):
+    tables = ubx_reader.read_ubx(ubx_log, 9, ["nav_pvt", 0x0215])
+    assert sorted(tables) == ["nav_pvt", "rxm_rawx"]
+    with pytest.raises(ValueError):
+        ubx_reader.read_ubx(ubx_log, 9, ["bogus"])
+
+
+def test_as_array(ubx_log):
+    arrays = ubx_reader.read_ubx(ubx_log, 9, ["rxm_rawx"], as_array=True)
+    fix, var = arrays["rxm_rawx"], arrays["rxm_rawx_var"]
+    assert len(fix) == 200
+    np.testing.assert_array_equal(fix["numMeas"], np.arange(200) % 5)
+    # index は固定部の行番号
+    np.testing.assert_array_equal(np.bincount(var["index"], minlength=200), np.arange(200) % 5)
+
+
+@pytest.mark.parametrize("as_array", [False, True])
+def test_failing_message_is_reported(tmp_path, as_array):
+    # 第 9 世代の MON-HW は定義のフィールド数が合わず変換できない
+    path = tmp_path / "hw.ubx"
+    pvt = synthetic.frame("nav_pvt", synthetic.payload("nav_pvt", {}))
+    path.write_bytes(pvt + synthetic.raw_frame(0x0A09, bytes(60)) + pvt)
+    errors, log = {}, io.StringIO()
+    result = ubx_reader.read_ubx(str(path), 9, as_array=as_array, log=log, errors=errors)
+    assert list(result) == ["nav_pvt"]
+    assert len(result["nav_pvt"]) == 2
+    assert list(errors) == ["mon_hw"]
+    assert errors["mon_hw"].startswith("ValueError: ")
+    assert f"Error in converting mon_hw: {errors['mon_hw']}" in log.getvalue()
+    # errors を渡さなくても残りのメッセージは返す
+    assert list(ubx_reader.read_ubx(str(path), 9, as_array=as_array)) == ["nav_pvt"]
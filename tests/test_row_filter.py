@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pytest
+import row_filter
+import synthetic
+import ublox
+import ubx_reader
+
+
+def test_row_filter(ubx_log):
+    full = ubx_reader.read_ubx(ubx_log, 9, ["nav_pvt"])["nav_pvt"]
+    part = ubx_reader.read_ubx(
+        ubx_log, 9, ["nav_pvt"], filters={"nav_pvt": "fixType == 3 and numSV >= 8"}
+    )["nav_pvt"]
+    expected = full[(full["fixType"] == 3) & (full["numSV"] >= 8)]
+    np.testing.assert_array_equal(part.to_numpy(), expected.to_numpy())
+
+
+def test_scaled_values_and_operators(ubx_log):
+    full = ubx_reader.read_ubx(ubx_log, 9, ["nav_pvt"])["nav_pvt"]
+    part = ubx_reader.read_ubx(
+        ubx_log, 9, ["nav_pvt"],
+        filters={"nav_pvt": ["35.0001 <= lat < 35.0015", "flags & 1", "fixType not in (-1, 2)"]},
+    )["nav_pvt"]
+    lat = full["lat (deg)"]
+    mask = (lat >= 35.0001) & (lat < 35.0015) & (full["flags"] % 2 == 1) & (full["fixType"] != 2)
+    np.testing.assert_array_equal(part["iTOW (ms)"], full["iTOW (ms)"][mask])
+
+
+def test_block_filter(ubx_log):
+    full = ubx_reader.read_ubx(ubx_log, 9, ["rxm_rawx"], as_array=True)
+    part = ubx_reader.read_ubx(
+        ubx_log, 9, ["rxm_rawx"], as_array=True, filters={"rxm_rawx": "cno > 30"}
+    )
+    var = full["rxm_rawx_var"]
+    np.testing.assert_array_equal(part["rxm_rawx_var"], var[var["cno (dBHz)"] > 30])
+    # ブロックを全て除かれた行も残る
+    assert len(part["rxm_rawx"]) == len(full["rxm_rawx"])
+
+
+def test_filter_counts(ubx_log):
+    messages = ubx_reader.select_messages(ubx_reader.get_messages(9), ["nav_pvt", "rxm_rawx"])
+    _, stats = ubx_reader.decode_file(
+        ubx_log, messages, filters={"nav_pvt": "fixType == 2", "rxm_rawx": "cno >= 30"}
+    )
+    assert stats.filtered_count == 200 - 67
+    assert stats.filtered_blocks == sum(min(i % 5, 2) for i in range(200))
+
+
+@pytest.mark.parametrize(
+    "expr",
+    ["foo > 1", "cno >", "__import__('os')", "lat.x > 1", "numSV in numSV", "(lat & 1) == 0",
+     "fixType in (-numSV, 3)", "fixType in (not 1,)"],
+)
+def test_invalid_filters(ubx_log, expr):
+    with pytest.raises(ValueError):
+        ubx_reader.read_ubx(ubx_log, 9, ["nav_pvt"], filters={"nav_pvt": expr})
+
+
+def test_filtered_instances_write_in_processes(ubx_log, tmp_path):
+    result = ubx_reader.convert_file(
+        ubx_log, gen=9, messages=["nav_pvt", "rxm_rawx"], formats=["csv"],
+        out_dir=str(tmp_path), filters={"nav_pvt": "fixType == 3", "rxm_rawx": "cno > 30"},
+        workers=2,
+    )
+    assert result.errors == {}
+    assert result.stats.filtered_count == 67
+    lines = open(tmp_path / "nav_pvt.csv").read().splitlines()
+    assert len(lines) == 1 + 200 - 67
+
+
+class Broken(Exception):
+    pass
+
+
+def _break_apply(monkeypatch) -> None:
+    apply = row_filter.RowFilter.apply
+
+    def broken(self, raw):
+        if raw:
+            raise Broken
+        return apply(self, raw)
+
+    monkeypatch.setattr(row_filter.RowFilter, "apply", broken)
+
+
+def test_failed_flush_keeps_pending(monkeypatch):
+    inst = ublox.Ublox(synthetic.desc_of("nav_pvt")[1], filters=["fixType == 3"])
+    frames = [dat for name, dat in synthetic.epochs(10) if name == "nav_pvt"]
+    for dat in frames:
+        inst.append(dat)
+    with monkeypatch.context() as m:
+        _break_apply(m)
+        with pytest.raises(Broken):
+            inst.flush()
+    assert len(inst._pending) == 10 and inst.count == 0
+    inst.flush()
+    assert inst.count == 6
+
+
+def test_filter_errors_propagate(ubx_log, monkeypatch):
+    # フレーム単位の例外処理 (数えて続行) に握りつぶされない
+    monkeypatch.setattr(ublox, "FILTER_BATCH", 8)
+    _break_apply(monkeypatch)
+    with pytest.raises(Broken):
+        ubx_reader.read_ubx(ubx_log, 9, ["nav_pvt"], filters={"nav_pvt": "fixType == 3"})
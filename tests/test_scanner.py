@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+import io
+import synthetic
+import ublox
+
+
+def _scan(scanner) -> list[tuple[int, bytes]]:
+    return list(scanner)
+
+
+def test_resync_and_checksum(ubx_log):
+    expected = [(synthetic.desc_of(name)[0], dat) for name, dat in synthetic.epochs()]
+    with open(ubx_log, "rb") as f:
+        scanner = ublox.FrameScanner(f, chunk_size=1000)
+        frames = _scan(scanner)
+    assert frames == expected
+    assert scanner.checksum_error_count == 1
+    assert scanner.ubx_count == len(expected) + 1
+
+
+def test_offset_is_end_of_last_frame(tmp_path):
+    path = tmp_path / "clean.ubx"
+    synthetic.write_log(str(path), n=3, noise=False)
+    with open(path, "rb") as f:
+        scanner = ublox.FrameScanner(f)
+        frames = _scan(scanner)
+    assert scanner.offset == path.stat().st_size
+    assert len(frames) == 3 * 3 + 1
+
+
+def test_truncated_tail_is_ignored():
+    dat = synthetic.epochs(1)[0][1]
+    frame = synthetic.frame("nav_pvt", dat)
+    scanner = ublox.FrameScanner(io.BytesIO(frame + frame[:20]), chunk_size=7)
+    assert _scan(scanner) == [(0x0107, dat)]
+    assert scanner.offset == len(frame)
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+import shutil
+import socket
+import threading
+import pytest
+import ubx_client
+import ubx_server
+
+
+@pytest.fixture
+def server(tmp_path):
+    path = str(tmp_path / "s.sock")
+    srv = ubx_server.Server(path, concurrency=2)
+    thread = threading.Thread(target=srv.serve_forever, daemon=True)
+    thread.start()
+    yield path
+    srv.shutdown()
+    srv.server_close()
+    thread.join()
+
+
+def test_convert_events(server, ubx_log, tmp_path):
+    events = []
+    result = ubx_client.convert(
+        ubx_log, str(tmp_path / "out"), server, on_event=events.append,
+        gen=9, formats=["csv"], messages=["nav_pvt"],
+    )
+    assert result["event"] == "done" and result["errors"] == 0
+    assert events[0]["event"] == "start"
+    assert {e["event"] for e in events} >= {"read", "write"}
+    assert (tmp_path / "out" / "nav_pvt.csv").exists()
+
+
+def test_errors_are_reported(server, tmp_path):
+    result = ubx_client.convert(str(tmp_path / "missing.ubx"), str(tmp_path), server, gen=9)
+    assert result["event"] == "error" and "FileNotFoundError" in result["message"]
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(server)
+        sock.sendall(b"not json\n")
+        reply = json.loads(sock.makefile("r").readline())
+    assert reply["event"] == "error" and reply["message"].startswith("Bad request")
+
+
+def test_client_writes_each_file_to_its_own_dir(server, ubx_log, tmp_path, capsys):
+    shutil.copy(ubx_log, tmp_path / "log1.ubx")
+    shutil.copy(ubx_log, tmp_path / "log2.ubx")
+    out = tmp_path / "out"
+    status = ubx_client.main([
+        str(tmp_path / "log1.ubx"), str(tmp_path / "log2.ubx"),
+        "--out-dir", str(out), "--socket", server, "--gen", "9", "--quiet",
+    ])
+    assert status == 0
+    for stem in ("log1", "log2"):
+        assert (out / stem / "nav_pvt.csv").exists()
+        assert (out / stem / "ubx2CSV.log").exists()
+    assert not os.path.exists(out / "nav_pvt.csv")
+    assert len(capsys.readouterr().out.splitlines()) == 2
+
+
+def test_client_rejects_same_stems(server, ubx_log, tmp_path):
+    (tmp_path / "a").mkdir()
+    (tmp_path / "b").mkdir()
+    shutil.copy(ubx_log, tmp_path / "a" / "log.ubx")
+    shutil.copy(ubx_log, tmp_path / "b" / "log.ubx")
+    with pytest.raises(SystemExit):
+        ubx_client.main([str(tmp_path / "a" / "log.ubx"), str(tmp_path / "b" / "log.ubx"), "--socket", server])
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+import numpy as np
+import pandas as pd
+import pytest
+import sinks
+import ubx_reader
+
+
+@pytest.fixture(scope="module")
+def instances(ubx_log):
+    messages = ubx_reader.select_messages(
+        ubx_reader.get_messages(9), ["nav_pvt", "rxm_rawx", "mon_span"]
+    )
+    ubx_instances, _ = ubx_reader.decode_file(ubx_log, messages)
+    return {inst.msg_desc.name: inst for inst in ubx_instances.values()}
+
+
+def _write(instance, formats, tmp_path) -> list[str]:
+    basename = str(tmp_path / instance.msg_desc.name)
+    return instance.write(sinks.make_sinks(formats, instance, basename))
+
+
+def test_npy(instances, tmp_path):
+    files = _write(instances["mon_span"], ["csv", "npy"], tmp_path)
+    assert sorted(os.path.basename(f) for f in files) == ["mon_span.csv", "mon_span_spectrum.npy"]
+    spectrum = np.load(tmp_path / "mon_span_spectrum.npy", mmap_mode="r")
+    assert spectrum.shape == (20, 1, 256) and spectrum.dtype == np.uint8
+    np.testing.assert_array_equal(spectrum[1, 0], (10 + np.arange(256)) % 256)
+    # npy と一緒に書いた CSV からは配列の列を除く
+    header = open(tmp_path / "mon_span.csv").readline()
+    assert "spectrum" not in header and "center" in header
+
+
+def test_npy_only_for_array_fields(instances, tmp_path):
+    files = _write(instances["nav_pvt"], ["csv", "npy"], tmp_path)
+    assert [os.path.basename(f) for f in files] == ["nav_pvt.csv"]
+
+
+def test_unknown_format(instances):
+    with pytest.raises(ValueError):
+        sinks.make_sinks(["xls"], instances["nav_pvt"], "nav_pvt")
+
+
+def test_one_pass_to_several_sinks(instances, tmp_path):
+    pytest.importorskip("pyarrow")
+    instance = instances["rxm_rawx"]
+    files = instance.write(
+        sinks.make_sinks(["csv", "parquet"], instance, str(tmp_path / "rxm_rawx")), batch_rows=64
+    )
+    assert "rxm_rawx.csv" in [os.path.basename(f) for f in files]
+    assert "rxm_rawx.parquet" in [os.path.basename(f) for f in files]
+    expected = instance.to_dataframe()
+    csv = pd.read_csv(tmp_path / "rxm_rawx.csv")
+    assert csv.columns[0] == "# rcvTow (ms)"
+    # バッチの境目をまたいでも 1 回の展開と同じ内容になる
+    np.testing.assert_allclose(csv.to_numpy(float), expected.to_numpy(float), equal_nan=True)
+
+
+def test_parquet_needs_pyarrow(instances, monkeypatch):
+    monkeypatch.setitem(sys.modules, "pyarrow", None)
+    with pytest.raises(ImportError, match="pyarrow"):
+        sinks.make_sinks(["parquet"], instances["nav_pvt"], "nav_pvt")
+
+
+class FailingSink(sinks.Sink):
+    def write(self, raw, df):
+        raise RuntimeError("disk full")
+
+    def close(self):
+        return []
+
+
+@pytest.mark.parametrize("threaded", [False, True])
+def test_failed_sink_closes_the_others(instances, tmp_path, threaded):
+    instance = instances["nav_pvt"]
+    csv = sinks.CsvSink(instance, str(tmp_path / "nav_pvt"))
+    with pytest.raises(RuntimeError, match="disk full"):
+        instance.write([csv, FailingSink(instance, "x")], batch_rows=50, threaded=threaded)
+    # CSV 側は閉じられ, 書けた分は残る
+    assert csv.close() == [str(tmp_path / "nav_pvt.csv")]
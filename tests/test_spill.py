@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pandas as pd
+import ubx_reader
+
+
+def test_spilled_payloads_decode_the_same(ubx_log):
+    messages = ubx_reader.select_messages(ubx_reader.get_messages(9), ["nav_pvt", "rxm_rawx"])
+    full, _ = ubx_reader.decode_file(ubx_log, messages)
+    spilled, stats = ubx_reader.decode_file(ubx_log, messages, memory_budget=4096)
+    assert stats.spill_count > 0
+    for key, inst in full.items():
+        assert spilled[key].count == inst.count
+        assert list(spilled[key].iter_raw()) == list(inst.iter_raw())
+        pd.testing.assert_frame_equal(spilled[key].to_dataframe(), inst.to_dataframe())
+
+
+def test_as_array_with_budget(ubx_log):
+    a = ubx_reader.read_ubx(ubx_log, 9, ["rxm_rawx"], as_array=True)
+    b = ubx_reader.read_ubx(ubx_log, 9, ["rxm_rawx"], as_array=True, memory_budget=4096)
+    for name in ("rxm_rawx", "rxm_rawx_var"):
+        assert a[name].dtype == b[name].dtype
+        np.testing.assert_array_equal(a[name], b[name])
+    var = b["rxm_rawx_var"]
+    assert len(var) == sum(i % 5 for i in range(200))
+    assert var["index"][0] == 1
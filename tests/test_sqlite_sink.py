@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+import sqlite3
+import numpy as np
+import pytest
+import sinks
+import synthetic
+import ubx_reader
+
+
+@pytest.fixture(scope="module")
+def database(ubx_log, tmp_path_factory) -> str:
+    messages = ubx_reader.select_messages(
+        ubx_reader.get_messages(9), ["nav_pvt", "rxm_rawx", "mon_span"]
+    )
+    ubx_instances, _ = ubx_reader.decode_file(ubx_log, messages)
+    out_dir = tmp_path_factory.mktemp("sqlite")
+    for inst in ubx_instances.values():
+        basename = str(out_dir / inst.msg_desc.name)
+        # 同じメッセージを書き直してもテーブルは作り直される
+        for _ in range(2):
+            files = inst.write(sinks.make_sinks(["sqlite"], inst, basename))
+            assert files == [str(out_dir / sinks.SQLITE_FILENAME)]
+    return str(out_dir / sinks.SQLITE_FILENAME)
+
+
+@pytest.fixture
+def con(database):
+    con = sqlite3.connect(database)
+    yield con
+    con.close()
+
+
+def test_tables(con):
+    tables = {r[0] for r in con.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    assert tables == {"_columns", "nav_pvt", "rxm_rawx", "rxm_rawx_blocks", "mon_span", "mon_span_blocks"}
+
+
+def test_fixed_part(con):
+    assert con.execute("SELECT count(*) FROM nav_pvt").fetchone() == (200,)
+    rows = con.execute('SELECT frame, "iTOW", lat, "numSV" FROM nav_pvt ORDER BY frame').fetchall()
+    assert rows[:2] == [(0, synthetic.ITOW0, 350_000_000, 5), (1, synthetic.ITOW0 + 1000, 350_000_010, 6)]
+    # スケール未適用の整数で格納する
+    assert con.execute("SELECT typeof(lat) FROM nav_pvt LIMIT 1").fetchone() == ("integer",)
+    assert con.execute("SELECT scale, header, unit, code FROM _columns WHERE tbl = 'nav_pvt' AND name = 'lat'").fetchone() == (
+        pytest.approx(1e-7), "lat (deg)", "deg", "I4"
+    )
+
+
+def test_blocks(con):
+    n = sum(i % 5 for i in range(200))
+    assert con.execute("SELECT count(*) FROM rxm_rawx_blocks").fetchone() == (n,)
+    rows = con.execute(
+        "SELECT frame, block, cno FROM rxm_rawx_blocks WHERE frame = 4 ORDER BY block"
+    ).fetchall()
+    assert rows == [(4, k, 20 + 5 * k) for k in range(4)]
+    # 子テーブルの frame は親の行を指す
+    orphans = con.execute(
+        "SELECT count(*) FROM rxm_rawx_blocks b LEFT JOIN rxm_rawx r USING (frame) WHERE r.frame IS NULL"
+    ).fetchone()
+    assert orphans == (0,)
+    assert con.execute('SELECT "numMeas" FROM rxm_rawx WHERE frame = 4').fetchone() == (4,)
+
+
+def test_array_field_is_blob(con):
+    spectrum, center = con.execute(
+        "SELECT spectrum, center FROM mon_span_blocks WHERE frame = 1"
+    ).fetchone()
+    assert isinstance(spectrum, bytes) and len(spectrum) == 256
+    np.testing.assert_array_equal(np.frombuffer(spectrum, np.uint8), (10 + np.arange(256)) % 256)
+    assert center == 1575420000
+
+
+def test_indexes(con):
+    indexes = {
+        r[0]: r[1]
+        for r in con.execute("SELECT name, tbl_name FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL")
+    }
+    assert indexes["nav_pvt_iTOW"] == "nav_pvt"
+    assert indexes["rxm_rawx_week_rcvTow"] == "rxm_rawx"
+    assert indexes["rxm_rawx_blocks_frame"] == "rxm_rawx_blocks"
+    assert indexes["mon_span_blocks_frame"] == "mon_span_blocks"
+    plan = " ".join(
+        str(r[-1]) for r in con.execute(
+            'EXPLAIN QUERY PLAN SELECT * FROM rxm_rawx WHERE week = ? AND "rcvTow" > ?',
+            (synthetic.WEEK, 0),
+        )
+    )
+    assert "rxm_rawx_week_rcvTow" in plan
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+import io
+import numpy as np
+import pytest
+import synthetic
+import timing_qc
+import ublox
+import ubx_reader
+
+
+def test_regular_rate():
+    r = timing_qc.timing_report(np.arange(100) * 200.0)
+    assert (r.epochs, r.period_ms, r.rate_hz) == (100, 200.0, 5.0)
+    assert (r.missing, r.gap_count, r.duplicates, r.backward) == (0, 0, 0, 0)
+    assert r.jitter_std_ms == r.jitter_max_ms == 0.0
+    # ずれはすべて -0.5..0.5 の区間
+    assert r.jitter_hist == (0, 0, 0, 99, 0, 0, 0)
+
+
+def test_gaps_duplicates_and_backward():
+    times = [0, 1000, 2000, 5000, 6000, 6000, 7000, 6500, 8000, 9000.7, 10000]
+    r = timing_qc.timing_report(np.array(times, dtype=float))
+    assert r.period_ms == 1000.0
+    # 2000 -> 5000 で 2 エポック, 6500 -> 8000 は 1.5 倍以下なので欠損ではない
+    assert (r.missing, r.gap_count) == (2, 1)
+    assert r.gaps == [(2000.0, 5000.0, 2)]
+    assert (r.duplicates, r.backward) == (1, 1)
+    assert r.jitter_max_ms == pytest.approx(500.0)
+    assert sum(r.jitter_hist) == 7
+
+
+def test_week_rollover():
+    times = ublox.WEEK_MS + np.arange(-3, 3) * 1000.0
+    r = timing_qc.timing_report(np.where(times >= ublox.WEEK_MS, times - ublox.WEEK_MS, times))
+    assert (r.period_ms, r.missing, r.backward) == (1000.0, 0, 0)
+
+
+def test_short_series():
+    assert timing_qc.timing_report(np.array([5.0])) == timing_qc.TimingReport(epochs=1)
+    r = timing_qc.timing_report(np.array([5.0, 5.0]))
+    assert (r.duplicates, r.period_ms, r.rate_hz) == (1, 0.0, 0.0)
+
+
+def test_gaps_listed_are_limited():
+    times = np.arange(0, 3000 * (timing_qc.MAX_GAPS_LISTED + 5), 3000.0)
+    times = np.sort(np.concatenate([times, times + 1000]))
+    r = timing_qc.timing_report(times)
+    assert r.gap_count > timing_qc.MAX_GAPS_LISTED
+    assert len(r.gaps) == timing_qc.MAX_GAPS_LISTED
+    out = io.StringIO()
+    timing_qc.write_timing_qc(out, {"nav_pvt": r})
+    assert f"first {timing_qc.MAX_GAPS_LISTED} of {r.gap_count}" in out.getvalue()
+
+
+@pytest.fixture
+def gap_log(tmp_path) -> str:
+    # エポック 50..59 が抜けたログ
+    path = str(tmp_path / "gap.ubx")
+    frames = []
+    for i in list(range(50)) + list(range(60, 100)):
+        itow = synthetic.ITOW0 + 1000 * i
+        frames.append(("nav_pvt", synthetic.payload("nav_pvt", dict(iTOW=itow))))
+        frames.append(
+            ("rxm_rawx", synthetic.payload("rxm_rawx", dict(rcvTow=itow / 1000, week=synthetic.WEEK)))
+        )
+    synthetic.write_frames(path, frames)
+    return path
+
+
+def test_timing_reports(gap_log):
+    messages = ubx_reader.select_messages(ubx_reader.get_messages(9), ["nav_pvt", "rxm_rawx"])
+    instances, _ = ubx_reader.decode_file(gap_log, messages)
+    reports = timing_qc.timing_reports(instances)
+    assert sorted(reports) == ["nav_pvt", "rxm_rawx"]
+    for r in reports.values():
+        # rcvTow (s) も ms に揃えて数える
+        assert (r.epochs, r.period_ms, r.missing, r.gap_count) == (90, 1000.0, 10, 1)
+        assert r.gaps == [(synthetic.ITOW0 + 49_000.0, synthetic.ITOW0 + 60_000.0, 10)]
+
+
+def test_convert_file_reports_timing(gap_log, tmp_path):
+    result = ubx_reader.convert_file(
+        gap_log, gen=9, messages=["nav_pvt"], out_dir=str(tmp_path / "out"), workers=0
+    )
+    assert list(result.timing) == ["nav_pvt"]
+    assert result.timing["nav_pvt"].missing == 10
+
+    out = io.StringIO()
+    timing_qc.write_timing_qc(out, result.timing)
+    text = out.getvalue()
+    assert text.startswith("\nTiming QC\nnav_pvt: epochs=90, rate=1.000 Hz (1000 ms), missing=10, gaps=1,")
+    assert "  jitter (ms) <-10: 0, -10..-1: 0, -1..-0.5: 0, -0.5..0.5: 88," in text
+    assert "gap: 345649000 -> 345660000 ms (11 s, 10 missing)" in text
+
+
+def test_write_timing_qc_empty():
+    out = io.StringIO()
+    timing_qc.write_timing_qc(out, {})
+    assert out.getvalue() == ""
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+import shutil
+import pytest
+import synthetic
+import ublox
+import ubx_file
+
+T0 = synthetic.ITOW0
+
+
+@pytest.fixture
+def log_copy(tmp_path, ubx_log) -> str:
+    # 索引を入力の隣へ保存するので共有のログを複製して使う
+    path = str(tmp_path / "log.ubx")
+    shutil.copy(ubx_log, path)
+    return path
+
+
+def test_frame_access(log_copy):
+    with ubx_file.UbxFile(log_copy, gen=9) as f:
+        # チェックサムの合わないフレームとごみは索引に入らない
+        assert len(f) == 200 * 3 + 20
+        first = f[0]
+        assert (first.index, first.name, first.time) == (0, "nav_pvt", T0)
+        assert dict(first.fields())["height (mm)"] == 40_000
+        assert first.values()[0] == T0
+        assert f[-1].name == "nav_relposned"
+        assert [fr.name for fr in f[1:4]] == ["rxm_rawx", "nav_relposned", "mon_span"]
+        with pytest.raises(IndexError):
+            f[len(f)]
+
+        # 時刻を持たないメッセージは NaN
+        assert f[2].time != f[2].time
+        with open(log_copy, "rb") as raw:
+            raw.seek(f[4].offset)
+            assert raw.read(2) == ublox.UBX_SYNC
+
+
+def test_frames_by_class(log_copy):
+    with ubx_file.UbxFile(log_copy, gen=9) as f:
+        pvt = list(f.frames("nav_pvt"))
+        assert len(pvt) == 200
+        assert [fr.time for fr in pvt[:3]] == [T0, T0 + 1000, T0 + 2000]
+        assert [fr.index for fr in f.frames(0x0A31)] == [fr.index for fr in f.frames("mon_span")]
+        assert len(list(f.frames())) == len(f)
+
+
+def test_between(log_copy):
+    with ubx_file.UbxFile(log_copy, gen=9) as f:
+        names = [fr.name for fr in f.between(T0 + 10_000, T0 + 11_000)]
+        # NAV-RELPOSNED と MON-SPAN は時刻を持たないが, 範囲内のエポックに続くので含める
+        assert names == [
+            "nav_pvt", "rxm_rawx", "nav_relposned", "mon_span", "nav_pvt", "rxm_rawx"
+        ]
+        pvt = f.between(T0 + 10_000, T0 + 19_500, "nav_pvt")
+        assert [fr.time for fr in pvt] == [T0 + 1000 * i for i in range(10, 20)]
+        assert f.between(0, 1000) == []
+
+
+def test_between_with_non_monotonic_time(tmp_path):
+    # 受信機のリセットで iTOW が途中で戻り, その後また元の時刻へ進むログ
+    path = str(tmp_path / "reset.ubx")
+    frames = []
+    for itow in (100_000, 101_000, 5_000, 6_000, 102_000, ublox.WEEK_MS - 1000, 0):
+        frames.append(("nav_pvt", synthetic.payload("nav_pvt", dict(iTOW=itow))))
+        frames.append(("nav_relposned", synthetic.payload("nav_relposned", dict(relPosN=itow))))
+    synthetic.write_frames(path, frames)
+
+    with ubx_file.UbxFile(path, gen=9, index_file=False) as f:
+        hit = f.between(100_000, 102_000)
+        assert [fr.time for fr in hit if fr.time == fr.time] == [100_000, 101_000, 102_000]
+        # 範囲外の時刻に続く時刻を持たないフレームも返さない
+        assert [fr.index for fr in hit] == [0, 1, 2, 3, 8]
+        assert [fr.time for fr in f.between(0, 6_000, "nav_pvt")] == [5_000, 6_000, 0]
+        # 週の境界をまたぐ場合も, 範囲外の時刻は挟まない
+        assert [fr.index for fr in f.between(0, 5_000)] == [4, 5, 12]
+
+
+def test_index_file_is_reused(log_copy):
+    with ubx_file.UbxFile(log_copy, gen=9) as f:
+        n = len(f)
+    with ubx_file.UbxFile(log_copy, gen=9) as f:
+        loaded = f._load_index()
+        assert loaded is not None and len(loaded.offset) == n
+    # 入力が変われば作り直す
+    with open(log_copy, "ab") as out:
+        out.write(synthetic.frame("nav_pvt", synthetic.payload("nav_pvt", {})))
+    with ubx_file.UbxFile(log_copy, gen=9) as f:
+        assert f._load_index() is None
+        assert len(f) == n + 1
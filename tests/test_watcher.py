@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+import concurrent.futures
+import json
+import os
+import shutil
+import ubx_reader
+import watcher
+
+OPTIONS = dict(gen=9, formats=("csv",), messages=["nav_pvt"])
+
+
+def test_convert_job(ubx_log, tmp_path):
+    out_dir = str(tmp_path / "out")
+    result = watcher.convert_job(ubx_log, out_dir, OPTIONS)
+    assert result["files"] >= 1 and result["errors"] == 0 and not result["cached"]
+    assert os.path.exists(os.path.join(out_dir, "nav_pvt.csv"))
+    log = open(os.path.join(out_dir, "ubx2CSV.log")).read()
+    assert "Summary of the conversion" in log
+
+
+def test_settle_and_no_reconversion(ubx_log, tmp_path):
+    inbox = tmp_path / "inbox"
+    inbox.mkdir()
+    shutil.copy(ubx_log, inbox / "a.ubx")
+    (inbox / "notes.txt").write_text("not a log")
+    w = watcher.Watcher(str(inbox), str(tmp_path / "outbox"), settle=3600, options=OPTIONS)
+    with concurrent.futures.ThreadPoolExecutor(1) as pool:
+        w._scan()
+        assert list(w.pending) == [str(inbox / "a.ubx")]
+        # 安定するまでは投入しない
+        w._dispatch(pool)
+        assert not w.running
+        w.settle = 0
+        w._dispatch(pool)
+        assert len(w.running) == 1
+        w._collect(wait=True)
+        assert w.done_count == 1
+        # 変更されない限り再変換しない
+        w._scan()
+        assert not w.pending
+        with open(inbox / "a.ubx", "ab") as f:
+            f.write(b"\0")
+        w._scan()
+        assert list(w.pending) == [str(inbox / "a.ubx")]
+    assert (tmp_path / "outbox" / "a" / "nav_pvt.csv").exists()
+
+
+def test_run(ubx_log, tmp_path):
+    inbox = tmp_path / "inbox"
+    inbox.mkdir()
+    shutil.copy(ubx_log, inbox / "a.ubx")
+    shutil.copy(ubx_log, inbox / "b.ubx")
+    status = tmp_path / "status.json"
+    w = watcher.Watcher(
+        str(inbox), str(tmp_path / "outbox"), workers=2, settle=0, poll_interval=0.05,
+        status_file=str(status), done_dir=str(tmp_path / "done"), options=OPTIONS,
+    )
+    w.run(max_idle=0.5)
+    assert sorted(os.listdir(tmp_path / "done")) == ["a.ubx", "b.ubx"]
+    assert not os.listdir(inbox)
+    for stem in ("a", "b"):
+        assert (tmp_path / "outbox" / stem / "nav_pvt.csv").exists()
+    state = json.loads(status.read_text())
+    assert state["done"] == 2 and state["failed"] == 0 and state["running"] == 0
+
+
+def test_warm_up():
+    # 定義のヘッダ数が合わないメッセージ (MON-HW など) があっても失敗しない
+    ubx_reader.warm_up()
@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+import os
+import pytest
+import ubx_reader
+
+
+@pytest.mark.parametrize("workers", [0, 2])
+def test_write_all(ubx_log, tmp_path, workers):
+    messages = ubx_reader.get_messages(9)
+    instances, _ = ubx_reader.decode_file(ubx_log, messages)
+    calls = []
+    files, errors = ubx_reader.write_all(
+        instances, ["csv"], workers=workers, out_dir=str(tmp_path),
+        progress=lambda key, name, done, total: calls.append((name, done, total)),
+    )
+    assert errors == {}
+    names = sorted(os.path.basename(f) for fs in files.values() for f in fs)
+    assert names == ["mon_span.csv", "nav_pvt.csv", "nav_relposned.csv", "rxm_rawx.csv"]
+    assert [c[1:] for c in calls] == [(i, 4) for i in range(1, 5)]
+    if not workers:
+        # 直列の場合はペイロード量の多い順
+        by_size = sorted(instances.values(), key=lambda inst: -inst.payload_bytes)
+        assert [c[0] for c in calls] == [inst.msg_desc.name for inst in by_size if inst.count]
+    with open(tmp_path / "nav_pvt.csv") as f:
+        assert len(f.readlines()) == 201
+
+
+def test_write_all_collects_errors(ubx_log, tmp_path):
+    messages = ubx_reader.select_messages(ubx_reader.get_messages(9), ["nav_pvt", "rxm_rawx"])
+    instances, _ = ubx_reader.decode_file(ubx_log, messages)
+    files, errors = ubx_reader.write_all(
+        instances, ["csv", "xls"], workers=0, out_dir=str(tmp_path)
+    )
+    assert files == {}
+    assert sorted(errors) == sorted(instances)
+    assert all(e.startswith("ValueError") for e in errors.values())
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""Data-gap and rate-jitter report per message from the receive times (iTOW / rcvTow)."""
+
+import dataclasses
+from typing import TextIO
+import numpy as np
+import ublox
+
+# 周期からのずれ (ms) のヒストグラムの境界
+JITTER_EDGES_MS = (-np.inf, -10.0, -1.0, -0.5, 0.5, 1.0, 10.0, np.inf)
+# 周期の何倍を超えた間隔を欠損とみなすか
+GAP_FACTOR = 1.5
+MAX_GAPS_LISTED = 20
+
+
+@dataclasses.dataclass
+class TimingReport:
+    epochs: int
+    period_ms: float = 0.0
+    missing: int = 0
+    gap_count: int = 0
+    duplicates: int = 0
+    backward: int = 0
+    jitter_std_ms: float = 0.0
+    jitter_max_ms: float = 0.0
+    jitter_hist: tuple[int, ...] = ()
+    # (欠損直前の時刻, 欠損直後の時刻, 欠けたエポック数) [ms]
+    gaps: list[tuple[float, float, int]] = dataclasses.field(default_factory=list)
+
+    @property
+    def rate_hz(self) -> float:
+        return 1000.0 / self.period_ms if self.period_ms else 0.0
+
+
+def timing_report(times_ms: np.ndarray) -> TimingReport:
+    """
+    受信順の時刻列 (ms) から公称周期 (正の間隔の中央値), 欠損, 重複, 逆行, ジッタを求める.
+    週の境界で時刻が 0 に戻る場合は 1 週間分を足して連続させる.
+    """
+    times_ms = np.asarray(times_ms, dtype=float)
+    report = TimingReport(epochs=len(times_ms))
+    if len(times_ms) < 2:
+        return report
+    dt = np.diff(times_ms)
+    dt = np.where(dt < -ublox.WEEK_MS / 2, dt + ublox.WEEK_MS, dt)
+    report.duplicates = int(np.count_nonzero(dt == 0))
+    report.backward = int(np.count_nonzero(dt < 0))
+    positive = dt[dt > 0]
+    if not len(positive):
+        return report
+    period = float(np.median(positive))
+    report.period_ms = period
+
+    is_gap = dt > period * GAP_FACTOR
+    missing = np.rint(dt[is_gap] / period).astype(np.int64) - 1
+    report.missing = int(missing.sum())
+    idx = np.flatnonzero(is_gap)
+    report.gap_count = len(idx)
+    report.gaps = [
+        (float(times_ms[i]), float(times_ms[i + 1]), int(n))
+        for i, n in zip(idx[:MAX_GAPS_LISTED], missing[:MAX_GAPS_LISTED])
+    ]
+
+    jitter = dt[(dt > 0) & ~is_gap] - period
+    if len(jitter):
+        report.jitter_std_ms = float(jitter.std())
+        report.jitter_max_ms = float(np.abs(jitter).max())
+        report.jitter_hist = tuple(
+            int(n) for n in np.histogram(jitter, bins=JITTER_EDGES_MS)[0]
+        )
+    return report
+
+
+def timing_reports(ubx_instances: dict[int, ublox.Ublox]) -> dict[str, TimingReport]:
+    """デコード時に記録した受信時刻から, 時刻フィールドを持つメッセージごとの QC を求める"""
+    return {
+        inst.msg_desc.name: timing_report(np.frombuffer(inst.times, dtype=float))
+        for inst in ubx_instances.values()
+        if len(inst.times)
+    }
+
+
+def write_timing_qc(fobjlog: TextIO, reports: dict[str, TimingReport]) -> None:
+    """timing_reports の結果を ubx2CSV.log の要約の後に書く"""
+    if not reports:
+        return
+    labels = [
+        f"<{hi:g}" if lo == -np.inf else f">{lo:g}" if hi == np.inf else f"{lo:g}..{hi:g}"
+        for lo, hi in zip(JITTER_EDGES_MS[:-1], JITTER_EDGES_MS[1:])
+    ]
+    fobjlog.write("\nTiming QC\n")
+    for name, r in reports.items():
+        fobjlog.write(
+            f"{name}: epochs={r.epochs:,}, rate={r.rate_hz:.3f} Hz ({r.period_ms:g} ms), "
+            f"missing={r.missing:,}, gaps={r.gap_count:,}, "
+            f"duplicates={r.duplicates:,}, backward={r.backward:,}, "
+            f"jitter std={r.jitter_std_ms:.3f} ms, max={r.jitter_max_ms:.3f} ms\n"
+        )
+        if r.jitter_hist:
+            hist = ", ".join(f"{label}: {n:,}" for label, n in zip(labels, r.jitter_hist))
+            fobjlog.write(f"  jitter (ms) {hist}\n")
+        if r.gap_count > len(r.gaps):
+            fobjlog.write(f"  first {len(r.gaps)} of {r.gap_count:,} gaps:\n")
+        for start, end, n in r.gaps:
+            fobjlog.write(
+                f"  gap: {start:.0f} -> {end:.0f} ms ({(end - start) / 1000:g} s, {n:,} missing)\n"
+            )
@@ -1,32 +1,243 @@
 # -*- coding: utf-8 -*-
+import array
+import dataclasses
+import itertools
+import os
+import shutil
 import struct
+import sys
+import tempfile
+from typing import BinaryIO, Iterable, Iterator, TextIO
+import numpy as np
 import pandas as pd
 import model
+import row_filter
+import sinks
 
 UBX_SYNC: bytes = bytes((0xB5, 0x62))
+WEEK_MS = 7 * 24 * 3600 * 1000
+# フィルタをまとめて評価するフレーム数
+FILTER_BATCH = 4096
+
+class MemoryBudget:
+    """
+    全メッセージ共通の生ペイロード保持量の上限.
+    超過すると保持量の多いインスタンスから一時ファイルへ退避 (spill) する.
+    受信時刻の列 (Ublox.times, 1 フレーム 8 バイト) は退避できないので数えない.
+    """
+
+    def __init__(self, limit: int, tmpdir: str | None = None) -> None:
+        self.limit = limit
+        self.tmpdir = tmpdir
+        self.instances: list["Ublox"] = []
+        self.in_memory = 0
+        self.spill_count = 0
+        self.spilled_bytes = 0
+
+    def register(self, instance: "Ublox") -> None:
+        self.instances.append(instance)
+
+    def release(self, n: int) -> None:
+        self.in_memory -= n
+
+    def charge(self, n: int) -> None:
+        self.in_memory += n
+        if self.in_memory <= self.limit:
+            return
+        # 上限の半分まで減らし, 細かい spill の繰り返しを避ける
+        while self.in_memory > self.limit // 2:
+            largest = max(self.instances, key=lambda inst: inst.raw_bytes)
+            if largest.raw_bytes == 0:
+                break
+            self.spilled_bytes += largest.raw_bytes
+            self.in_memory -= largest.raw_bytes
+            self.spill_count += 1
+            largest.spill()
+
 
 class Ublox:
-    def __init__(self, desc: model.UbxMsgDesc) -> None:
-        self.payload = []
+    def __init__(
+        self,
+        desc: model.UbxMsgDesc,
+        budget: MemoryBudget | None = None,
+        expand_bits: bool = False,
+        fields: Iterable[str] | None = None,
+        filters: Iterable[str] | None = None,
+    ) -> None:
+        # 生ペイロードのまま保持し, 書き出し時にまとめて展開する
+        self.raw: list[bytes] = []
+        self.raw_bytes = 0
+        self.payload_bytes = 0
+        self.count = 0
+        self.n_var_min = 0
+        self.n_var_max = 0
         self.msg_desc = desc
+        self.budget = budget
+        self.expand_bits = expand_bits
+        # チェックポイントで確定したペイロードのファイル (受信順)
+        self.chunks: list[str] = []
+        self._spill_file = None
+        # 受信時刻 (ms) の列. 時刻フィールドを持たないメッセージは空のまま
+        self.times = array.array("d")
+        self._clock = model.clock_field(desc)
+        self._select(fields)
+        # フィルタ (row_filter.RowFilter) は FILTER_BATCH フレームずつ評価し, 残ったものだけを保持する
+        self.filter = row_filter.RowFilter(desc, filters) if filters else None
+        self._pending: list[bytes] = []
+        if budget is not None:
+            budget.register(self)
+
+    def _select(self, fields: Iterable[str] | None) -> None:
+        """
+        書き出すフィールドを決める. fields はヘッダ (lat (deg)) か単位を除いた名前 (lat) で,
+        None なら全フィールド. 選ばなかったフィールドは展開時に struct のパディングで読み飛ばす.
+        """
+        desc = self.msg_desc
+        self.fields = None if fields is None else tuple(fields)
+        names = frozenset(self.fields or ())
+        self._keep_fix = tuple(
+            fields is None or model.field_selected(h, names) for h in desc.hdr_fix
+        )
+        self._keep_var = tuple(
+            fields is None or model.field_selected(h, names) for h in desc.hdr_var
+        )
+        if fields is not None:
+            known = {h for h in desc.hdr_fix + desc.hdr_var}
+            known |= {model.UNIT_RE.sub(r"\1", h) for h in known}
+            unknown = names - known
+            if unknown:
+                raise ValueError(f"Unknown fields for {desc.name}: {sorted(unknown)}")
+
+        def keep(values: tuple, mask: tuple[bool, ...]) -> tuple:
+            return tuple(v for v, k in zip(values, mask) if k)
+
+        self.hdr_fix = keep(desc.hdr_fix, self._keep_fix)
+        self.hdr_var = keep(desc.hdr_var, self._keep_var)
+        self.scale_fix = keep(desc.scale_fix, self._keep_fix)
+        self.scale_var = keep(desc.scale_var, self._keep_var)
+        self.bits_fix = tuple(b for b in desc.bits_fix if b[0] in self.hdr_fix)
+        self.bits_var = tuple(b for b in desc.bits_var if b[0] in self.hdr_var)
+        self.array_fix = tuple(a for a in desc.array_fix if a in self.hdr_fix)
+        self.array_var = tuple(a for a in desc.array_var if a in self.hdr_var)
+        if fields is None:
+            # ヘッダ数が合わない定義もこれまでどおり展開できるようフォーマットはそのまま使う
+            self._fmt_fix = model.convert_fmt(desc.fmt_fix)
+            self._fmt_var = model.convert_fmt(desc.fmt_var)
+        else:
+            self._fmt_fix = model.projected_fmt(desc.fmt_fix, self._keep_fix)
+            self._fmt_var = model.projected_fmt(desc.fmt_var, self._keep_var)
+
+    @property
+    def columns_fix(self) -> tuple[model.FieldColumn, ...]:
+        """型付きの出力の列 (model.field_columns のうち選択したもの)"""
+        desc = self.msg_desc
+        columns = model.field_columns(desc.fmt_fix, desc.hdr_fix, desc.scale_fix, desc.array_fix)
+        return tuple(c for c in columns if c.header in self.hdr_fix)
+
+    @property
+    def columns_var(self) -> tuple[model.FieldColumn, ...]:
+        desc = self.msg_desc
+        if not desc.payload_len_var:
+            return ()
+        columns = model.field_columns(desc.fmt_var, desc.hdr_var, desc.scale_var, desc.array_var)
+        return tuple(c for c in columns if c.header in self.hdr_var)
+
+    def __getstate__(self) -> dict:
+        # プロセス間で受け渡す場合は退避済みのペイロードも読み戻して渡す.
+        # フィルタは式をラムダに組み立てて持つので pickle できない. 保留分を評価してから外す
+        self.flush()
+        state = self.__dict__.copy()
+        state["raw"] = list(self.iter_raw())
+        state["budget"] = None
+        state["_spill_file"] = None
+        state["filter"] = None
+        state["_pending"] = []
+        return state
 
     def _conv(self, fmt: str) -> str:
         return model.convert_fmt(fmt)
 
-    def unpack(self, dat: bytes) -> list[str | float]:
+    @property
+    def payload(self) -> list[list[str | float]]:
+        return [self.unpack(dat) for dat in self.iter_raw()]
+
+    def spill(self) -> None:
+        """メモリ上の生ペイロードを (長さ U2 + ペイロード) の列として一時ファイルへ追記する"""
+        if self._spill_file is None:
+            dir_ = self.budget.tmpdir if self.budget is not None else None
+            self._spill_file = tempfile.TemporaryFile(dir=dir_)
+        self._spill_file.write(
+            b"".join(len(d).to_bytes(2, "little") + d for d in self.raw)
+        )
+        self.raw = []
+        self.raw_bytes = 0
+
+    def persist(self, path: str) -> None:
+        """
+        一時ファイルとメモリ上のペイロードを path へ書き出して fsync し, chunks に加える.
+        以後それらは path から読まれる (チェックポイント用).
+        """
+        with open(path, "wb") as f:
+            if self._spill_file is not None:
+                self._spill_file.flush()
+                self._spill_file.seek(0)
+                shutil.copyfileobj(self._spill_file, f)
+                self._spill_file.close()
+                self._spill_file = None
+            f.write(b"".join(len(d).to_bytes(2, "little") + d for d in self.raw))
+            f.flush()
+            os.fsync(f.fileno())
+        self.chunks.append(path)
+        if self.budget is not None:
+            self.budget.release(self.raw_bytes)
+        self.raw = []
+        self.raw_bytes = 0
+
+    @staticmethod
+    def _read_records(f: BinaryIO) -> Iterator[bytes]:
+        while True:
+            head = f.read(2)
+            if len(head) < 2:
+                return
+            yield f.read(int.from_bytes(head, "little"))
+
+    def iter_raw(self) -> Iterator[bytes]:
+        """確定済み, 退避済み, メモリ上のペイロードの順に受信順で返す"""
+        for path in self.chunks:
+            with open(path, "rb") as f:
+                yield from self._read_records(f)
+        if self._spill_file is not None:
+            f = self._spill_file
+            f.flush()
+            f.seek(0)
+            yield from self._read_records(f)
+            f.seek(0, 2)
+        yield from self.raw
+
+    def n_var(self, dat: bytes) -> int:
+        """ペイロード長を検証し, 可変部の繰り返し数を返す"""
+        # 判定条件を変える場合は model.payload_fits も合わせること
         desc = self.msg_desc
         if desc.payload_len_var:
             rem = len(dat) - desc.payload_len_fix
-            if rem % desc.payload_len_var:
+            if rem < 0 or rem % desc.payload_len_var:
                 raise ValueError(
                     f"Payload length {len(dat)} is not multiple of "
                     f"{desc.payload_len_var} for message {desc.name}"
                 )
-            n_var = rem // desc.payload_len_var
-        else:
-            n_var = 0
+            return rem // desc.payload_len_var
+        if len(dat) != desc.payload_len_fix:
+            raise ValueError(
+                f"Payload length {len(dat)} is not {desc.payload_len_fix} "
+                f"for message {desc.name}"
+            )
+        return 0
+
+    def unpack(self, dat: bytes) -> list[str | float]:
+        desc = self.msg_desc
+        n_var = self.n_var(dat)
 
-        fmt = self._conv(desc.fmt_fix) + self._conv(desc.fmt_var) * n_var
+        fmt = self._fmt_fix + self._fmt_var * n_var
         values = list(struct.unpack("<" + fmt, dat))
 
         # CH(=bytes) を文字列へ
@@ -38,45 +249,429 @@ class Ublox:
         return values
 
     def append(self, dat) -> None:
-        unpacked = self.unpack(dat)
-        self.payload.append(unpacked)
+        n_var = self.n_var(dat)
+        if self.filter is not None:
+            self._pending.append(bytes(dat))
+            return
+        self._store(bytes(dat), n_var)
 
-    def save_csv(self, filename: str) -> None:
-        if not filename.endswith(".csv"):
-            raise ValueError("Filename must end with .csv")
-        if len(self.payload) > 0:
+    @property
+    def flush_due(self) -> bool:
+        """保留しているフレームが FILTER_BATCH に達したか"""
+        return len(self._pending) >= FILTER_BATCH
 
-            df = pd.DataFrame(self.payload)
+    def flush(self) -> None:
+        """
+        フィルタの評価を保留しているフレームを評価し, 残ったものを格納する.
+        評価に失敗した場合は保留分をそのまま残して例外を送出する
+        """
+        if not self._pending:
+            return
+        kept = self.filter.apply(self._pending)
+        self._pending = []
+        for dat in kept:
+            self._store(dat, self.n_var(dat))
 
-            df_columns_len = len(df.columns)
-            header = list(self.msg_desc.hdr_fix)
-            scale_full = list(self.msg_desc.scale_fix)
-            if self.msg_desc.payload_len_var != 0:
-                headers_number_var = int(
-                    (df_columns_len - len(self.msg_desc.hdr_fix))
-                    / len(self.msg_desc.hdr_var)
-                )
-                header += list(self.msg_desc.hdr_var) * headers_number_var
-                scale_full += list(self.msg_desc.scale_var) * headers_number_var
+    def _store(self, dat: bytes, n_var: int) -> None:
+        if self.count == 0:
+            self.n_var_min = self.n_var_max = n_var
+        else:
+            self.n_var_min = min(self.n_var_min, n_var)
+            self.n_var_max = max(self.n_var_max, n_var)
+        self.raw.append(dat)
+        if self._clock is not None:
+            fmt, scale = self._clock
+            self.times.append(struct.unpack_from(fmt, dat)[0] * scale)
+        self.count += 1
+        self.payload_bytes += len(dat)
+        size = sys.getsizeof(dat)
+        self.raw_bytes += size
+        if self.budget is not None:
+            self.budget.charge(size)
 
-            if len(scale_full) != df.shape[1]:
-                raise ValueError(
-                    f"Scale length mismatch: {len(scale_full)} != {df.shape[1]}\n{df}"
-                )
+    def to_arrays(self) -> tuple[np.ndarray, np.ndarray | None]:
+        """
+        生ペイロードを numpy 構造化配列へ一括変換する (スケール未適用).
+        可変部は先頭に親行番号 "index" を持つ別配列として返す.
+        """
+        desc = self.msg_desc
+        n_blocks = 0
+        if desc.payload_len_var:
+            n_blocks = (self.payload_bytes - self.count * desc.payload_len_fix) // desc.payload_len_var
+        keep_fix, keep_var = (None, None) if self.fields is None else (self._keep_fix, self._keep_var)
+        return decode_arrays(
+            desc, self.iter_raw(), keep_fix, keep_var, rows=self.count, n_blocks=n_blocks
+        )
 
-            df = df.mul(scale_full, axis=1)
+    def header(self) -> list[str]:
+        return list(self.hdr_fix) + list(self.hdr_var) * self.n_var_max
 
-            header[0] = "# " + header[0]
-            if len(df.columns) == len(header):
-                df.columns = header
-            else:
-                raise ValueError(
-                    f"Header length mismatch: {len(df.columns)} != {len(header)}"
-                )
+    def _frame(self, rows: list[list[str | float]]) -> pd.DataFrame:
+        """展開済みの行からスケールとヘッダを適用した DataFrame を作る"""
+        desc = self.msg_desc
+        df = pd.DataFrame(rows)
+
+        header = self.header()
+        scale_full = list(self.scale_fix) + list(self.scale_var) * self.n_var_max
+        if len(scale_full) != len(header):
+            raise ValueError(
+                f"Scale length mismatch: {len(scale_full)} != {len(header)}\n{df}"
+            )
+        if df.shape[1] < len(header):
+            df = df.reindex(columns=range(len(header)))
+        if self.n_var_min < self.n_var_max:
+            # ファイル全体で欠損しうる列はバッチによらず float にそろえる
+            for col in range(
+                len(self.hdr_fix) + len(self.hdr_var) * self.n_var_min, len(header)
+            ):
+                if df[col].dtype.kind in "iu":
+                    df[col] = df[col].astype(float)
+
+        df = df.mul(scale_full, axis=1)
 
-            df.to_csv(filename, index=False)
+        if len(df.columns) == len(header):
+            df.columns = header
         else:
+            raise ValueError(
+                f"Header length mismatch: {len(df.columns)} != {len(header)}"
+            )
+        if self.expand_bits and (self.bits_fix or self.bits_var):
+            df = self._expand_bits(df)
+        return df
+
+    def _bit_columns(self) -> list[tuple[int, str, tuple[tuple[str, int, int], ...]]]:
+        """ビット展開する列の (列位置, ヘッダ名, ビット範囲) を列位置順に返す"""
+        cols = [(self.hdr_fix.index(f), f, r) for f, r in self.bits_fix]
+        n_fix, n_var = len(self.hdr_fix), len(self.hdr_var)
+        for k in range(self.n_var_max):
+            cols += [
+                (n_fix + n_var * k + self.hdr_var.index(f), f, r)
+                for f, r in self.bits_var
+            ]
+        return sorted(cols)
+
+    def _expand_bits(self, df: pd.DataFrame) -> pd.DataFrame:
+        """X 型フィールドの直後に "<ヘッダ>.<ビット名>" 列を挿入する"""
+        pieces = []
+        prev = 0
+        for col, field, ranges in self._bit_columns():
+            pieces.append(df.iloc[:, prev : col + 1])
+            prev = col + 1
+            values = df.iloc[:, col].to_numpy()
+            pieces.append(
+                pd.DataFrame(
+                    {
+                        f"{field}.{name}": expand_bitfield(values, lsb, width)
+                        for name, lsb, width in ranges
+                    },
+                    index=df.index,
+                )
+            )
+        pieces.append(df.iloc[:, prev:])
+        return pd.concat(pieces, axis=1)
+
+    def iter_dataframes(self, batch_rows: int = 100_000) -> Iterator[pd.DataFrame]:
+        """batch_rows 行ずつ DataFrame を返す. 列構成はファイル全体で共通"""
+        if self.count == 0:
             raise ValueError("No data to save")
+        rows = []
+        for dat in self.iter_raw():
+            rows.append(self.unpack(dat))
+            if len(rows) >= batch_rows:
+                yield self._frame(rows)
+                rows = []
+        if rows:
+            yield self._frame(rows)
+
+    def to_dataframe(self) -> pd.DataFrame:
+        """スケールとヘッダを適用した DataFrame を返す"""
+        if self.count == 0:
+            raise ValueError("No data to save")
+        return self._frame(self.payload)
+
+    def write(
+        self, sink_list: list[sinks.Sink], batch_rows: int = 100_000, threaded: bool = True
+    ) -> list[str]:
+        """
+        batch_rows 行ずつ展開し, 同じバッチを全シンクへ渡す. 書き出したファイル名を返す.
+        threaded=True の場合, 各シンクは別スレッドで書き込む.
+        """
+        if self.count == 0:
+            raise ValueError("No data to save")
+        writers = [sinks.ThreadedSink(s) if threaded else s for s in sink_list]
+        # 生ペイロードだけを使うシンクしかなければ行の展開を省く
+        uses_frame = any(s.uses_frame for s in sink_list)
+        error = None
+        try:
+            raw, rows = [], []
+            for dat in self.iter_raw():
+                raw.append(dat)
+                if uses_frame:
+                    rows.append(self.unpack(dat))
+                if len(raw) >= batch_rows:
+                    df = self._frame(rows) if uses_frame else None
+                    for w in writers:
+                        w.write(raw, df)
+                    raw, rows = [], []
+            if raw:
+                df = self._frame(rows) if uses_frame else None
+                for w in writers:
+                    w.write(raw, df)
+        except BaseException as e:
+            error = e
+        # 途中で失敗しても全シンクを閉じてから最初のエラーを送出する
+        files = []
+        for w in writers:
+            try:
+                files += w.close()
+            except BaseException as e:
+                error = error or e
+        if error is not None:
+            raise error
+        return files
+
+    def save_csv(
+        self, filename: str, batch_rows: int = 100_000, drop: tuple[str, ...] = ()
+    ) -> None:
+        """drop に指定したヘッダ名の列は書き出さない"""
+        if not filename.endswith(".csv"):
+            raise ValueError("Filename must end with .csv")
+        self.write([sinks.CsvSink(self, filename[:-4], drop)], batch_rows, threaded=False)
+
+
+@dataclasses.dataclass(frozen=True)
+class Decimation:
+    """every フレームに 1 つ, かつ前に残したフレームから時刻が min_interval (ms) 以上進んだものを残す"""
+
+    every: int = 1
+    min_interval: int = 0
+
+
+class Decimator:
+    """
+    class/id ごとの間引き規則. FrameScanner がチェックサム検証の前に
+    フレーム (class/id/length/payload) を渡し, False なら検証もせずに捨てる.
+    残すと判定したフレームのチェックサムが合わなかった場合, その周期の出力は欠ける.
+    min_interval に使う時刻はペイロード先頭のフィールドで, clocks に
+    class/id → (struct フォーマット, ms への倍率) を指定する (既定は U4 の iTOW).
+    """
+
+    def __init__(
+        self,
+        rules: dict[int, Decimation],
+        clocks: dict[int, tuple[str, float]] | None = None,
+    ) -> None:
+        self.rules = rules
+        self.clocks = {
+            cid: struct.Struct(fmt) for cid, (fmt, _) in (clocks or {}).items()
+        }
+        self.clock_scale = {cid: scale for cid, (_, scale) in (clocks or {}).items()}
+        # 前に残してからのフレーム数と, 前に残したフレームの時刻 (ms)
+        self.since: dict[int, int] = {}
+        self.last_time: dict[int, float] = {}
+
+    def _time(self, ubx_class_id: int, dat: bytes) -> float | None:
+        clock = self.clocks.get(ubx_class_id)
+        if clock is None:
+            return int.from_bytes(dat[4:8], "little") if len(dat) >= 8 else None
+        if len(dat) < 4 + clock.size:
+            return None
+        return clock.unpack_from(dat, 4)[0] * self.clock_scale[ubx_class_id]
+
+    def state(self) -> dict:
+        """チェックポイントに保存する途中経過 (JSON にできる形)"""
+        return dict(since=dict(self.since), last_time=dict(self.last_time))
+
+    def restore(self, state: dict) -> None:
+        self.since = {int(k): v for k, v in state["since"].items()}
+        self.last_time = {int(k): v for k, v in state["last_time"].items()}
+
+    def __call__(self, dat: bytes) -> bool:
+        ubx_class_id = int.from_bytes(dat[:2], "big")
+        rule = self.rules.get(ubx_class_id)
+        if rule is None:
+            return True
+        since = self.since.get(ubx_class_id, rule.every)
+        if since + 1 < rule.every:
+            self.since[ubx_class_id] = since + 1
+            return False
+        if rule.min_interval:
+            t = self._time(ubx_class_id, dat)
+            last = self.last_time.get(ubx_class_id)
+            # 週の境界で時刻が 0 に戻っても差は正になる
+            if t is not None and last is not None and (t - last) % WEEK_MS < rule.min_interval:
+                self.since[ubx_class_id] = since + 1
+                return False
+            if t is not None:
+                self.last_time[ubx_class_id] = t
+        self.since[ubx_class_id] = 0
+        return True
+
+
+class FrameScanner:
+    """
+    バイナリストリームからチャンク単位で読み込み, UBX フレームを逐次返す.
+    チェックサムが一致したフレームのみ (class/id, payload) として yield する.
+    decimator が False を返したフレームはチェックサムを検証せずに捨てる.
+    """
+
+    def __init__(
+        self,
+        fobj: BinaryIO,
+        chunk_size: int = 1 << 20,
+        log: TextIO | None = None,
+        offset: int = 0,
+        decimator: Decimator | None = None,
+    ) -> None:
+        """offset は fobj の現在位置のファイル先頭からのバイト数 (再開時)"""
+        self.fobj = fobj
+        self.chunk_size = chunk_size
+        self.log = log
+        self.decimator = decimator
+        self.read_count = offset
+        self.ubx_count = 0
+        self.checksum_error_count = 0
+        self.decimated_count = 0
+        # 直前に返したフレームの末尾のファイル上の位置
+        self.offset = offset
+        self._buf_start = offset
+
+    @property
+    def decimator_state(self) -> dict | None:
+        """offset までのフレームを判定し終えた時点の間引きの途中経過"""
+        return self.decimator.state() if self.decimator is not None else None
+
+    def _fill(self, buf: bytearray) -> bool:
+        data = self.fobj.read(self.chunk_size)
+        self.read_count += len(data)
+        buf += data
+        return len(data) > 0
+
+    def iter_frames(self) -> Iterator[tuple[bytes, int]]:
+        """
+        チェックサムを検証せずに (class/id/length/payload, 受信チェックサム) を返す.
+        検証は呼び出し側 (__iter__ やパイプラインのワーカー) で行う.
+        """
+        buf = bytearray()
+        pos = 0
+        while True:
+            start = buf.find(UBX_SYNC, pos)
+            if start < 0:
+                # 末尾の 0xB5 は次のチャンクとの境界で同期ヘッダになりうる
+                self._buf_start += max(len(buf) - 1, 0)
+                del buf[: max(len(buf) - 1, 0)]
+                pos = 0
+                if not self._fill(buf):
+                    return
+                continue
+            if len(buf) - start < 6:
+                self._buf_start += start
+                del buf[:start]
+                pos = 0
+                if not self._fill(buf):
+                    return
+                continue
+            ubx_length = int.from_bytes(buf[start + 4 : start + 6], "little")
+            end = start + 8 + ubx_length
+            if len(buf) < end:
+                self._buf_start += start
+                del buf[:start]
+                pos = 0
+                if not self._fill(buf):
+                    return
+                continue
+            pos = end
+            self.offset = self._buf_start + end
+            yield bytes(buf[start + 2 : end - 2]), int.from_bytes(buf[end - 2 : end], "little")
+
+    def __iter__(self) -> Iterator[tuple[int, bytes]]:
+        for dat, checksum_data in self.iter_frames():
+            self.ubx_count += 1
+            if self.decimator is not None and not self.decimator(dat):
+                self.decimated_count += 1
+                continue
+            ch = checksum(dat)
+            if checksum_data != ch:
+                self.log_checksum_error(dat, checksum_data, ch)
+                continue
+            yield int.from_bytes(dat[:2], "big"), dat[4:]
+
+    def log_checksum_error(self, dat: bytes, checksum_data: int, ch: int) -> None:
+        if self.log is not None:
+            ubx_class_id = int.from_bytes(dat[:2], "big")
+            ubx_length = len(dat) - 4
+            self.log.write(
+                f"Checksum error: ubx count={self.ubx_count:,}, class/id=0x{ubx_class_id:04X}, length={ubx_length:,}, checksum data=0x{checksum_data:04X}, checksum calculated=0x{ch:04X}\n"
+            )
+        # @todo 戻る?
+        self.checksum_error_count += 1
+
+
+def decode_arrays(
+    desc: model.UbxMsgDesc,
+    raw: Iterable[bytes],
+    keep_fix: tuple[bool, ...] | None = None,
+    keep_var: tuple[bool, ...] | None = None,
+    rows: int | None = None,
+    n_blocks: int | None = None,
+    chunk_rows: int = 65536,
+) -> tuple[np.ndarray, np.ndarray | None]:
+    """
+    生ペイロードの列を Ublox.to_arrays と同じ構造化配列へ変換する.
+    keep_fix/keep_var で False のフィールドは読み飛ばす (結果の配列にも含まれない).
+    行数 rows (可変部があればブロックの総数 n_blocks も) を渡すと結果の配列を先に確保して
+    chunk_rows 行ずつ詰めるので, 退避済みのペイロードを一度にメモリへ読み戻さない.
+    """
+    len_fix, len_var = desc.payload_len_fix, desc.payload_len_var
+    if rows is None or (len_var and n_blocks is None):
+        raw = list(raw)
+        rows = len(raw)
+        n_blocks = sum((len(d) - len_fix) // len_var for d in raw) if len_var else 0
+    dtype_fix = model.numpy_dtype(desc.fmt_fix, desc.hdr_fix, keep_fix)
+    fix = np.empty(rows, dtype=_packed(dtype_fix))
+    var = dtype_var = None
+    if len_var:
+        dtype_var = model.numpy_dtype(desc.fmt_var, desc.hdr_var, keep_var)
+        var = np.empty(n_blocks, dtype=[("index", "<u4")] + _packed(dtype_var).descr)
+
+    row = block = 0
+    it = iter(raw)
+    while chunk := list(itertools.islice(it, chunk_rows)):
+        part = np.frombuffer(b"".join(d[:len_fix] for d in chunk), dtype=dtype_fix)
+        _fill(fix[row : row + len(chunk)], part)
+        if var is not None:
+            counts = [(len(d) - len_fix) // len_var for d in chunk]
+            blocks = np.frombuffer(b"".join(d[len_fix:] for d in chunk), dtype=dtype_var)
+            dst = var[block : block + len(blocks)]
+            dst["index"] = np.repeat(np.arange(row, row + len(chunk), dtype="<u4"), counts)
+            _fill(dst, blocks)
+            block += len(blocks)
+        row += len(chunk)
+    return fix, var
+
+
+def _packed(dtype: np.dtype) -> np.dtype:
+    """オフセット指定の dtype からすき間を除いた dtype"""
+    return np.dtype([(name, dtype.fields[name][0]) for name in dtype.names])
+
+
+def _fill(dst: np.ndarray, src: np.ndarray) -> None:
+    for name in src.dtype.names:
+        dst[name] = src[name]
+
+
+def expand_bitfield(values: np.ndarray, lsb: int, width: int) -> pd.api.extensions.ExtensionArray:
+    """
+    整数列からビット範囲をシフト/マスクで一括抽出する.
+    1 ビットは boolean, それ以外は幅に応じた符号なし整数. NaN (可変部の欠損) は NA になる.
+    """
+    missing = pd.isna(values)
+    raw = np.where(missing, 0, values).astype(np.uint32)
+    out = (raw >> lsb) & ((1 << width) - 1)
+    if width == 1:
+        return pd.arrays.BooleanArray(out.astype(bool), missing)
+    dtype = np.uint8 if width <= 8 else np.uint16 if width <= 16 else np.uint32
+    return pd.arrays.IntegerArray(out.astype(dtype), missing)
 
 
 # Fletcher's checksum
@@ -25,6 +25,10 @@ GEN7_PATCH: Mapping[int, dict] = {
     ),
     mid(MsgClass.NAV, NavID.PVT): dict(
         name="nav_pvt",
+        bits_fix=(
+            ("valid", (("validDate", 0, 1), ("validTime", 1, 1), ("fullyResolved", 2, 1))),
+            ("flags", (("gnssFixOK", 0, 1), ("diffSoln", 1, 1), ("psmState", 2, 3))),
+        ),
         payload_len_fix=84,
         fmt_fix="U4U2U1U1U1U1U1X1U4I4U1X1U1U1I4I4I4I4U4U4I4I4I4I4I4U4U4U2X2U4",
         scale_fix=(
@@ -54,6 +54,23 @@ GEN8_PATCH: Mapping[int, dict] = {
     ),
     mid(MsgClass.NAV, NavID.PVT): dict(
         name="nav_pvt",
+        bits_fix=(
+            ("valid", (("validDate", 0, 1), ("validTime", 1, 1), ("fullyResolved", 2, 1))),
+            (
+                "flags",
+                (
+                    ("gnssFixOK", 0, 1),
+                    ("diffSoln", 1, 1),
+                    ("psmState", 2, 3),
+                    ("headVehValid", 5, 1),
+                    ("carrSoln", 6, 2),
+                ),
+            ),
+            (
+                "flags2",
+                (("confirmedAvai", 5, 1), ("confirmedDate", 6, 1), ("confirmedTime", 7, 1)),
+            ),
+        ),
         payload_len_fix=92,
         fmt_fix="U4U2U1U1U1U1U1X1U4I4U1X1X1U1I4I4I4I4U4U4I4I4I4I4I4U4U4U2X2"
         + "U1" * 4
@@ -473,6 +490,13 @@ GEN8_PATCH: Mapping[int, dict] = {
         # @todo svid + gnssid
         # @todo nの扱い
         name="rxm_rawx",
+        bits_fix=(("recStat", (("leapSec", 0, 1), ("clkReset", 1, 1))),),
+        bits_var=(
+            (
+                "trkStat",
+                (("prValid", 0, 1), ("cpValid", 1, 1), ("halfCyc", 2, 1), ("subHalfCyc", 3, 1)),
+            ),
+        ),
         payload_len_fix=16,
         fmt_fix="R8U2I1U1X1" + "U1" * 3,
         payload_len_var=32,
@@ -713,6 +737,14 @@ GEN8_PATCH: Mapping[int, dict] = {
     ),
     mid(MsgClass.ESF, EsfID.STATUS): dict(
         name="esf_status",
+        bits_var=(
+            ("sensStatus1", (("type", 0, 6), ("used", 6, 1), ("ready", 7, 1))),
+            ("sensStatus2", (("calibStatus", 0, 2), ("timeStatus", 2, 2))),
+            (
+                "faults",
+                (("badMeas", 0, 1), ("badTTag", 1, 1), ("missingMeas", 2, 1), ("noisyMeas", 3, 1)),
+            ),
+        ),
         payload_len_fix=16,
         fmt_fix="U4U1" + "U1" * 7 + "U1" + "U1" * 2 + "U1",
         payload_len_var=4,
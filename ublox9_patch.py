@@ -15,6 +15,27 @@ GEN9_PATCH: Mapping[int, dict] = {
     ),
     mid(MsgClass.NAV, NavID.PVT): dict(
         name="nav_pvt",
+        bits_fix=(
+            (
+                "valid",
+                (("validDate", 0, 1), ("validTime", 1, 1), ("fullyResolved", 2, 1), ("validMag", 3, 1)),
+            ),
+            (
+                "flags",
+                (
+                    ("gnssFixOK", 0, 1),
+                    ("diffSoln", 1, 1),
+                    ("psmState", 2, 3),
+                    ("headVehValid", 5, 1),
+                    ("carrSoln", 6, 2),
+                ),
+            ),
+            (
+                "flags2",
+                (("confirmedAvai", 5, 1), ("confirmedDate", 6, 1), ("confirmedTime", 7, 1)),
+            ),
+            ("flags3", (("invalidLlh", 0, 1), ("lastCorrectionAge", 1, 4))),
+        ),
         payload_len_fix=92,
         fmt_fix="U4U2U1U1U1U1U1X1U4I4U1X1X1U1I4I4I4I4U4U4I4I4I4I4I4U4U4U2X1"
         + "U1" * 5
@@ -463,6 +484,13 @@ GEN9_PATCH: Mapping[int, dict] = {
         # @todo svid + gnssid
         # @todo nの扱い
         name="rxm_rawx",
+        bits_fix=(("recStat", (("leapSec", 0, 1), ("clkReset", 1, 1))),),
+        bits_var=(
+            (
+                "trkStat",
+                (("prValid", 0, 1), ("cpValid", 1, 1), ("halfCyc", 2, 1), ("subHalfCyc", 3, 1)),
+            ),
+        ),
         payload_len_fix=16,
         fmt_fix="R8U2I1U1X1" + "U1" * 3,
         payload_len_var=32,
@@ -617,6 +645,7 @@ GEN9_PATCH: Mapping[int, dict] = {
         hdr_var=("spectrum",) * 256
         + ("span", "res", "center", "pga")
         + ("reserved",) * 3,
+        array_var=("spectrum",),
     ),
     mid(MsgClass.MON, MonID.COMMS): dict(
         name="mon_comms",
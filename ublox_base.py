@@ -2,6 +2,10 @@ import dataclasses
 from class_id import mid, MsgClass, NavID, RxmID, MonID, TimID, AidID
 
 
+# X1/X2/X4 フィールドのビット割り当て: ((ヘッダ名, ((ビット名, LSB 位置, ビット幅), ...)), ...)
+BitFields = tuple[tuple[str, tuple[tuple[str, int, int], ...]], ...]
+
+
 @dataclasses.dataclass(frozen=True, slots=True)
 class UbxMsgDesc:
     name: str
@@ -13,6 +17,11 @@ class UbxMsgDesc:
     hdr_fix: tuple[str, ...] = ()
     scale_var: tuple[float, ...] = ()
     hdr_var: tuple[str, ...] = ()
+    bits_fix: BitFields = ()
+    bits_var: BitFields = ()
+    # 同名ヘッダが連続するフィールドを配列 (.npy) として書き出す場合のヘッダ名
+    array_fix: tuple[str, ...] = ()
+    array_var: tuple[str, ...] = ()
 
 
 GEN6: dict[int, UbxMsgDesc] = {
@@ -44,6 +53,14 @@ GEN6: dict[int, UbxMsgDesc] = {
         fmt_fix="U4U1X1X1X1U4U4",
         scale_fix=(1, 1, 1, 1, 1, 1, 1),
         hdr_fix=("iTOW (ms)", "gpsFix", "flags", "fixStat", "flags2", "ttff", "msss"),
+        bits_fix=(
+            (
+                "flags",
+                (("gpsFixOk", 0, 1), ("diffSoln", 1, 1), ("wknSet", 2, 1), ("towSet", 3, 1)),
+            ),
+            ("fixStat", (("diffCorr", 0, 1), ("mapMatching", 6, 2))),
+            ("flags2", (("psmState", 0, 2),)),
+        ),
     ),
     mid(MsgClass.NAV, NavID.DOP): UbxMsgDesc(
         name="nav_dop",
@@ -5,8 +5,12 @@ import os
 import threading
 import tkinter as tk
 import tkinter.filedialog
-import ublox
+import block_index
+import checkpoint
 import model
+import pipeline
+import timing_qc
+import ubx_reader
 
 class Application(tk.Frame):
     """class for GUI."""
@@ -19,7 +23,7 @@ class Application(tk.Frame):
 
         _pad = [5, 5]
 
-        UBLOX_GENERATIONS = [6, 7, 8, 9]
+        UBLOX_GENERATIONS = ["auto", 6, 7, 8, 9, "mixed"]
         UBLOX_GENERATIONS_LEN = len(UBLOX_GENERATIONS)
 
         # label
@@ -34,11 +38,14 @@ class Application(tk.Frame):
         )
 
         # radio button
-        self.var = tk.IntVar()
-        self.var.set(9)
+        self.var = tk.StringVar()
+        self.var.set("auto")
         self.rbs = [
             tk.Radiobutton(
-                self, value=6 + i, variable=self.var, text=UBLOX_GENERATIONS[i]
+                self,
+                value=str(UBLOX_GENERATIONS[i]),
+                variable=self.var,
+                text=UBLOX_GENERATIONS[i],
             )
             for i in range(UBLOX_GENERATIONS_LEN)
         ]
@@ -99,6 +106,119 @@ class Application(tk.Frame):
             sticky=tk.W,
         )
 
+        # label + entry
+        self.lbmb = tk.Label(self, text="Memory budget (MB, 0 = unlimited): ")
+        self.lbmb.grid(
+            row=UBLOX_GENERATIONS_LEN + 5,
+            column=0,
+            columnspan=int(UBLOX_GENERATIONS_LEN / 2),
+            padx=_pad[0],
+            pady=_pad[1],
+            sticky=tk.W,
+        )
+        self.memory_budget = tk.IntVar()
+        self.memory_budget.set(0)
+        self.enmb = tk.Entry(self, textvariable=self.memory_budget, width=8)
+        self.enmb.grid(
+            row=UBLOX_GENERATIONS_LEN + 5,
+            column=int(UBLOX_GENERATIONS_LEN / 2),
+            columnspan=int(UBLOX_GENERATIONS_LEN / 2),
+            padx=_pad[0],
+            pady=_pad[1],
+            sticky=tk.W,
+        )
+
+        # check button
+        self.expand_bits = tk.BooleanVar()
+        self.expand_bits.set(False)
+        self.cbbits = tk.Checkbutton(
+            self, text="Expand bit fields", variable=self.expand_bits
+        )
+        self.cbbits.grid(
+            row=UBLOX_GENERATIONS_LEN + 6,
+            column=0,
+            columnspan=UBLOX_GENERATIONS_LEN,
+            padx=_pad[0],
+            pady=_pad[1],
+            sticky=tk.W,
+        )
+
+        # check button
+        self.array_npy = tk.BooleanVar()
+        self.array_npy.set(False)
+        self.cbnpy = tk.Checkbutton(
+            self, text="Write array fields as .npy", variable=self.array_npy
+        )
+        self.cbnpy.grid(
+            row=UBLOX_GENERATIONS_LEN + 7,
+            column=0,
+            columnspan=UBLOX_GENERATIONS_LEN,
+            padx=_pad[0],
+            pady=_pad[1],
+            sticky=tk.W,
+        )
+
+        # check button
+        self.parquet = tk.BooleanVar()
+        self.parquet.set(False)
+        self.cbpq = tk.Checkbutton(
+            self, text="Also write Parquet (requires pyarrow)", variable=self.parquet
+        )
+        self.cbpq.grid(
+            row=UBLOX_GENERATIONS_LEN + 8,
+            column=0,
+            columnspan=UBLOX_GENERATIONS_LEN,
+            padx=_pad[0],
+            pady=_pad[1],
+            sticky=tk.W,
+        )
+
+        # check button
+        self.sqlite = tk.BooleanVar()
+        self.sqlite.set(False)
+        self.cbsql = tk.Checkbutton(
+            self, text="Also write SQLite database (ubx.sqlite)", variable=self.sqlite
+        )
+        self.cbsql.grid(
+            row=UBLOX_GENERATIONS_LEN + 9,
+            column=0,
+            columnspan=UBLOX_GENERATIONS_LEN,
+            padx=_pad[0],
+            pady=_pad[1],
+            sticky=tk.W,
+        )
+
+        # check button
+        self.columns = tk.BooleanVar()
+        self.columns.set(False)
+        self.cbcol = tk.Checkbutton(
+            self, text="Also write columnar .npy directories", variable=self.columns
+        )
+        self.cbcol.grid(
+            row=UBLOX_GENERATIONS_LEN + 10,
+            column=0,
+            columnspan=UBLOX_GENERATIONS_LEN,
+            padx=_pad[0],
+            pady=_pad[1],
+            sticky=tk.W,
+        )
+
+        # 中断した変換をチェックポイントから再開
+        self.use_checkpoint = tk.BooleanVar(value=False)
+        self.cbck = tk.Checkbutton(
+            self,
+            text="Checkpoint (resume interrupted conversions)",
+            variable=self.use_checkpoint,
+        )
+        self.cbck.grid(
+            row=UBLOX_GENERATIONS_LEN + 11,
+            column=0,
+            columnspan=UBLOX_GENERATIONS_LEN,
+            padx=_pad[0],
+            pady=_pad[1],
+            sticky=tk.W,
+        )
+
     def fileopen(self):
         """Open button."""
         fTyp = [("ubx file", "*.ubx")]
@@ -114,132 +234,87 @@ class Application(tk.Frame):
 
     def convert(self, filename):
         """Convert function called from fileopen."""
-        # 世代選択
-        ublox_generation = self.var.get()
+        # 世代選択 (auto の場合はファイル先頭から推定)
+        if self.var.get() == "auto":
+            self.status_str.set("Detecting generation.")
+        ublox_generation = ubx_reader.resolve_generation(self.var.get(), filename)
         # UBXメッセージ一覧を取得
-        ubx_messages = getattr(model, "ubx_messages_" + str(ublox_generation))
-
-        # UBXインスタンスを格納する辞書
-        ubx_instances = {}
+        ubx_messages = ubx_reader.get_messages(ublox_generation)
+        ckpt = None
+        log_mode = "w"
+        if self.use_checkpoint.get():
+            ckpt = checkpoint.Checkpoint(
+                os.path.splitext(filename)[0] + ".ubx2CSV.ckpt",
+                filename,
+                ublox_generation,
+            )
+            # 再開する場合はログをチェックポイント時点から書き継ぐ
+            options = ubx_reader.decode_options(ubx_messages, self.expand_bits.get())
+            if ckpt.load(options) is not None and os.path.exists("ubx2CSV.log"):
+                log_mode = "r+"
+        with open("ubx2CSV.log", log_mode) as fobjlog:
+            if self.var.get() == "auto" and log_mode == "w":
+                fobjlog.write(f"Detected u-blox generation: {ublox_generation}\n")
 
-        # 各UBXメッセージに対してインスタンス生成
-        for msg_key, msg_def in ubx_messages.items():
+            self.filename_str.set("File name: " + filename)
+            filesize = os.path.getsize(filename)
+            self.filesize_str.set("File size: {0:,} byte".format(filesize))
+            self.status_str.set("Reading file.")
+            blocks = block_index.BlockIndex()
+            ubx_instances, stats = ubx_reader.decode_file(
+                filename,
+                ubx_messages,
+                log=fobjlog,
+                progress=lambda pb: self.status_str.set(
+                    "Reading file. {}% done.".format(pb)
+                ),
+                memory_budget=self.memory_budget.get() * 1024 * 1024,
+                expand_bits=self.expand_bits.get(),
+                index=model.length_index() if ublox_generation == "mixed" else None,
+                workers=pipeline.auto_workers(filesize),
+                ckpt=ckpt,
+                blocks=blocks,
+            )
+            # 検索用のブロック索引をログの隣に置く (書き込めなければ記録して変換を続ける)
             try:
-                ubx_instances[msg_key] = ublox.Ublox(msg_def)
-            except:
-                print("Error in ublox class generation")
-
-        with open(filename, "rb") as fobj:
-            with open("ubx2CSV.log", "w") as fobjlog:
-                self.filename_str.set("File name: " + filename)
-                filesize = os.path.getsize(filename)
-                self.filesize_str.set("File size: {0:,} byte".format(filesize))
-                self.status_str.set("File opened.")
-                name, _ = os.path.splitext(filename)
-
-                message_count = 0
-                ubx_count = 0
-                read_count = 0
-                convert_count = 0
-                checksum_error_count = 0
-                pb_previous = 0
-
-                self.status_str.set("Reading file.")
-                while True:
-                    if message_count == 0:  # ヘッダのチェック 1
-                        h_data = fobj.read(1)  # 1バイトずつ
-                        read_count += len(h_data)
-                        if len(h_data) < 1:
-                            break
-                        if h_data == ublox.UBX_SYNC[0].to_bytes(1, "big"):
-                            message_count += 1
-                    elif message_count == 1:  # ヘッダのチェック 2
-                        h_data = fobj.read(1)  # 1バイトずつ
-                        read_count += len(h_data)
-                        if len(h_data) < 1:
-                            break
-                        if h_data == ublox.UBX_SYNC[1].to_bytes(1, "big"):
-                            ubx_count += 1
-                            message_count += 1
-                        else:
-                            message_count = 0
-                    elif message_count == 2:  # ヘッダが見つかった場合
-                        # class, id, lengthの読み込み
-                        h_data = fobj.read(4)
-                        read_count += len(h_data)
-                        if len(h_data) < 4:
-                            break
-                        dat = bytearray(h_data)
-                        ubx_class_id = int.from_bytes(h_data[:2], "big")
-                        ubx_length = int.from_bytes(h_data[2:], "little")
-                        # length分だけメッセージの読み込み
-                        h_data = fobj.read(ubx_length)
-                        read_count += len(h_data)
-                        if len(h_data) < ubx_length:
-                            break
-                        dat = dat + bytearray(h_data)
-                        ch = ublox.checksum(dat)
-                        # checksumの読み込み
-                        h_data = fobj.read(2)
-                        read_count += len(h_data)
-                        if len(h_data) < 2:
-                            break
-                        pb_current = int(read_count / filesize * 100)
-                        if pb_previous < pb_current:
-                            self.status_str.set(
-                                "Reading file. {}% done.".format(pb_current)
-                            )
-                            pb_previous = pb_current
-                        checksum_data = int.from_bytes(h_data, "little")
-                        if checksum_data != ch:
-                            fobjlog.write(
-                                f"Checksum error: ubx count={ubx_count:,}, class/id=0x{ubx_class_id:04X}, length={ubx_length:,}, checksum data=0x{checksum_data:04X}, checksum calculated=0x{ch:04X}\n"
-                            )
-                            # @todo 戻る?
-                            checksum_error_count += 1
-                        else:
-                            if (
-                                ubx_class_id in ubx_messages
-                            ):  # class, idが見つかった場合
-                                if len(dat[4:]) == 0:
-                                    fobjlog.write(
-                                        f"No data contained: ubx count={ubx_count:,}, class/id=0x{ubx_class_id:04X}, length={ubx_length:,}\n"
-                                    )
-                                else:
-                                    try:
-                                        ubx_instances[ubx_class_id].append(dat[4:])
-                                        convert_count += 1
-                                    except Exception as e:
-                                        print(e)
-                                        print(f"Error in appending ublox message.")
-                            else:  # class, idが見つからなかった場合
-                                fobjlog.write(
-                                    f"Message class/id not found: ubx count={ubx_count:,}, class/id=0x{ubx_class_id:04X}, length={ubx_length:,}\n"
-                                )
-                        message_count = 0
-
-                self.status_str.set("Writing csv files.")
-                print("Saved UBX Messages")
-                for ubx_class_id in ubx_messages:
-                    try:
-                        ubx_instances[ubx_class_id].save_csv(
-                            f"{ubx_messages[ubx_class_id].name}.csv"
-                        )
-                        print(f"0x{ubx_class_id:04X} {ubx_messages[ubx_class_id].name}: Done")
-                    except Exception as e:
-                        print(f"0x{ubx_class_id:04X} {ubx_messages[ubx_class_id].name}: {e}")
-
-                self.status_str.set("Writing log file.")
-                fobjlog.write("\nSummary of the conversion\n")
-                fobjlog.write(f"Source: {filename}\n")
-                fobjlog.write(f"Filesize:  {filesize:,} bytes\n")
-                fobjlog.write(f"Read data: {read_count:,} bytes\n")
-                fobjlog.write(f"ubx messages found:     {ubx_count:,}\n")
-                fobjlog.write(f"ubx messages converted: {convert_count:,}\n")
-                fobjlog.write(f"checksum error count: {checksum_error_count:,}\n")
-
-                self.status_str.set("Done.")
-                self.bt.configure(state=tk.NORMAL)
+                blocks.save(block_index.sidecar_path(filename), filename)
+            except OSError as e:
+                fobjlog.write(f"Block index not saved: {e}\n")
+
+            self.status_str.set("Writing csv files.")
+            formats = ["csv"]
+            if self.array_npy.get():
+                formats.append("npy")
+            if self.parquet.get():
+                formats.append("parquet")
+            if self.sqlite.get():
+                formats.append("sqlite")
+            if self.columns.get():
+                formats.append("columns")
+
+            def write_progress(ubx_class_id, name, done, total):
+                self.status_str.set(f"Writing csv files. {done}/{total} ({name})")
+                print(f"0x{ubx_class_id & 0xFFFF:04X} {name}: {done}/{total}")
+
+            print("Saved UBX Messages")
+            _, errors = ubx_reader.write_all(
+                ubx_instances, formats, progress=write_progress
+            )
+            for ubx_class_id, error in errors.items():
+                fobjlog.write(
+                    f"Write error: class/id=0x{ubx_class_id & 0xFFFF:04X}, {ubx_messages[ubx_class_id].name}: {error}\n"
+                )
+            if errors:
+                print(f"{len(errors)} messages could not be written. See ubx2CSV.log.")
+            elif ckpt is not None:
+                ckpt.remove()
+
+            self.status_str.set("Writing log file.")
+            ubx_reader.write_summary(fobjlog, filename, stats)
+            timing_qc.write_timing_qc(fobjlog, timing_qc.timing_reports(ubx_instances))
+
+            self.status_str.set("Done.")
+            self.bt.configure(state=tk.NORMAL)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""Tiny client for ubx_server. Imports only the standard library so it starts fast."""
+
+import argparse
+import json
+import os
+import socket
+import sys
+import tempfile
+from typing import Callable, Iterator
+
+DEFAULT_SOCKET = os.path.join(
+    tempfile.gettempdir(), f"ubx2CSV-{os.getuid() if hasattr(os, 'getuid') else 0}.sock"
+)
+
+
+def request(
+    path: str,
+    out_dir: str | None = None,
+    socket_path: str = DEFAULT_SOCKET,
+    **options,
+) -> Iterator[dict]:
+    """
+    変換ジョブを 1 件送り, サーバから届くイベント (JSON) を順に返す.
+    最後のイベントは {"event": "done", ...} か {"event": "error", "message": ...}.
+    """
+    job = dict(
+        path=os.path.abspath(path),
+        out_dir=os.path.abspath(out_dir or os.getcwd()),
+        options=options,
+    )
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(socket_path)
+        sock.sendall(json.dumps(job).encode() + b"\n")
+        with sock.makefile("r") as f:
+            for line in f:
+                yield json.loads(line)
+
+
+def convert(
+    path: str,
+    out_dir: str | None = None,
+    socket_path: str = DEFAULT_SOCKET,
+    on_event: Callable[[dict], None] | None = None,
+    **options,
+) -> dict:
+    """request を最後まで読み, 最後のイベントを返す. 途中のイベントは on_event に渡す"""
+    last = dict(event="error", message="connection closed")
+    for event in request(path, out_dir, socket_path, **options):
+        last = event
+        if on_event is not None and event["event"] not in ("done", "error"):
+            on_event(event)
+    return last
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("files", nargs="+")
+    parser.add_argument(
+        "--out-dir", default=None, help="each file goes to <out-dir>/<file stem>/ (default: current directory)"
+    )
+    parser.add_argument("--socket", default=DEFAULT_SOCKET)
+    parser.add_argument("--gen", default="auto")
+    parser.add_argument("--formats", default="csv", help="comma separated: csv,npy,parquet,sqlite,columns")
+    parser.add_argument("--expand-bits", action="store_true")
+    parser.add_argument("--quiet", action="store_true")
+    args = parser.parse_args(argv)
+
+    def show(event: dict) -> None:
+        if args.quiet:
+            return
+        if event["event"] == "read":
+            print(f"\rReading file. {event['percent']}% done.", end="", file=sys.stderr)
+        elif event["event"] == "write":
+            print(f"\r{event['name']}: {event['done']}/{event['total']}", end="", file=sys.stderr)
+
+    # 出力ファイル名はメッセージ名で決まるので, watcher.py と同じく入力ごとのディレクトリへ書く
+    stems = [os.path.splitext(os.path.basename(path))[0] for path in args.files]
+    duplicates = sorted({stem for stem in stems if stems.count(stem) > 1})
+    if duplicates:
+        parser.error(f"input files must have distinct names: {', '.join(duplicates)}")
+
+    status = 0
+    for path, stem in zip(args.files, stems):
+        result = convert(
+            path,
+            os.path.join(args.out_dir or os.getcwd(), stem),
+            args.socket,
+            on_event=show,
+            gen=int(args.gen) if args.gen.isdigit() else args.gen,
+            formats=args.formats.split(","),
+            expand_bits=args.expand_bits,
+        )
+        if not args.quiet:
+            print(file=sys.stderr)
+        if result["event"] == "error":
+            print(f"{path}: {result['message']}", file=sys.stderr)
+            status = 1
+        else:
+            print(f"{path}: {result['files']} files, {result['seconds'] * 1000:.0f} ms")
+            if result["errors"]:
+                status = 1
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
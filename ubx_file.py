@@ -0,0 +1,282 @@
+# -*- coding: utf-8 -*-
+"""Random-access reader for UBX logs backed by mmap and a frame index."""
+
+import dataclasses
+import mmap
+import os
+import struct
+from typing import Iterator
+import numpy as np
+import model
+import pipeline
+import ublox
+import ubx_reader
+
+INDEX_VERSION = 1
+
+
+@dataclasses.dataclass
+class FrameIndex:
+    """
+    チェックサムの合うフレームの位置の表 (受信順).
+    offset はフレーム先頭 (同期ヘッダ) のファイル上の位置, length はペイロード長,
+    time は時刻フィールド (iTOW/rcvTow, ms) を持つメッセージの時刻で, 持たなければ NaN.
+    """
+
+    offset: np.ndarray
+    class_id: np.ndarray
+    length: np.ndarray
+    time: np.ndarray
+
+    @classmethod
+    def build(cls, fobj, clock_of, workers: int = 0) -> "FrameIndex":
+        """
+        clock_of(class/id, ペイロード長) は時刻フィールドの (struct フォーマット, 倍率) か None.
+        workers > 0 の場合はチェックサム検証を pipeline.PipelineScanner で並列化する.
+        """
+        offsets, class_ids, lengths, times = [], [], [], []
+        if workers > 0:
+            scanner = pipeline.PipelineScanner(fobj, workers)
+        else:
+            scanner = ublox.FrameScanner(fobj)
+        for ubx_class_id, dat in scanner:
+            offsets.append(scanner.offset - len(dat) - 8)
+            class_ids.append(ubx_class_id)
+            lengths.append(len(dat))
+            clock = clock_of(ubx_class_id, len(dat))
+            if clock is None:
+                times.append(np.nan)
+            else:
+                times.append(struct.unpack_from(clock[0], dat)[0] * clock[1])
+        return cls(
+            np.array(offsets, dtype=np.uint64),
+            np.array(class_ids, dtype=np.uint16),
+            np.array(lengths, dtype=np.uint32),
+            np.array(times, dtype=np.float64),
+        )
+
+
+@dataclasses.dataclass
+class Frame:
+    index: int
+    offset: int
+    class_id: int
+    time: float
+    payload: bytes
+    desc: model.UbxMsgDesc | None
+
+    @property
+    def name(self) -> str:
+        return self.desc.name if self.desc is not None else f"0x{self.class_id:04X}"
+
+    def values(self) -> list[str | float]:
+        """Ublox.unpack と同じ値 (スケール未適用)"""
+        if self.desc is None:
+            raise ValueError(f"No message definition for class/id=0x{self.class_id:04X}")
+        return ublox.Ublox(self.desc).unpack(self.payload)
+
+    def fields(self) -> list[tuple[str, str | float]]:
+        """(ヘッダ, スケール適用済みの値) の列. 可変部はブロックの数だけ繰り返す"""
+        desc = self.desc
+        values = self.values()
+        n_var = (len(values) - len(desc.hdr_fix)) // max(len(desc.hdr_var), 1)
+        header = list(desc.hdr_fix) + list(desc.hdr_var) * n_var
+        scale = list(desc.scale_fix) + list(desc.scale_var) * n_var
+        return [
+            (h, v * s if not isinstance(v, str) else v)
+            for h, v, s in zip(header, values, scale)
+        ]
+
+
+class UbxFile:
+    """
+    ログを mmap で開き, フレーム番号・class/id・時刻で O(log n) + ペイロード長で引く.
+    フレームの索引は初回アクセス時に 1 回だけ走査して作り, index_file (既定は
+    "<filename>.frames.npz", False で保存しない) に保存して次回から再利用する.
+    ペイロードのデコードは Frame.values / Frame.fields を呼んだ時にだけ行う.
+    time による検索は週内時刻なので, 週をまたぐログでは両方の週の該当時刻が返る.
+
+        with UbxFile("log.ubx") as f:
+            f[1000].fields()
+            for frame in f.between(345600000, 345601000):
+                print(frame.name, frame.time)
+    """
+
+    def __init__(
+        self, filename: str, gen: int | str = "auto", index_file: str | bool | None = None
+    ) -> None:
+        self.filename = filename
+        self.gen = ubx_reader.resolve_generation(gen, filename)
+        self.ubx_messages = ubx_reader.get_messages(self.gen)
+        self._length_index = model.length_index() if self.gen == "mixed" else None
+        if index_file is None or index_file is True:
+            index_file = filename + ".frames.npz"
+        self.index_file = index_file or None
+        self._fobj = open(filename, "rb")
+        size = os.fstat(self._fobj.fileno()).st_size
+        self._mm = mmap.mmap(self._fobj.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        self._index: FrameIndex | None = None
+        self._time_order: np.ndarray | None = None
+        self._class_order: np.ndarray | None = None
+
+    def __enter__(self) -> "UbxFile":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        if isinstance(self._mm, mmap.mmap):
+            self._mm.close()
+        self._fobj.close()
+
+    def desc_of(self, ubx_class_id: int, length: int) -> model.UbxMsgDesc | None:
+        if self._length_index is not None:
+            key = self._length_index.lookup(ubx_class_id, length)
+            return None if key is None else self.ubx_messages[key]
+        desc = self.ubx_messages.get(ubx_class_id)
+        if desc is None or not model.payload_fits(desc, length):
+            return None
+        return desc
+
+    def _clock_of(self, ubx_class_id: int, length: int) -> tuple[str, float] | None:
+        desc = self.desc_of(ubx_class_id, length)
+        if desc is None:
+            return None
+        return model.clock_field(desc)
+
+    def _source(self) -> dict:
+        st = os.stat(self.filename)
+        return dict(
+            version=INDEX_VERSION,
+            filesize=st.st_size,
+            mtime_ns=st.st_mtime_ns,
+            generation=str(self.gen),
+        )
+
+    def _load_index(self) -> FrameIndex | None:
+        try:
+            with np.load(self.index_file) as z:
+                meta = dict(zip(z["meta_keys"].tolist(), z["meta_values"].tolist()))
+                if meta != {k: str(v) for k, v in self._source().items()}:
+                    return None
+                return FrameIndex(*(z[f.name] for f in dataclasses.fields(FrameIndex)))
+        except (OSError, KeyError, ValueError):
+            return None
+
+    def _save_index(self, index: FrameIndex) -> None:
+        meta = {k: str(v) for k, v in self._source().items()}
+        tmp = self.index_file + ".tmp.npz"
+        np.savez(
+            tmp,
+            meta_keys=np.array(list(meta)),
+            meta_values=np.array(list(meta.values())),
+            **dataclasses.asdict(index),
+        )
+        os.replace(tmp, self.index_file)
+
+    @property
+    def index(self) -> FrameIndex:
+        if self._index is None:
+            index = self._load_index() if self.index_file else None
+            if index is None:
+                with open(self.filename, "rb") as f:
+                    workers = pipeline.auto_workers(os.fstat(f.fileno()).st_size)
+                    index = FrameIndex.build(f, self._clock_of, workers)
+                if self.index_file:
+                    try:
+                        self._save_index(index)
+                    except OSError:
+                        pass
+            self._index = index
+        return self._index
+
+    def __len__(self) -> int:
+        return len(self.index.offset)
+
+    def _frame(self, i: int) -> Frame:
+        index = self.index
+        offset = int(index.offset[i])
+        length = int(index.length[i])
+        ubx_class_id = int(index.class_id[i])
+        return Frame(
+            index=i,
+            offset=offset,
+            class_id=ubx_class_id,
+            time=float(index.time[i]),
+            payload=bytes(self._mm[offset + 6 : offset + 6 + length]),
+            desc=self.desc_of(ubx_class_id, length),
+        )
+
+    def __getitem__(self, i: int | slice) -> Frame | list[Frame]:
+        if isinstance(i, slice):
+            return [self._frame(k) for k in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return self._frame(i)
+
+    def __iter__(self) -> Iterator[Frame]:
+        for i in range(len(self)):
+            yield self._frame(i)
+
+    def _class_ids(self, class_id: int | str) -> list[int]:
+        if isinstance(class_id, int):
+            return [class_id & 0xFFFF]
+        found = ubx_reader.select_messages(self.ubx_messages, [class_id])
+        return sorted({key & 0xFFFF for key in found})
+
+    def _indices_of(self, class_id: int | str) -> np.ndarray:
+        """class/id (またはメッセージ名) のフレーム番号 (受信順)"""
+        if self._class_order is None:
+            self._class_order = np.argsort(self.index.class_id, kind="stable")
+        ids = self.index.class_id[self._class_order]
+        parts = [
+            self._class_order[np.searchsorted(ids, c) : np.searchsorted(ids, c, side="right")]
+            for c in self._class_ids(class_id)
+        ]
+        return np.sort(np.concatenate(parts)) if len(parts) > 1 else parts[0]
+
+    def frames(self, class_id: int | str | None = None) -> Iterator[Frame]:
+        """class/id (0x0107) またはメッセージ名 (nav_pvt) のフレームを受信順に返す"""
+        if class_id is None:
+            yield from self
+            return
+        for i in self._indices_of(class_id):
+            yield self._frame(int(i))
+
+    def between(
+        self, t0: float, t1: float, class_id: int | str | None = None
+    ) -> list[Frame]:
+        """
+        時刻 (ms) が t0 以上 t1 以下のフレームを受信順に返す.
+        class_id を省略した場合は, 該当する最初と最後のフレームの間にある
+        時刻を持たないフレーム (MON など) も, 直前の時刻を持つフレームが該当すれば含める.
+        時刻が受信順に単調でない (週の境界, 受信機のリセット) ログでも, 範囲外の時刻の
+        フレームは返さない.
+        """
+        index = self.index
+        if self._time_order is None:
+            order = np.argsort(index.time, kind="stable")
+            # NaN は末尾に並ぶので除く
+            self._time_order = order[: np.count_nonzero(~np.isnan(index.time))]
+        times = index.time[self._time_order]
+        hit = np.sort(
+            self._time_order[
+                np.searchsorted(times, t0) : np.searchsorted(times, t1, side="right")
+            ]
+        )
+        if not len(hit):
+            return []
+        if class_id is not None:
+            ids = self._class_ids(class_id)
+            return [self._frame(int(i)) for i in hit if index.class_id[i] in ids]
+        # 範囲内の時刻を持つフレームと, それに続く時刻を持たないフレームを残す
+        span = np.arange(hit[0], hit[-1] + 1)
+        t = index.time[span]
+        timed = ~np.isnan(t)
+        inside = timed & (t >= t0) & (t <= t1)
+        last_timed = np.maximum.accumulate(np.where(timed, np.arange(len(span)), 0))
+        keep = inside[last_timed]
+        return [self._frame(int(i)) for i in span[keep]]
@@ -0,0 +1,742 @@
+# -*- coding: utf-8 -*-
+"""Library API to decode ubx files without the GUI and the CSV round trip."""
+
+import concurrent.futures
+import contextlib
+import dataclasses
+import io
+import json
+import os
+import re
+import struct
+import time
+from typing import Callable, Iterable, Mapping, TextIO
+import numpy as np
+import pandas as pd
+import block_index
+import cache as conv_cache
+import catalog as conv_catalog
+import checkpoint
+import ublox
+import model
+import pipeline
+import sinks
+import timing_qc
+from class_id import mid, MsgClass, MonID
+
+GENERATIONS = (6, 7, 8, 9)
+
+# MON-VER hwVersion → 世代 (u-blox 5 は 6 として扱う)
+HW_VERSION_TO_GEN: dict[str, int] = {
+    "00040005": 6,
+    "00040007": 6,
+    "00070000": 7,
+    "00080000": 8,
+    "00190000": 9,
+}
+PROTVER_RE = re.compile(r"PROTVER[= ]+(\d+)")
+
+
+@dataclasses.dataclass
+class ConvertResult:
+    files: list[str]
+    # 書き出しに失敗したメッセージの class/id → エラー文字列
+    errors: dict[int, str]
+    # キャッシュから復元した場合は None
+    stats: "ConvertStats | None" = None
+    cached: bool = False
+    # メッセージ名 → 受信時刻の QC (キャッシュから復元した場合は空)
+    timing: dict[str, timing_qc.TimingReport] = dataclasses.field(default_factory=dict)
+    # 走査時に作ったブロック索引 (キャッシュから復元した場合は None)
+    blocks: block_index.BlockIndex | None = None
+    generation: int | str | None = None
+    # 入力内容のハッシュ (cache か catalog を渡した場合)
+    digest: str | None = None
+    # メッセージ名 → 行数と時刻の範囲 (キャッシュから復元した場合は空)
+    messages: dict[str, "MessageSummary"] = dataclasses.field(default_factory=dict)
+    # 段階 (digest, cache, read, write, total) → 所要時間 (s)
+    durations: dict[str, float] = dataclasses.field(default_factory=dict)
+
+
+@dataclasses.dataclass
+class MessageSummary:
+    class_id: int
+    rows: int
+    # 受信時刻 (iTOW/rcvTow, ms). 時刻フィールドを持たないメッセージは None
+    first_time: float | None = None
+    last_time: float | None = None
+
+
+@dataclasses.dataclass
+class ConvertStats:
+    filesize: int = 0
+    read_count: int = 0
+    ubx_count: int = 0
+    convert_count: int = 0
+    checksum_error_count: int = 0
+    spill_count: int = 0
+    spilled_bytes: int = 0
+    decimated_count: int = 0
+    filtered_count: int = 0
+    filtered_blocks: int = 0
+    # 格納できなかった (ペイロード長が定義と合わない等) フレーム数. メッセージ名 → 件数
+    append_errors: dict[str, int] = dataclasses.field(default_factory=dict)
+
+
+def generation_from_mon_ver(dat: bytes) -> int | None:
+    """MON-VER ペイロードの PROTVER (なければ hwVersion) から世代を判定する"""
+    hw_version = dat[30:40].split(b"\0")[0].decode("ascii", "ignore")
+    for i in range(40, len(dat) - 29, 30):
+        ext = dat[i : i + 30].split(b"\0")[0].decode("ascii", "ignore")
+        m = PROTVER_RE.search(ext)
+        if m:
+            protver = int(m.group(1))
+            if protver < 14:
+                return 6
+            if protver == 14:
+                return 7
+            if protver < 27:
+                return 8
+            return 9
+    return HW_VERSION_TO_GEN.get(hw_version)
+
+
+def detect_generation(filename: str, probe_size: int = 4 << 20) -> int | None:
+    """
+    ファイル先頭 probe_size バイトだけを走査して世代を推定する.
+    MON-VER があればそれに従い, なければ既知 class/id のペイロード長が
+    各世代の定義に合うかで採点する. 判定材料が無ければ None.
+    """
+    with open(filename, "rb") as fobj:
+        probe = fobj.read(probe_size)
+    tables = {gen: get_messages(gen) for gen in GENERATIONS}
+    scores = dict.fromkeys(GENERATIONS, 0)
+    known = 0
+    for ubx_class_id, dat in ublox.FrameScanner(io.BytesIO(probe)):
+        if ubx_class_id == mid(MsgClass.MON, MonID.VER):
+            gen = generation_from_mon_ver(dat)
+            if gen is not None:
+                return gen
+        for gen, ubx_messages in tables.items():
+            desc = ubx_messages.get(ubx_class_id)
+            if desc is None:
+                continue
+            known += 1
+            scores[gen] += 1 if model.payload_fits(desc, len(dat)) else -1
+    if known == 0:
+        return None
+    # 同点なら新しい世代を優先
+    return max(GENERATIONS, key=lambda gen: (scores[gen], gen))
+
+
+def resolve_generation(gen: int | str, filename: str, default: int = 9) -> int | str:
+    """
+    gen が "auto" ならファイルから推定し, 判定できなければ default を返す.
+    "mixed" (世代混在ログ) はそのまま返す.
+    """
+    if gen == "mixed":
+        return gen
+    if gen != "auto":
+        return int(gen)
+    detected = detect_generation(filename)
+    return default if detected is None else detected
+
+
+def get_messages(generation: int | str) -> dict[int, model.UbxMsgDesc]:
+    """
+    世代番号から UBX メッセージ定義を取得する.
+    "mixed" の場合は全世代のレイアウトを含む model.length_index() の定義を返す.
+    """
+    if generation == "mixed":
+        return model.length_index().messages
+    try:
+        return getattr(model, "ubx_messages_" + str(generation))
+    except AttributeError:
+        raise ValueError(f"Unsupported u-blox generation: {generation}") from None
+
+
+def select_messages(
+    ubx_messages: dict[int, model.UbxMsgDesc], messages: Iterable[str | int] | None
+) -> dict[int, model.UbxMsgDesc]:
+    """メッセージ名 (nav_pvt) または class/id (0x0107) で定義を絞り込む"""
+    if messages is None:
+        return dict(ubx_messages)
+    selected = {}
+    for key in messages:
+        found = [
+            mid
+            for mid, desc in ubx_messages.items()
+            if key == mid or key == mid & 0xFFFF or key == desc.name
+        ]
+        if not found:
+            raise ValueError(f"Unknown message: {key!r}")
+        for mid in found:
+            selected[mid] = ubx_messages[mid]
+    return selected
+
+
+def make_decimator(
+    ubx_messages: dict[int, model.UbxMsgDesc],
+    rules: Mapping[str | int, ublox.Decimation | Mapping[str, int]],
+) -> ublox.Decimator:
+    """
+    メッセージ名または class/id → 間引き規則 (Decimation か同じキーの辞書) から Decimator を作る.
+    min_interval は先頭フィールドが iTOW (NAV など) か rcvTow (RXM-RAWX など) のメッセージにだけ指定できる.
+    """
+    by_class_id: dict[int, ublox.Decimation] = {}
+    clocks: dict[int, tuple[str, float]] = {}
+    for key, rule in rules.items():
+        if not isinstance(rule, ublox.Decimation):
+            rule = ublox.Decimation(**rule)
+        if rule.every < 1 or rule.min_interval < 0:
+            raise ValueError(f"Invalid decimation for {key!r}: {rule}")
+        for mid, desc in select_messages(ubx_messages, [key]).items():
+            if rule.min_interval:
+                clock = model.clock_field(desc)
+                if clock is None:
+                    raise ValueError(f"{desc.name} has no time field for min_interval")
+                clocks[mid & 0xFFFF] = clock
+            by_class_id[mid & 0xFFFF] = rule
+    return ublox.Decimator(by_class_id, clocks)
+
+
+def make_projection(
+    ubx_messages: dict[int, model.UbxMsgDesc],
+    fields: Mapping[str | int, Iterable[str]],
+) -> dict[int, tuple[str, ...]]:
+    """
+    メッセージ名または class/id → 書き出すフィールド名 (lat (deg) か lat) から,
+    ubx_messages のキー → フィールド名の辞書を作る. 指定のないメッセージは全フィールド.
+    """
+    projection: dict[int, tuple[str, ...]] = {}
+    for key, names in fields.items():
+        if isinstance(names, str):
+            names = [names]
+        for mid in select_messages(ubx_messages, [key]):
+            projection[mid] = tuple(names)
+    return projection
+
+
+def make_filters(
+    ubx_messages: dict[int, model.UbxMsgDesc],
+    filters: Mapping[str | int, str | Iterable[str]],
+) -> dict[int, tuple[str, ...]]:
+    """
+    メッセージ名または class/id → フィルタ式 (row_filter.Expression, 複数なら and) から,
+    ubx_messages のキー → フィルタ式の辞書を作る.
+    """
+    exprs: dict[int, tuple[str, ...]] = {}
+    for key, texts in filters.items():
+        if isinstance(texts, str):
+            texts = [texts]
+        for mid in select_messages(ubx_messages, [key]):
+            exprs[mid] = tuple(texts)
+    return exprs
+
+
+def decode_options(
+    ubx_messages: dict[int, model.UbxMsgDesc],
+    expand_bits: bool = False,
+    decimate: Mapping[str | int, ublox.Decimation | Mapping[str, int]] | None = None,
+    fields: Mapping[str | int, Iterable[str]] | None = None,
+    filters: Mapping[str | int, str | Iterable[str]] | None = None,
+) -> dict:
+    """
+    復号結果に影響する設定をチェックポイントへ記録する形 (JSON と同じ値) にまとめる.
+    再開時にこれが一致しなければチェックポイントは使わない.
+    """
+    rules = make_decimator(ubx_messages, decimate).rules if decimate else {}
+    projection = make_projection(ubx_messages, fields) if fields else {}
+    exprs = make_filters(ubx_messages, filters) if filters else {}
+    options = dict(
+        messages=sorted(ubx_messages),
+        expand_bits=expand_bits,
+        decimate={str(k): dataclasses.astuple(v) for k, v in sorted(rules.items())},
+        fields={str(k): list(v) for k, v in sorted(projection.items())},
+        filters={str(k): list(v) for k, v in sorted(exprs.items())},
+    )
+    return json.loads(json.dumps(options))
+
+
+def decode_file(
+    filename: str,
+    ubx_messages: dict[int, model.UbxMsgDesc],
+    log: TextIO | None = None,
+    progress: Callable[[int], None] | None = None,
+    memory_budget: int | None = None,
+    expand_bits: bool = False,
+    index: model.LengthIndex | None = None,
+    workers: int = 0,
+    ckpt: checkpoint.Checkpoint | None = None,
+    decimate: Mapping[str | int, ublox.Decimation | Mapping[str, int]] | None = None,
+    blocks: block_index.BlockIndex | None = None,
+    fields: Mapping[str | int, Iterable[str]] | None = None,
+    filters: Mapping[str | int, str | Iterable[str]] | None = None,
+) -> tuple[dict[int, ublox.Ublox], ConvertStats]:
+    """
+    ファイルを先頭から逐次走査し, メッセージごとの Ublox インスタンスに格納する.
+    progress には読み込み済みの割合 (%) が変化するたびに渡される.
+    memory_budget (bytes) を超えた生ペイロードは一時ファイルへ退避される.
+    expand_bits=True の場合, 書き出し時に X 型フィールドをビットごとの列へ展開する.
+    index を渡すと (class/id, ペイロード長) でレイアウトを選び, ubx_messages の
+    キーは index.messages のキーとして扱われる.
+    workers > 0 の場合, 読み込みとチェックサム検証を pipeline.PipelineScanner で並行実行する.
+    ckpt を渡すと定期的にチェックポイントを保存し, 有効なチェックポイントがあればそこから再開する.
+    入力ファイルか復号の設定 (decode_options) が異なるチェックポイントは破棄する.
+    再開時, シーク可能な log はチェックポイント時点の長さに切り詰められる.
+    decimate (make_decimator を参照) に指定したメッセージはフレーム分割の段階で間引き,
+    捨てるフレームはチェックサム検証も格納もしない.
+    blocks を渡すと, 走査したフレーム (間引いたものを除く) をブロック索引へ登録する.
+    fields (make_projection を参照) に指定したメッセージは指定したフィールドだけを展開・出力する.
+    filters (make_filters を参照) に指定したメッセージは式を満たす行・ブロックだけを格納する.
+    """
+    budget = ublox.MemoryBudget(memory_budget) if memory_budget else None
+    projection = make_projection(ubx_messages, fields) if fields else {}
+    exprs = make_filters(ubx_messages, filters) if filters else {}
+    ubx_instances = {
+        mid: ublox.Ublox(desc, budget, expand_bits, projection.get(mid), exprs.get(mid))
+        for mid, desc in ubx_messages.items()
+    }
+    stats = ConvertStats(filesize=os.path.getsize(filename))
+    pb_previous = 0
+    offset = 0
+
+    options = decode_options(ubx_messages, expand_bits, decimate, fields, filters)
+    state = ckpt.load(options) if ckpt is not None else None
+    if state is None and ckpt is not None:
+        # 入力や設定の違うチェックポイントは使わず, 残っているチャンクも消して最初からやり直す
+        ckpt.remove()
+    if state is not None:
+        offset = ckpt.restore(state, stats, ubx_instances)
+        if blocks is not None and state.get("blocks"):
+            blocks.update(state["blocks"])
+        if log is not None and log.seekable() and state["log_offset"] is not None:
+            log.seek(state["log_offset"])
+            log.truncate()
+        if log is not None:
+            log.write(f"Resumed from checkpoint: offset={offset:,}\n")
+    spill_base = (stats.spill_count, stats.spilled_bytes)
+    filter_base = (stats.filtered_count, stats.filtered_blocks)
+
+    def sync(scanner) -> None:
+        # フィルタの評価を保留しているフレームを片付けてから数える
+        for inst in ubx_instances.values():
+            inst.flush()
+        stats.read_count = scanner.read_count
+        stats.ubx_count = scanner.ubx_count
+        stats.checksum_error_count = scanner.checksum_error_count
+        stats.decimated_count = scanner.decimated_count
+        if budget is not None:
+            stats.spill_count = spill_base[0] + budget.spill_count
+            stats.spilled_bytes = spill_base[1] + budget.spilled_bytes
+        filtered = [inst.filter for inst in ubx_instances.values() if inst.filter is not None]
+        if filtered:
+            stats.filtered_count = filter_base[0] + sum(f.rejected_rows for f in filtered)
+            stats.filtered_blocks = filter_base[1] + sum(f.rejected_blocks for f in filtered)
+
+    def save(scanner) -> None:
+        sync(scanner)
+        log_offset = None
+        if log is not None and log.seekable():
+            log.flush()
+            log_offset = log.tell()
+        ckpt.save(
+            scanner.offset,
+            stats,
+            ubx_instances,
+            log_offset,
+            blocks.to_dict() if blocks is not None else None,
+            options,
+            scanner.decimator_state,
+        )
+
+    decimator = make_decimator(ubx_messages, decimate) if decimate else None
+    if decimator is not None and state is not None and state.get("decimator"):
+        decimator.restore(state["decimator"])
+    first_errors: dict[str, str] = {}
+    clocks = {}
+    if blocks is not None:
+        for mid, desc in ubx_messages.items():
+            clock = model.clock_field(desc)
+            if clock is not None:
+                clocks[mid] = (struct.Struct(clock[0]), clock[1])
+    with open(filename, "rb") as fobj:
+        fobj.seek(offset)
+        if workers > 0:
+            scanner = pipeline.PipelineScanner(
+                fobj, workers, log=log, offset=offset, decimator=decimator
+            )
+        else:
+            scanner = ublox.FrameScanner(fobj, log=log, offset=offset, decimator=decimator)
+        scanner.ubx_count = stats.ubx_count
+        scanner.checksum_error_count = stats.checksum_error_count
+        scanner.decimated_count = stats.decimated_count
+        for ubx_class_id, dat in scanner:
+            if progress is not None and stats.filesize:
+                pb_current = int(scanner.read_count / stats.filesize * 100)
+                if pb_previous < pb_current:
+                    progress(pb_current)
+                    pb_previous = pb_current
+            key = ubx_class_id
+            if index is not None and len(dat) > 0:
+                key = index.lookup(ubx_class_id, len(dat))
+            if blocks is not None:
+                clock = clocks.get(key)
+                time = None
+                if clock is not None and len(dat) >= clock[0].size:
+                    time = clock[0].unpack_from(dat)[0] * clock[1]
+                blocks.add(scanner.offset - len(dat) - 8, ubx_class_id, time)
+            if key not in ubx_messages:  # class, idが見つからなかった場合
+                if log is not None:
+                    log.write(
+                        f"Message class/id not found: ubx count={scanner.ubx_count:,}, class/id=0x{ubx_class_id:04X}, length={len(dat):,}\n"
+                    )
+            elif len(dat) == 0:
+                if log is not None:
+                    log.write(
+                        f"No data contained: ubx count={scanner.ubx_count:,}, class/id=0x{ubx_class_id:04X}, length={len(dat):,}\n"
+                    )
+            else:
+                try:
+                    ubx_instances[key].append(dat)
+                    stats.convert_count += 1
+                except Exception as e:
+                    # フレームごとには出力せず, 件数と最初のエラーを最後に 1 行でまとめる
+                    name = ubx_messages[key].name
+                    stats.append_errors[name] = stats.append_errors.get(name, 0) + 1
+                    first_errors.setdefault(name, str(e))
+                # フィルタの評価エラーはフレーム単位の例外処理に含めず, そのまま送出する
+                if ubx_instances[key].flush_due:
+                    ubx_instances[key].flush()
+            if ckpt is not None and ckpt.due(scanner.offset):
+                save(scanner)
+
+    sync(scanner)
+    if log is not None and stats.append_errors:
+        errors = ", ".join(
+            f"{name}: {count:,}" + (f" ({first_errors[name]})" if name in first_errors else "")
+            for name, count in stats.append_errors.items()
+        )
+        log.write(f"Error in appending ublox messages: {errors}\n")
+    # 一度でも保存していれば走査完了も記録し, 書き出し中の中断から走査なしで再開できるようにする
+    if ckpt is not None and ckpt.seq > 0 and ckpt.last_offset < scanner.offset:
+        save(scanner)
+    return ubx_instances, stats
+
+
+def write_summary(fobjlog: TextIO, filename: str, stats: ConvertStats) -> None:
+    fobjlog.write("\nSummary of the conversion\n")
+    fobjlog.write(f"Source: {filename}\n")
+    fobjlog.write(f"Filesize:  {stats.filesize:,} bytes\n")
+    fobjlog.write(f"Read data: {stats.read_count:,} bytes\n")
+    fobjlog.write(f"ubx messages found:     {stats.ubx_count:,}\n")
+    fobjlog.write(f"ubx messages converted: {stats.convert_count:,}\n")
+    fobjlog.write(f"checksum error count: {stats.checksum_error_count:,}\n")
+    if stats.decimated_count:
+        fobjlog.write(f"ubx messages decimated: {stats.decimated_count:,}\n")
+    if stats.filtered_count or stats.filtered_blocks:
+        fobjlog.write(
+            f"ubx messages filtered out: {stats.filtered_count:,}, blocks: {stats.filtered_blocks:,}\n"
+        )
+    if stats.append_errors:
+        fobjlog.write(f"ubx messages not converted: {sum(stats.append_errors.values()):,}\n")
+    if stats.spill_count:
+        fobjlog.write(
+            f"spilled to disk: {stats.spill_count:,} times, {stats.spilled_bytes:,} bytes\n"
+        )
+
+
+def _write_one(
+    instance: ublox.Ublox, formats: tuple[str, ...], out_dir: str | None = None
+) -> list[str]:
+    name = instance.msg_desc.name
+    basename = os.path.join(out_dir, name) if out_dir else name
+    return instance.write(sinks.make_sinks(formats, instance, basename))
+
+
+def write_all(
+    ubx_instances: dict[int, ublox.Ublox],
+    formats: Iterable[str] = ("csv",),
+    workers: int | None = None,
+    progress: Callable[[int, str, int, int], None] | None = None,
+    out_dir: str | None = None,
+) -> tuple[dict[int, list[str]], dict[int, str]]:
+    """
+    データのあるメッセージを "<name>.<ext>" として out_dir (省略時はカレントディレクトリ) へ並列に書き出す.
+    ペイロード量の多いメッセージから順に 1 メッセージ 1 タスクで投入し,
+    完了するたびに progress(class/id, name, 完了数, 総数) を呼ぶ.
+    書き出したファイル名と, 失敗したメッセージのエラー文字列をそれぞれ返す.
+    workers=None は CPU 数. ディスク上にペイロードがある (spill 済みかチェックポイントで確定した)
+    メッセージがあればスレッドで, なければプロセスで実行する (プロセスへ渡すと全ペイロードを読み戻すため).
+    """
+    formats = tuple(formats)
+    todo = sorted(
+        (key for key, inst in ubx_instances.items() if inst.count),
+        key=lambda key: ubx_instances[key].payload_bytes,
+        reverse=True,
+    )
+    workers = os.cpu_count() or 1 if workers is None else workers
+    files: dict[int, list[str]] = {}
+    errors: dict[int, str] = {}
+
+    def done(key: int, run: Callable[[], list[str]]) -> None:
+        try:
+            files[key] = run()
+        except Exception as e:
+            errors[key] = f"{type(e).__name__}: {e}"
+        if progress is not None:
+            progress(key, ubx_instances[key].msg_desc.name, len(files) + len(errors), len(todo))
+
+    if workers < 2 or len(todo) < 2:
+        for key in todo:
+            done(key, lambda: _write_one(ubx_instances[key], formats, out_dir))
+        return files, errors
+
+    on_disk = any(
+        inst._spill_file is not None or inst.chunks for inst in ubx_instances.values()
+    )
+    executor = (
+        concurrent.futures.ThreadPoolExecutor
+        if on_disk
+        else concurrent.futures.ProcessPoolExecutor
+    )
+    with executor(workers) as pool:
+        futures = {
+            pool.submit(_write_one, ubx_instances[key], formats, out_dir): key
+            for key in todo
+        }
+        for future in concurrent.futures.as_completed(futures):
+            done(futures[future], future.result)
+    return files, errors
+
+
+def read_ubx(
+    filename: str,
+    gen: int | str = 9,
+    messages: Iterable[str | int] | None = None,
+    as_array: bool = False,
+    memory_budget: int | None = None,
+    expand_bits: bool = False,
+    workers: int = 0,
+    ckpt: checkpoint.Checkpoint | None = None,
+    decimate: Mapping[str | int, ublox.Decimation | Mapping[str, int]] | None = None,
+    fields: Mapping[str | int, Iterable[str]] | None = None,
+    filters: Mapping[str | int, str | Iterable[str]] | None = None,
+    log: TextIO | None = None,
+    errors: dict[str, str] | None = None,
+) -> dict[str, pd.DataFrame | np.ndarray]:
+    """
+    UBX ファイルを読み込み, メッセージ名をキーとする辞書を返す.
+    gen="auto" の場合はファイル先頭から世代を推定する.
+    gen="mixed" の場合はフレームごとにペイロード長で全世代の定義から選び,
+    レイアウトが複数あるメッセージは "<name>_<長さ>" に分けて返す.
+
+    as_array=False の場合は CSV と同じ列 (スケール適用済み) の DataFrame.
+    as_array=True の場合はスケール未適用の numpy 構造化配列を返し,
+    可変部を持つメッセージは "<name>_var" に繰り返しブロックを格納する.
+    memory_budget で退避したペイロードは少しずつ読み戻して結果の配列へ詰める (結果の配列自体は上限に数えない).
+    expand_bits=True の場合, DataFrame の X 型フィールドをビットごとの列へ展開する.
+    ckpt を渡すと走査の途中経過を保存し, 中断後の呼び出しでは続きから読み込む.
+    decimate={"nav_pvt": Decimation(min_interval=1000)} のように指定したメッセージは間引かれる.
+    fields={"nav_pvt": ["iTOW", "lat", "lon"]} のように指定したメッセージは指定したフィールドだけになる.
+    filters={"nav_pvt": "fixType == 3 and numSV >= 8", "rxm_rawx": "cno > 30"} のように
+    指定したメッセージは式を満たす行 (可変部のフィールドを使う式ではブロック) だけになる.
+    データが無いメッセージは含まれない.
+    変換できないメッセージ (定義のフィールド数が合わないものなど) も含めず,
+    write_all と同じく errors (渡した場合) にメッセージ名 → エラーを入れ, log に書く.
+    """
+    gen = resolve_generation(gen, filename)
+    ubx_messages = select_messages(get_messages(gen), messages)
+    ubx_instances, _ = decode_file(
+        filename,
+        ubx_messages,
+        log=log,
+        memory_budget=memory_budget,
+        expand_bits=expand_bits,
+        index=model.length_index() if gen == "mixed" else None,
+        workers=workers,
+        ckpt=ckpt,
+        decimate=decimate,
+        fields=fields,
+        filters=filters,
+    )
+
+    result: dict[str, pd.DataFrame | np.ndarray] = {}
+    for instance in ubx_instances.values():
+        if instance.count == 0:
+            continue
+        name = instance.msg_desc.name
+        try:
+            if as_array:
+                fix, var = instance.to_arrays()
+                result[name] = fix
+                if var is not None:
+                    result[name + "_var"] = var
+            else:
+                result[name] = instance.to_dataframe()
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            if errors is not None:
+                errors[name] = error
+            if log is not None:
+                log.write(f"Error in converting {name}: {error}\n")
+    return result
+
+
+def convert_file(
+    filename: str,
+    gen: int | str = "auto",
+    messages: Iterable[str | int] | None = None,
+    formats: Iterable[str] = ("csv",),
+    out_dir: str | None = None,
+    memory_budget: int | None = None,
+    expand_bits: bool = False,
+    workers: int | None = None,
+    log: TextIO | None = None,
+    cache: "conv_cache.ConversionCache | None" = None,
+    progress: Callable[[int], None] | None = None,
+    write_progress: Callable[[int, str, int, int], None] | None = None,
+    decimate: Mapping[str | int, ublox.Decimation | Mapping[str, int]] | None = None,
+    catalog: "conv_catalog.Catalog | None" = None,
+    fields: Mapping[str | int, Iterable[str]] | None = None,
+    filters: Mapping[str | int, str | Iterable[str]] | None = None,
+) -> ConvertResult:
+    """
+    1 ファイルを変換して out_dir へ書き出す (GUI の変換と同じ出力).
+    cache を渡すと同じ入力・条件の変換結果があればデコードせずにコピーし,
+    エラーなく変換できた結果はキャッシュへ保存する.
+    workers は書き出しの並列数で, None の場合は読み込みもファイルサイズに応じて並列化する.
+    progress と write_progress はそれぞれ decode_file と write_all の progress に渡される.
+    走査のついでに作ったブロック索引を "<入力ファイル名>.blocks.json" として出力に加える.
+    catalog を渡すと実行結果 (キャッシュからの復元を含む) を記録する.
+    fields, filters は read_ubx と同じ.
+    """
+    started = time.time()
+    t0 = time.perf_counter()
+    durations = {}
+    formats = tuple(formats)
+    decimate = {
+        k: v if isinstance(v, ublox.Decimation) else ublox.Decimation(**v)
+        for k, v in (decimate or {}).items()
+    }
+    gen = resolve_generation(gen, filename)
+    ubx_messages = select_messages(get_messages(gen), messages)
+    projection = make_projection(ubx_messages, fields) if fields else {}
+    exprs = make_filters(ubx_messages, filters) if filters else {}
+    key = None
+    digest = None
+    if cache is not None:
+        digest = cache.digest(filename)
+    elif catalog is not None:
+        digest = conv_cache.file_digest(filename)
+    durations["digest"] = time.perf_counter() - t0
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+
+    def finish(result: ConvertResult) -> ConvertResult:
+        result.generation = gen
+        result.digest = digest
+        result.durations = dict(durations, total=time.perf_counter() - t0)
+        if catalog is not None:
+            catalog.record(
+                filename,
+                result,
+                out_dir,
+                started,
+                options=dict(
+                    messages=sorted(ubx_messages),
+                    formats=formats,
+                    expand_bits=expand_bits,
+                    decimate={str(k): dataclasses.astuple(v) for k, v in decimate.items()},
+                    fields={str(k): list(v) for k, v in projection.items()},
+                    filters={str(k): list(v) for k, v in exprs.items()},
+                ),
+            )
+        return result
+
+    if cache is not None:
+        t = time.perf_counter()
+        key = cache.key(
+            filename,
+            gen,
+            ubx_messages,
+            formats,
+            expand_bits=expand_bits,
+            decimate={str(k): dataclasses.astuple(v) for k, v in decimate.items()},
+            fields={str(k): list(v) for k, v in projection.items()},
+            filters={str(k): list(v) for k, v in exprs.items()},
+        )
+        files = cache.restore(key, out_dir)
+        durations["cache"] = time.perf_counter() - t
+        if files is not None:
+            return finish(ConvertResult(files, {}, cached=True))
+
+    blocks = block_index.BlockIndex()
+    read_workers = 0
+    if workers is None:
+        read_workers = pipeline.auto_workers(os.path.getsize(filename))
+    t = time.perf_counter()
+    ubx_instances, stats = decode_file(
+        filename,
+        ubx_messages,
+        log=log,
+        progress=progress,
+        memory_budget=memory_budget,
+        expand_bits=expand_bits,
+        index=model.length_index() if gen == "mixed" else None,
+        workers=read_workers,
+        decimate=decimate,
+        blocks=blocks,
+        fields=projection,
+        filters=exprs,
+    )
+    durations["read"] = time.perf_counter() - t
+    t = time.perf_counter()
+    written, errors = write_all(
+        ubx_instances, formats, workers=workers, progress=write_progress, out_dir=out_dir
+    )
+    durations["write"] = time.perf_counter() - t
+    # SQLite のように複数メッセージが同じファイルへ書く形式があるので重複を除く
+    files = list(dict.fromkeys(f for key_files in written.values() for f in key_files))
+    blocks_file = os.path.join(
+        out_dir or "", block_index.sidecar_path(os.path.basename(filename))
+    )
+    blocks.save(blocks_file, filename)
+    files.append(blocks_file)
+    if cache is not None and not errors:
+        cache.store(key, files, out_dir)
+    return finish(
+        ConvertResult(
+            files,
+            errors,
+            stats,
+            timing=timing_qc.timing_reports(ubx_instances),
+            blocks=blocks,
+            messages={
+                inst.msg_desc.name: MessageSummary(
+                    mid & 0xFFFF,
+                    inst.count,
+                    inst.times[0] if len(inst.times) else None,
+                    inst.times[-1] if len(inst.times) else None,
+                )
+                for mid, inst in ubx_instances.items()
+                if inst.count
+            },
+        )
+    )
+
+
+def warm_up() -> None:
+    """
+    全世代の定義表・混在ログ用索引・struct/numpy のフォーマット変換を事前に構築する.
+    常駐プロセスのワーカー初期化で呼び, 最初のファイルの変換を速くする.
+    """
+    for gen in GENERATIONS + ("mixed",):
+        for desc in get_messages(gen).values():
+            model.convert_fmt(desc.fmt_fix)
+            model.convert_fmt(desc.fmt_var)
+            # ヘッダ数が合わない定義は変換時にエラーとして報告されるのでここでは無視する
+            with contextlib.suppress(ValueError):
+                model.numpy_dtype(desc.fmt_fix, desc.hdr_fix)
+            with contextlib.suppress(ValueError):
+                model.numpy_dtype(desc.fmt_var, desc.hdr_var)
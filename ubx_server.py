@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""Local conversion service over a Unix domain socket (client: ubx_client.py)."""
+
+import argparse
+import json
+import os
+import socketserver
+import threading
+import ubx_client
+import ubx_reader
+import watcher
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    """
+    1 接続 1 ジョブ. 要求は 1 行の JSON {"path", "out_dir", "options"}.
+    応答は 1 行 1 イベントの JSON で, 読み込み/書き出しの進捗の後に done か error を送る.
+    """
+
+    def send(self, **event) -> None:
+        self.wfile.write(json.dumps(event).encode() + b"\n")
+        self.wfile.flush()
+
+    def handle(self) -> None:
+        try:
+            job = json.loads(self.rfile.readline())
+            path, out_dir = job["path"], job["out_dir"]
+            options = dict(self.server.options, **job.get("options", {}))
+        except (ValueError, KeyError, TypeError) as e:
+            self.send(event="error", message=f"Bad request: {e}")
+            return
+        with self.server.slots:
+            self.send(event="start", path=path)
+            try:
+                result = watcher.convert_job(
+                    path,
+                    out_dir,
+                    options,
+                    progress=lambda pb: self.send(event="read", percent=pb),
+                    write_progress=lambda cid, name, done, total: self.send(
+                        event="write", name=name, done=done, total=total
+                    ),
+                )
+            except BrokenPipeError:
+                return
+            except Exception as e:
+                self.send(event="error", message=f"{type(e).__name__}: {e}")
+                return
+        self.send(event="done", **result)
+
+
+class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    定義表とデコーダを読み込み済みのまま常駐し, ジョブを受け付ける.
+    同時に変換するのは concurrency 件までで, それ以上の接続は空きが出るまで待つ.
+    ジョブはスレッドで実行するので, 大きなファイルを並列に処理する場合は watcher.py を使う.
+    options は全ジョブ共通の既定値 (cache_dir, catalog など) で, 要求の options で上書きできる.
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        socket_path: str = ubx_client.DEFAULT_SOCKET,
+        concurrency: int = 2,
+        options: dict | None = None,
+    ) -> None:
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        super().__init__(socket_path, _Handler)
+        self.socket_path = socket_path
+        self.slots = threading.BoundedSemaphore(concurrency)
+        self.options = options or {}
+        ubx_reader.warm_up()
+
+    def server_close(self) -> None:
+        super().server_close()
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--socket", default=ubx_client.DEFAULT_SOCKET)
+    parser.add_argument("--concurrency", type=int, default=2)
+    parser.add_argument("--cache-dir", default=None)
+    parser.add_argument("--catalog", default=None, help="SQLite file to record each run in")
+    args = parser.parse_args(argv)
+
+    options = {}
+    if args.cache_dir:
+        options["cache_dir"] = args.cache_dir
+    if args.catalog:
+        options["catalog"] = args.catalog
+    with Server(args.socket, args.concurrency, options) as server:
+        print(f"Listening on {args.socket}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
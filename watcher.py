@@ -0,0 +1,301 @@
+# -*- coding: utf-8 -*-
+"""Watch-folder conversion daemon with a pool of pre-warmed worker processes."""
+
+import argparse
+import collections
+import concurrent.futures
+import json
+import os
+import shutil
+import time
+from typing import Callable, Iterator
+import cache as conv_cache
+import catalog as conv_catalog
+import timing_qc
+import ubx_reader
+
+EXTENSIONS = (".ubx",)
+
+
+def convert_job(
+    path: str,
+    out_dir: str,
+    options: dict,
+    progress: Callable[[int], None] | None = None,
+    write_progress: Callable[[int, str, int, int], None] | None = None,
+) -> dict:
+    """
+    ワーカーで実行する 1 ファイル分の変換. out_dir に出力と ubx2CSV.log を書く.
+    options は ubx_reader.convert_file のキーワード引数 (cache_dir があればキャッシュを使い,
+    catalog があればその SQLite ファイルへ実行結果を記録する).
+    """
+    options = dict(options)
+    cache_dir = options.pop("cache_dir", None)
+    cache = conv_cache.ConversionCache(cache_dir) if cache_dir else None
+    catalog_path = options.pop("catalog", None)
+    catalog = conv_catalog.Catalog(catalog_path) if catalog_path else None
+    os.makedirs(out_dir, exist_ok=True)
+    start = time.perf_counter()
+    with open(os.path.join(out_dir, "ubx2CSV.log"), "w") as fobjlog:
+        result = ubx_reader.convert_file(
+            path,
+            out_dir=out_dir,
+            log=fobjlog,
+            cache=cache,
+            catalog=catalog,
+            workers=0,
+            progress=progress,
+            write_progress=write_progress,
+            **options,
+        )
+        if result.stats is not None:
+            ubx_reader.write_summary(fobjlog, path, result.stats)
+            timing_qc.write_timing_qc(fobjlog, result.timing)
+        for ubx_class_id, error in result.errors.items():
+            fobjlog.write(f"Write error: class/id=0x{ubx_class_id & 0xFFFF:04X}: {error}\n")
+    return dict(
+        files=len(result.files),
+        errors=len(result.errors),
+        cached=result.cached,
+        seconds=time.perf_counter() - start,
+    )
+
+
+class _Inotify:
+    """inotify_simple があれば使う (Linux). なければ Watcher はポーリングのみで動く"""
+
+    def __init__(self, directory: str) -> None:
+        import inotify_simple
+
+        flags = inotify_simple.flags
+        self.inotify = inotify_simple.INotify()
+        self.inotify.add_watch(
+            directory, flags.CLOSE_WRITE | flags.MOVED_TO | flags.MODIFY | flags.CREATE
+        )
+
+    def wait(self, timeout: float) -> list[str]:
+        return [e.name for e in self.inotify.read(timeout=int(timeout * 1000))]
+
+    def close(self) -> None:
+        self.inotify.close()
+
+
+class Watcher:
+    """
+    inbox に置かれた UBX ファイルを, サイズと mtime が settle 秒変化しなくなってから
+    ワーカープロセスへ渡して outbox/<ファイル名の stem>/ に変換する.
+    ワーカーは起動時に ubx_reader.warm_up で定義表を構築済みなので, 1 ファイルごとの
+    インタプリタ起動と import のコストはかからない.
+    変換済みの入力は done_dir があればそこへ移動し, なければ (パス, サイズ, mtime) を記憶して
+    変更されない限り再変換しない.
+    status_file にはキューの長さと処理速度を JSON で書き出す (poll_interval ごとに更新).
+    """
+
+    def __init__(
+        self,
+        inbox: str,
+        outbox: str,
+        workers: int | None = None,
+        settle: float = 2.0,
+        poll_interval: float = 1.0,
+        status_file: str | None = None,
+        done_dir: str | None = None,
+        options: dict | None = None,
+    ) -> None:
+        self.inbox = inbox
+        self.outbox = outbox
+        self.workers = workers or os.cpu_count() or 1
+        self.settle = settle
+        self.poll_interval = poll_interval
+        self.status_file = status_file
+        self.done_dir = done_dir
+        self.options = options or {}
+        # パス → (サイズ, mtime_ns, 変化が最後に観測された時刻)
+        self.pending: dict[str, tuple[int, int, float]] = {}
+        self.running: dict[concurrent.futures.Future, tuple[str, int, int]] = {}
+        self.converted: set[tuple[str, int, int]] = set()
+        self.finished: collections.deque = collections.deque()
+        self.done_count = 0
+        self.failed_count = 0
+        self.done_bytes = 0
+        self.last_error: str | None = None
+        self.started = time.time()
+
+    def _scan(self, names: list[str] | None = None) -> None:
+        """names が None ならディレクトリ全体を走査する"""
+        if names is None:
+            names = os.listdir(self.inbox)
+        busy = {path for path, _, _ in self.running.values()}
+        now = time.monotonic()
+        for name in names:
+            if not name.lower().endswith(EXTENSIONS):
+                continue
+            path = os.path.join(self.inbox, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                self.pending.pop(path, None)
+                continue
+            ident = (path, st.st_size, st.st_mtime_ns)
+            if path in busy or ident in self.converted:
+                continue
+            prev = self.pending.get(path)
+            if prev is None or prev[:2] != ident[1:]:
+                self.pending[path] = (st.st_size, st.st_mtime_ns, now)
+
+    def _dispatch(self, pool: concurrent.futures.Executor) -> None:
+        now = time.monotonic()
+        for path, (size, mtime_ns, changed) in list(self.pending.items()):
+            if now - changed < self.settle:
+                continue
+            del self.pending[path]
+            stem = os.path.splitext(os.path.basename(path))[0]
+            future = pool.submit(
+                convert_job, path, os.path.join(self.outbox, stem), self.options
+            )
+            self.running[future] = (path, size, mtime_ns)
+
+    def _collect(self, wait: bool = False) -> None:
+        if not self.running:
+            return
+        done, _ = concurrent.futures.wait(
+            self.running,
+            timeout=None if wait else 0,
+            return_when=concurrent.futures.FIRST_COMPLETED,
+        )
+        for future in done:
+            path, size, mtime_ns = self.running.pop(future)
+            try:
+                result = future.result()
+            except Exception as e:
+                self.failed_count += 1
+                self.last_error = f"{os.path.basename(path)}: {type(e).__name__}: {e}"
+                # 失敗したファイルも変更されるまでは再投入しない
+                self.converted.add((path, size, mtime_ns))
+                continue
+            self.done_count += 1
+            self.done_bytes += size
+            self.finished.append((time.monotonic(), size))
+            if result["errors"]:
+                self.last_error = f"{os.path.basename(path)}: {result['errors']} write errors"
+            if self.done_dir:
+                os.makedirs(self.done_dir, exist_ok=True)
+                shutil.move(path, os.path.join(self.done_dir, os.path.basename(path)))
+            else:
+                self.converted.add((path, size, mtime_ns))
+
+    def status(self, window: float = 60.0) -> dict:
+        now = time.monotonic()
+        while self.finished and now - self.finished[0][0] > window:
+            self.finished.popleft()
+        recent = sum(size for _, size in self.finished)
+        return dict(
+            pid=os.getpid(),
+            uptime=time.time() - self.started,
+            workers=self.workers,
+            waiting=len(self.pending),
+            running=len(self.running),
+            done=self.done_count,
+            failed=self.failed_count,
+            done_bytes=self.done_bytes,
+            files_per_min=len(self.finished) * 60.0 / window,
+            bytes_per_sec=recent / window,
+            last_error=self.last_error,
+            updated=time.time(),
+        )
+
+    def _write_status(self) -> None:
+        if self.status_file is None:
+            return
+        tmp = self.status_file + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.status(), f, indent=2)
+        os.replace(tmp, self.status_file)
+
+    def _events(self) -> Iterator[list[str] | None]:
+        """変化したファイル名の一覧を返し続ける (None はディレクトリ全体の再走査)"""
+        try:
+            notify = _Inotify(self.inbox)
+        except (ImportError, OSError):
+            notify = None
+        try:
+            yield None
+            while True:
+                if notify is None:
+                    time.sleep(self.poll_interval)
+                    yield None
+                else:
+                    # 安定待ちのファイルがある間もタイムアウトで定期的に確認する
+                    yield notify.wait(self.poll_interval)
+        finally:
+            if notify is not None:
+                notify.close()
+
+    def run(self, max_idle: float | None = None) -> None:
+        """
+        Ctrl-C で停止するまで監視する. max_idle 秒間何もすることがなければ終了する.
+        """
+        os.makedirs(self.outbox, exist_ok=True)
+        idle_since = time.monotonic()
+        with concurrent.futures.ProcessPoolExecutor(
+            self.workers, initializer=ubx_reader.warm_up
+        ) as pool:
+            try:
+                for names in self._events():
+                    self._scan(names)
+                    # 安定待ちのファイルは通知が来なくても状態を確認し直す
+                    if names is not None and self.pending:
+                        self._scan([os.path.basename(p) for p in self.pending])
+                    self._dispatch(pool)
+                    self._collect()
+                    self._write_status()
+                    if self.pending or self.running:
+                        idle_since = time.monotonic()
+                    elif max_idle is not None and time.monotonic() - idle_since > max_idle:
+                        break
+            except KeyboardInterrupt:
+                pass
+            while self.running:
+                self._collect(wait=True)
+            self._write_status()
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("inbox")
+    parser.add_argument("outbox")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--gen", default="auto")
+    parser.add_argument("--formats", default="csv", help="comma separated: csv,npy,parquet,sqlite,columns")
+    parser.add_argument("--expand-bits", action="store_true")
+    parser.add_argument("--settle", type=float, default=2.0)
+    parser.add_argument("--poll-interval", type=float, default=1.0)
+    parser.add_argument("--status-file", default=None)
+    parser.add_argument("--done-dir", default=None)
+    parser.add_argument("--cache-dir", default=None)
+    parser.add_argument("--catalog", default=None, help="SQLite file to record each run in")
+    args = parser.parse_args(argv)
+
+    options = dict(
+        gen=int(args.gen) if args.gen.isdigit() else args.gen,
+        formats=tuple(args.formats.split(",")),
+        expand_bits=args.expand_bits,
+    )
+    if args.cache_dir:
+        options["cache_dir"] = args.cache_dir
+    if args.catalog:
+        options["catalog"] = args.catalog
+    Watcher(
+        args.inbox,
+        args.outbox,
+        workers=args.workers,
+        settle=args.settle,
+        poll_interval=args.poll_interval,
+        status_file=args.status_file,
+        done_dir=args.done_dir,
+        options=options,
+    ).run()
+
+
+if __name__ == "__main__":
+    main()